@@ -13,12 +13,14 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 # Import Base i svih modela
-from app.database import Base
-from app.models import user, userRole, chat, message, mode, document
+from app.database import Base, SQLALCHEMY_DATABASE_URL
+from app.models import user, userRole, chat, message, mode, document, stats
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
+# Migracije idu na istu bazu kao i aplikacija (DATABASE_URL)
+config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -0,0 +1,32 @@
+"""add document chunk index
+
+Revision ID: 8f2a1c4b7d10
+Revises: 6d9c2863b9ad
+Create Date: 2026-10-18 10:12:41.218034
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2a1c4b7d10'
+down_revision: Union[str, Sequence[str], None] = '6d9c2863b9ad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Link documents to their Chroma chunk collection."""
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('collection_name', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('chunk_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove chunk collection columns from documents."""
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.drop_column('chunk_count')
+        batch_op.drop_column('collection_name')
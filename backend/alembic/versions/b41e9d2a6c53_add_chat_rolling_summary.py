@@ -0,0 +1,32 @@
+"""add chat rolling summary
+
+Revision ID: b41e9d2a6c53
+Revises: 8f2a1c4b7d10
+Create Date: 2026-10-18 11:02:17.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e9d2a6c53'
+down_revision: Union[str, Sequence[str], None] = '8f2a1c4b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add rolling conversation summary to chats."""
+    with op.batch_alter_table('chats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove rolling conversation summary from chats."""
+    with op.batch_alter_table('chats', schema=None) as batch_op:
+        batch_op.drop_column('summary_message_id')
+        batch_op.drop_column('summary')
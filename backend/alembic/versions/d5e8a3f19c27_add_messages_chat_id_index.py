@@ -0,0 +1,28 @@
+"""add messages chat_id index
+
+Revision ID: d5e8a3f19c27
+Revises: b41e9d2a6c53
+Create Date: 2026-10-18 15:20:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a3f19c27'
+down_revision: Union[str, Sequence[str], None] = 'b41e9d2a6c53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add (chat_id, id) index for keyset-paginated chat history."""
+    op.create_index('ix_messages_chat_id_id', 'messages', ['chat_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Remove (chat_id, id) index."""
+    op.drop_index('ix_messages_chat_id_id', table_name='messages')
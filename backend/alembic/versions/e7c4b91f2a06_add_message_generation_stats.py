@@ -0,0 +1,44 @@
+"""add message generation stats
+
+Revision ID: e7c4b91f2a06
+Revises: d5e8a3f19c27
+Create Date: 2026-10-18 19:42:08.513377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c4b91f2a06'
+down_revision: Union[str, Sequence[str], None] = 'd5e8a3f19c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add token counts and Ollama timings to assistant messages."""
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('model_name', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('prompt_tokens', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('completion_tokens', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('total_duration_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('load_duration_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('prompt_eval_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('eval_ms', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('prompt_breakdown', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Remove token counts and Ollama timings from messages."""
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_column('prompt_breakdown')
+        batch_op.drop_column('eval_ms')
+        batch_op.drop_column('prompt_eval_ms')
+        batch_op.drop_column('load_duration_ms')
+        batch_op.drop_column('total_duration_ms')
+        batch_op.drop_column('completion_tokens')
+        batch_op.drop_column('prompt_tokens')
+        batch_op.drop_column('model_name')
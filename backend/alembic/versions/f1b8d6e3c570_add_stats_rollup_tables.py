@@ -0,0 +1,74 @@
+"""add stats rollup tables
+
+Revision ID: f1b8d6e3c570
+Revises: e7c4b91f2a06
+Create Date: 2026-10-18 21:05:33.902741
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.utils import stats_rollup
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b8d6e3c570'
+down_revision: Union[str, Sequence[str], None] = 'e7c4b91f2a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add rollup tables for admin statistics and fill them from existing chats and messages."""
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('chat_count', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('ix_user_stats_message_count', 'user_stats', ['message_count'], unique=False)
+    op.create_table('mode_stats',
+    sa.Column('mode_id', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('mode_id')
+    )
+    op.create_table('daily_stats',
+    sa.Column('day', sa.String(), nullable=False),
+    sa.Column('chat_count', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('model_stats',
+    sa.Column('model_name', sa.String(), nullable=False),
+    sa.Column('responses', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('prompt_responses', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_responses', sa.Integer(), nullable=False),
+    sa.Column('timed_completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('timed_eval_ms', sa.Integer(), nullable=False),
+    sa.Column('cold_starts', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('model_name')
+    )
+    op.create_table('generation_time_stats',
+    sa.Column('mode_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_ms', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('mode_id', 'bucket_ms')
+    )
+
+    # /admin/stats čita samo zbirne tabele, pa se odmah popunjavaju postojećim podacima
+    bind = op.get_bind()
+    for statement, params in stats_rollup.rebuild_statements():
+        bind.execute(statement, params)
+
+
+def downgrade() -> None:
+    """Remove admin statistics rollup tables."""
+    op.drop_table('generation_time_stats')
+    op.drop_table('model_stats')
+    op.drop_table('daily_stats')
+    op.drop_table('mode_stats')
+    op.drop_index('ix_user_stats_message_count', table_name='user_stats')
+    op.drop_table('user_stats')
@@ -1,19 +1,51 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from config import get_config
+
+config = get_config()
+
+# Putanja do baze iz DATABASE_URL (podrazumevano app.db u backend/)
+SQLALCHEMY_DATABASE_URL = config['DATABASE_URL']
+# Isti fajl preko aiosqlite drajvera za async rute
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1) if SQLALCHEMY_DATABASE_URL.startswith("sqlite://") else SQLALCHEMY_DATABASE_URL
+
+_is_sqlite = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+# Veličina pool-a važi za svaku bazu (i Postgres/MySQL iz docker-compose); SQLite :memory: koristi pool bez ovih opcija
+_pool_args = {"pool_size": config['DB_POOL_SIZE'], "max_overflow": config['DB_MAX_OVERFLOW']} if ":memory:" not in SQLALCHEMY_DATABASE_URL else {}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL da čitaoci ne čekaju pisca, NORMAL sinhronizacija (bezbedno uz WAL), mmap za čitanje
+    i busy timeout umesto trenutne 'database is locked' greške."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={config['SQLITE_MMAP_SIZE']}")
+    cursor.execute(f"PRAGMA busy_timeout={config['SQLITE_BUSY_TIMEOUT_MS']}")
+    cursor.close()
 
-# SQLite database path (app.db file will be created in backend/)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
 
 # Create engine with SQLite-specific config
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
+    connect_args={"check_same_thread": False} if _is_sqlite else {},  # Needed for SQLite
+    **_pool_args
 )
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_args)
+
+if _is_sqlite:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 # SessionLocal class for creating database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sesije; objekti ostaju čitljivi posle commit-a jer async ne može lenjo da ih osveži
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base class for SQLAlchemy models
 Base = declarative_base()
 
@@ -28,3 +60,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Async varijanta get_db za async rute - upiti ne blokiraju event loop.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
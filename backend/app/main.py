@@ -1,12 +1,50 @@
 
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers import auth
 from app.routers import chat
 from app.routers import admin
 from app.routers import message
+from app.utils.llm import start_llm_pool, close_llm_client
+from app.utils.memory_queue import start_memory_worker, stop_memory_worker
+from app.utils.memory import memory_manager
+from app.utils.pdf_extract import shutdown_pdf_extractor
+from app.utils.prompt_budget import warmup_token_counters
+from app.utils.write_queue import start_write_queue, stop_write_queue
+from app.utils.embedding_service import shutdown_embedding_service
+from app.utils.memory_compaction import start_memory_compaction, stop_memory_compaction
+from app.utils.metrics import MetricsMiddleware, registry
+from starlette.concurrency import run_in_threadpool
+from config import get_config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_llm_pool()
+    if get_config()['MEMORY_WARMUP']:
+        try:
+            await run_in_threadpool(memory_manager.warmup)
+        except Exception as e:
+            # Bez warmup-a memorija se inicijalizuje pri prvoj upotrebi
+            print(f"Memory warmup error: {e}")
+    # Tokenizer se učitava pre prvog zahteva, ne u njemu
+    await run_in_threadpool(warmup_token_counters)
+    start_write_queue()
+    start_memory_worker()
+    start_memory_compaction()
+    yield
+    await stop_memory_compaction()
+    await stop_memory_worker()
+    # Upisi koji su već u redu se potvrđuju pre gašenja
+    await stop_write_queue()
+    shutdown_pdf_extractor()
+    shutdown_embedding_service()
+    # Zaustavljanje health probe-a i zatvaranje keep-alive konekcija ka Ollama serverima
+    await close_llm_client()
 
 
 app = FastAPI(
@@ -14,7 +52,8 @@ app = FastAPI(
     description="Backend API for Local Personal Dev Assistant ",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 
@@ -34,7 +73,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 
@@ -64,3 +105,8 @@ def health_check():
         "status": "healthy",
         "database": "connected"
     }
+
+
+@app.get("/metrics", response_class=PlainTextResponse, summary="Prometheus metrike", description="Histogrami trajanja faza obrade poruke i Ollama generisanja, brojači zahteva po ruti i broj aktivnih LLM poziva, u Prometheus text formatu.")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
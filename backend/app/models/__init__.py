@@ -6,6 +6,7 @@ from app.models.mode import Mode
 from app.models.chat import Chat
 from app.models.message import Message
 from app.models.document import Document
+from app.models.stats import UserStats, ModeStats, DailyStats, ModelStats, GenerationTimeStats
 
 
 __all__ = [
@@ -14,5 +15,10 @@ __all__ = [
     "Mode",
     "Chat",
     "Message",
-    "Document"
+    "Document",
+    "UserStats",
+    "ModeStats",
+    "DailyStats",
+    "ModelStats",
+    "GenerationTimeStats"
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -11,6 +11,9 @@ class Chat(Base):
     title = Column(String, nullable=False, default="New chat")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Rolling sažetak razgovora i id poslednje poruke koju pokriva
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
     
     #relacija sa User tabelom
     user = relationship("User", back_populates="chats")
@@ -20,6 +20,9 @@ class Document(Base):
     file_type = Column(String, nullable=True)
     file_size = Column(Integer, nullable=True) 
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Chroma kolekcija sa delovima dokumenta (RAG) i broj indeksiranih delova
+    collection_name = Column(String, nullable=True)
+    chunk_count = Column(Integer, nullable=True)
     
     
     messages = relationship("Message", secondary=message_documents, back_populates="documents")
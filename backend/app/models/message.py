@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
 class Message(Base):
     __tablename__ = "messages"
+    # Stranice istorije se čitaju po (chat_id, id) - keyset paginacija bez skeniranja celog četa
+    __table_args__ = (Index("ix_messages_chat_id_id", "chat_id", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
@@ -12,6 +14,17 @@ class Message(Base):
     role = Column(String, nullable=False)  
     mode_id = Column(Integer, ForeignKey("modes.id"), nullable=True)  
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Statistika generisanja (samo za odgovore asistenta): brojači tokena i trajanja koja vraća Ollama
+    # i procena tokena po sekciji prompta (JSON iz PromptBudget.fit)
+    model_name = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    total_duration_ms = Column(Integer, nullable=True)
+    load_duration_ms = Column(Integer, nullable=True)
+    prompt_eval_ms = Column(Integer, nullable=True)
+    eval_ms = Column(Integer, nullable=True)
+    prompt_breakdown = Column(Text, nullable=True)
     
    
     chat = relationship("Chat", back_populates="messages")
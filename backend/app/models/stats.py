@@ -0,0 +1,57 @@
+from sqlalchemy import Column, Integer, String, Index
+from app.database import Base
+
+# Zbirni brojači za administratorsku statistiku. Ažuriraju se u istoj transakciji u kojoj se
+# upisuju ili brišu poruke i četovi (app/utils/stats_rollup.py); scripts/rebuild_stats.py ih
+# ponovo računa iz messages/chats.
+
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+    # Najaktivniji korisnici se čitaju po indeksu, bez sortiranja cele tabele
+    __table_args__ = (Index("ix_user_stats_message_count", "message_count"),)
+
+    user_id = Column(Integer, primary_key=True)
+    chat_count = Column(Integer, nullable=False, default=0)
+    message_count = Column(Integer, nullable=False, default=0)
+
+
+class ModeStats(Base):
+    __tablename__ = "mode_stats"
+
+    # 0 = poruke bez moda
+    mode_id = Column(Integer, primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+
+
+class DailyStats(Base):
+    __tablename__ = "daily_stats"
+
+    # YYYY-MM-DD (SQLite date())
+    day = Column(String, primary_key=True)
+    chat_count = Column(Integer, nullable=False, default=0)
+    message_count = Column(Integer, nullable=False, default=0)
+
+
+class ModelStats(Base):
+    __tablename__ = "model_stats"
+
+    model_name = Column(String, primary_key=True)
+    responses = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    prompt_responses = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    completion_responses = Column(Integer, nullable=False, default=0)
+    # Tokeni i vreme generisanja samo za odgovore koji imaju oba podatka (za tokene/s)
+    timed_completion_tokens = Column(Integer, nullable=False, default=0)
+    timed_eval_ms = Column(Integer, nullable=False, default=0)
+    cold_starts = Column(Integer, nullable=False, default=0)
+
+
+class GenerationTimeStats(Base):
+    __tablename__ = "generation_time_stats"
+
+    # Histogram ukupnog trajanja generisanja po modu; bucket_ms je gornja granica
+    mode_id = Column(Integer, primary_key=True)
+    bucket_ms = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
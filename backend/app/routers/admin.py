@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
 from typing import List
@@ -9,6 +9,16 @@ from app.schemas.admin import UserAdminResponse, UpdateUserRoleRequest
 from app.utils.deps import get_current_user,get_current_admin_user
 from sqlalchemy import text
 
+from app.utils.llm import get_backend_pool
+from app.utils.memory_queue import memory_queue
+from app.utils.memory import scope_classifier, memory_manager
+from app.utils.pdf_extract import get_pdf_extractor
+from app.utils.chat_cache import get_chat_cache
+from app.utils.write_queue import get_write_queue
+from app.utils.embedding_service import get_embedding_service
+from app.utils.memory_compaction import get_memory_compactor
+from app.utils import stats_rollup
+from starlette.concurrency import run_in_threadpool
 from config import update_config, get_config;
 
 router = APIRouter(
@@ -29,39 +39,29 @@ def get_admin_user(current_user: User = Depends(get_current_user)):
     return current_user
 
 
-@router.get("/stats", summary="Administratorska statistika", description="Generiše detaljan izveštaj o broju korisnika, četova, prosečnoj dužini razgovora i najaktivnijim korisnicima.")
-def get_admin_dashboard_stats(
-    db: Session = Depends(get_db), 
-    admin: User = Depends(get_admin_user) 
-):
-   
+def _dashboard_stats(db: Session) -> dict:
+    """Statistika iz zbirnih tabela: cena ne zavisi od broja poruka (samo users ide direktno)."""
     total_users = db.query(func.count(User.id)).scalar() or 0
-    total_chats = db.query(func.count(Chat.id)).scalar() or 0
-    
-    
-    avg_conv = db.execute(text("""
-        SELECT ROUND(CAST(COUNT(m.id) AS FLOAT) / NULLIF(COUNT(DISTINCT c.id), 0),1)
-        FROM chats c
-        LEFT JOIN messages m ON c.id = m.chat_id
-    """)).scalar() or 0
+    total_chats, total_messages = db.execute(text("""
+        SELECT COALESCE(SUM(chat_count), 0), COALESCE(SUM(message_count), 0) FROM daily_stats
+    """)).one()
+    avg_conv = round(total_messages / total_chats, 1) if total_chats else 0
     
    
     modes_raw = db.execute(text("""
-        SELECT COALESCE(mo.name, 'Default/Nepoznato'), COUNT(m.id) as count
-        FROM messages m 
-        LEFT JOIN modes mo ON m.mode_id = mo.id
-        GROUP BY mo.id, mo.name
+        SELECT COALESCE(mo.name, 'Default/Nepoznato'), s.message_count
+        FROM mode_stats s
+        LEFT JOIN modes mo ON s.mode_id = mo.id
+        WHERE s.message_count > 0
     """)).fetchall()
     
    
     top_users_raw = db.execute(text("""
-        SELECT u.email, COUNT(m.id) as msg_count
-        FROM users u
-        JOIN chats c ON u.id = c.user_id
-        JOIN messages m ON c.id = m.chat_id
-        WHERE u.role_id != 'guest'
-        GROUP BY u.id, u.email 
-        ORDER BY msg_count DESC 
+        SELECT u.email, s.message_count
+        FROM user_stats s
+        JOIN users u ON u.id = s.user_id
+        WHERE u.role_id != 'guest' AND s.message_count > 0
+        ORDER BY s.message_count DESC 
         LIMIT 5
     """)).fetchall()
     
@@ -69,6 +69,27 @@ def get_admin_dashboard_stats(
     roles_raw = db.execute(text("""
         SELECT role_id, COUNT(*) FROM users GROUP BY role_id
     """)).fetchall()
+
+    # Protok po modelu: tokeni odgovora / vreme generisanja, uz broj hladnih startova (dugo učitavanje modela)
+    models_raw = db.execute(text("""
+        SELECT model_name, responses, timed_completion_tokens, timed_eval_ms,
+               prompt_tokens, prompt_responses, completion_tokens, completion_responses, cold_starts
+        FROM model_stats
+        WHERE responses > 0
+        ORDER BY model_name
+    """)).fetchall()
+
+    # p50/p95 trajanja generisanja po modu iz histograma (gornja granica bucket-a)
+    buckets_raw = db.execute(text("""
+        SELECT COALESCE(mo.name, 'Default/Nepoznato'), s.bucket_ms, s.count
+        FROM generation_time_stats s
+        LEFT JOIN modes mo ON s.mode_id = mo.id
+        WHERE s.count > 0
+        ORDER BY s.mode_id, s.bucket_ms
+    """)).fetchall()
+    buckets = {}
+    for mode, bucket_ms, count in buckets_raw:
+        buckets.setdefault(mode, []).append((bucket_ms, count))
     
     return {
         "summary": {
@@ -78,10 +99,31 @@ def get_admin_dashboard_stats(
         },
         "modes": [["Mode", "Count of message"]] + [[r[0], r[1]] for r in modes_raw],
         "top_users": [["User", "Count of message"]] + [[r[0], r[1]] for r in top_users_raw],
-        "roles": [["Role", "Number"]] + [[r[0], r[1]] for r in roles_raw]
+        "roles": [["Role", "Number"]] + [[r[0], r[1]] for r in roles_raw],
+        "models": [["Model", "Responses", "Tokens/s", "Avg prompt tokens", "Avg completion tokens", "Cold starts"]] + [
+            [r[0], r[1], round(r[2] / (r[3] / 1000), 1) if r[2] and r[3] else 0,
+             round(r[4] / r[5], 1) if r[5] else 0, round(r[6] / r[7], 1) if r[7] else 0, r[8]]
+            for r in models_raw
+        ],
+        "generation_times": [["Mode", "p50 (s)", "p95 (s)"]] + [
+            [mode, stats_rollup.percentile_from_buckets(mode_buckets, 0.5), stats_rollup.percentile_from_buckets(mode_buckets, 0.95)]
+            for mode, mode_buckets in buckets.items()
+        ]
     }
 
 
+_stats_cache = stats_rollup.TTLValue(get_config()['ADMIN_STATS_TTL'])
+
+
+@router.get("/stats", summary="Administratorska statistika", description="Generiše detaljan izveštaj o broju korisnika, četova, prosečnoj dužini razgovora, najaktivnijim korisnicima, protoku (tokena/s) i hladnim startovima po modelu i p50/p95 trajanju generisanja po modu. Čita se iz zbirnih tabela i kešira na ADMIN_STATS_TTL sekundi.")
+def get_admin_dashboard_stats(
+    db: Session = Depends(get_db), 
+    admin: User = Depends(get_admin_user) 
+):
+    
+    return _stats_cache.get(lambda: _dashboard_stats(db))
+
+
 # Lista svih korisnika (bez guest-ova)
 @router.get("/users", response_model=List[UserAdminResponse], summary="Lista svih korisnika", description="Vraća listu svih registrovanih korisnika. Guest nalozi su isključeni iz rezultata.")
 def get_all_users(
@@ -93,10 +135,18 @@ def get_all_users(
     return users
 
 
+def _purge_user_memories(user_id: int):
+    try:
+        memory_manager.delete_user_memories(user_id)
+    except Exception as e:
+        print(f"Memory purge error: {e}")
+
+
 #  Ne može brisati admin-e
 @router.delete("/users/{user_id}", summary="Brisanje korisnika", description="Trajno briše korisnika iz baze. Admin ne može obrisati samog sebe niti druge administratore.")
 def delete_user(
     user_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     admin: User = Depends(get_admin_user)
 ):
@@ -122,9 +172,13 @@ def delete_user(
             detail="Cannot delete admin users"
         )
     
-    # Obriši korisnika 
+    # Obriši korisnika (zbirne tabele se umanjuju pre brisanja njegovih četova i poruka)
+    for statement, params in stats_rollup.user_removed(user_id):
+        db.execute(statement, params)
     db.delete(user)
     db.commit()
+    get_chat_cache().invalidate_user(user_id)
+    background_tasks.add_task(_purge_user_memories, user_id)
     
     return {
         "message": f"User {user.email} deleted successfully",
@@ -197,9 +251,68 @@ def get_ai_config(current_user=Depends(get_current_admin_user)):
     return get_config()
 
 
+@router.get("/ai-backends", summary="Stanje Ollama servera", description="Vraća listu Ollama servera iz pool-a sa brojem aktivnih zahteva i rezultatom poslednje provere zdravlja.")
+def get_ai_backends(current_user=Depends(get_current_admin_user)):
+    
+    return get_backend_pool().status()
 
 
+@router.get("/memory-queue", summary="Stanje reda memorija", description="Vraća broj memorija koje čekaju upis (depth), starost najstarije (lag), broj zapisa koji se ponovo pokušavaju i parkiranih, i statistiku poslednje obrađene grupe.")
+def get_memory_queue_stats(current_user=Depends(get_current_admin_user)):
+    
+    return memory_queue.stats()
 
 
+@router.post("/memory-queue/requeue", summary="Vraćanje parkiranih memorija u red", description="Vraća u red memorije parkirane posle previše neuspešnih pokušaja upisa (npr. kada je uzrok greške otklonjen).")
+async def requeue_parked_memories(current_user=Depends(get_current_admin_user)):
+    
+    requeued = await run_in_threadpool(memory_queue.requeue_parked)
+    return {"requeued": requeued}
+
+
+@router.get("/memory-classifier", summary="Statistika klasifikatora memorije", description="Vraća broj pogodaka i prosečno vreme po nivou klasifikatora (keš, pravila, embedding, LLM).")
+def get_memory_classifier_stats(current_user=Depends(get_current_admin_user)):
+    
+    return scope_classifier.get_stats()
+
+
+@router.get("/recall-cache", summary="Statistika keša recall-a", description="Vraća pogotke i promašaje keša embedding-a upita i keša rezultata pretrage memorije, stopu pogodaka i broj invalidacija.")
+def get_recall_cache_stats(current_user=Depends(get_current_admin_user)):
+    
+    return memory_manager.recall_cache.get_stats()
+
+
+@router.get("/memory-compaction", summary="Statistika sažimanja memorije", description="Vraća izveštaj poslednjeg sažimanja (spojeni duplikati, istekle i izbačene memorije, trajanje) i ukupne brojače od pokretanja servera.")
+def get_memory_compaction_stats(current_user=Depends(get_current_admin_user)):
+    
+    return get_memory_compactor().get_stats()
+
 
+@router.post("/memory-compaction", summary="Pokretanje sažimanja memorije", description="Odmah spaja skoro iste memorije, briše istekle memorije razgovora i primenjuje limit po korisniku. Vraća izveštaj o oslobođenim memorijama.")
+async def run_memory_compaction(current_user=Depends(get_current_admin_user)):
+    
+    return await run_in_threadpool(get_memory_compactor().compact)
 
+
+@router.get("/embeddings", summary="Statistika servisa za embedding", description="Vraća broj zahteva, tekstova i prolaza kroz model, prosečnu veličinu grupe i protok (tekstova/s).")
+def get_embedding_stats(current_user=Depends(get_current_admin_user)):
+    
+    return get_embedding_service().get_stats()
+
+
+@router.get("/pdf-stats", summary="Statistika ekstrakcije PDF-a", description="Vraća broj obrađenih dokumenata i strana, protok (strana/s, bajtova/s), pogotke keša i broj timeout-a.")
+def get_pdf_stats(current_user=Depends(get_current_admin_user)):
+    
+    return get_pdf_extractor().get_stats()
+
+
+@router.get("/db-writes", summary="Statistika grupisanih upisa", description="Vraća da li je grupisanje upisa uključeno, broj grupa i upisa, prosečnu veličinu grupe i trajanje commit-a.")
+def get_db_write_stats(current_user=Depends(get_current_admin_user)):
+    
+    return get_write_queue().get_stats()
+
+
+@router.get("/chat-cache", summary="Statistika keša četova", description="Vraća broj pogodaka i promašaja keša istorije i vlasništva četova, broj izbačenih stavki i trenutnu veličinu.")
+def get_chat_cache_stats(current_user=Depends(get_current_admin_user)):
+    
+    return get_chat_cache().get_stats()
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime,timezone
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models.user import User
 from app.schemas.auth import (
     UserRegisterRequest,
@@ -14,6 +18,7 @@ from app.schemas.auth import (
 )
 from app.utils.security import hash_password, verify_password, create_user_token
 from app.utils.deps import get_current_user
+from app.utils.write_queue import run_write
 
 
 
@@ -26,14 +31,14 @@ router = APIRouter(
 
 
 @router.post("/register", response_model=UserRegisterResponse, status_code=status.HTTP_201_CREATED, summary="Registracija novog korisnika", description="Kreira novi korisnički nalog, hešuje lozinku i dodeljuje podrazumevanu ulogu 'standard_user'.")
-def register(
+async def register(
     request: UserRegisterRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     
     
     #Provera da li email postoji
-    existing_user = db.query(User).filter(User.email == request.email).first()
+    existing_user = (await db.execute(select(User).where(User.email == request.email))).scalars().first()
     
     if existing_user:
         raise HTTPException(
@@ -42,21 +47,31 @@ def register(
         )
     
 
-    hashed_password = hash_password(request.password)
+    # bcrypt je CPU posao, ne sme da blokira event loop
+    hashed_password = await run_in_threadpool(hash_password, request.password)
     
 
-    new_user = User(
-        email=request.email,
-        full_name=request.full_name,
-        password=hashed_password,
-        role_id="standard_user",
-        created_at=datetime.now(timezone.utc)
-    )
-    
-    # Dpdavanje u bazu
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    async def insert(session):
+        new_user = User(
+            email=request.email,
+            full_name=request.full_name,
+            password=hashed_password,
+            role_id="standard_user",
+            created_at=datetime.now(timezone.utc)
+        )
+        session.add(new_user)
+        await session.flush()
+        return new_user
+
+    # Dpdavanje u bazu (direktno ili kroz red grupisanih upisa)
+    try:
+        new_user = await run_write(db, insert)
+    except IntegrityError:
+        # Isti email registrovan u međuvremenu
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
     # 5. Vrati odgovor
     return new_user
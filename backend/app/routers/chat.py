@@ -1,16 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from pydantic import BaseModel
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from sqlalchemy import select, delete, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime, timezone
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models.chat import Chat
 from app.models.user import User
 from app.models.message import Message
-from app.models.document import Document
-from app.schemas.chat import ChatResponse
+from app.models.document import Document, message_documents
+from app.schemas.chat import ChatResponse, ChatHistoryResponse, ChatSummaryResponse
 from app.utils.deps import get_current_user
+from app.utils.chat_cache import get_chat_cache
+from app.utils.write_queue import run_write
+from app.utils import stats_rollup
+from app.utils.memory import memory_manager
+from app.utils.memory_queue import memory_queue
+from app.utils.document_index import document_index
 
 router = APIRouter(
     prefix="/chat",
@@ -20,103 +28,242 @@ router = APIRouter(
 class ChatUpdate(BaseModel):
     title: str
 
+class ChatBulkDelete(BaseModel):
+    chat_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+# Dužina pregleda poslednje poruke u listi četova
+PREVIEW_LENGTH = 120
+
+
+def _purge_chat_vectors(user_id: int, chat_ids: list, collection_names: list):
+    """Pozadinsko čišćenje posle brisanja četova: memorije koje čekaju upis, memorije četova
+    u Chromi i kolekcije delova dokumenata. Ne utiče na vreme odgovora."""
+    try:
+        memory_queue.discard_chats(chat_ids)
+        memory_manager.delete_chat_memories(user_id, chat_ids)
+        document_index.delete(collection_names)
+    except Exception as e:
+        print(f"Chat purge error: {e}")
+
+
+async def _delete_chats(db, background_tasks, user_id: int, chat_ids: list) -> list:
+    """Briše četove korisnika skupovnim DELETE upitima (broj upita ne zavisi od broja poruka)
+    i zakazuje čišćenje Chrome. Vraća id-jeve stvarno obrisanih četova."""
+    async def remove(session):
+        owned = list((await session.execute(
+            select(Chat.id).where(Chat.id.in_(chat_ids), Chat.user_id == user_id)
+        )).scalars())
+        if not owned:
+            return [], []
+
+        message_ids = select(Message.id).where(Message.chat_id.in_(owned))
+        documents = (await session.execute(
+            select(Document.id, Document.collection_name)
+            .join(message_documents, message_documents.c.document_id == Document.id)
+            .where(message_documents.c.message_id.in_(message_ids))
+            .distinct()
+        )).all()
+
+        # Zbirne tabele se umanjuju pre brisanja, dok su poruke još tu
+        await stats_rollup.apply_rollups(session, stats_rollup.chats_removed(owned))
+
+        no_sync = {"synchronize_session": False}
+        await session.execute(delete(message_documents).where(message_documents.c.message_id.in_(message_ids)))
+        if documents:
+            await session.execute(delete(Document).where(Document.id.in_([d.id for d in documents])), execution_options=no_sync)
+        await session.execute(delete(Message).where(Message.chat_id.in_(owned)), execution_options=no_sync)
+        await session.execute(delete(Chat).where(Chat.id.in_(owned)), execution_options=no_sync)
+        return owned, [d.collection_name for d in documents if d.collection_name]
+
+    deleted, collection_names = await run_write(db, remove)
+
+    cache = get_chat_cache()
+    for chat_id in deleted:
+        cache.invalidate(chat_id)
+    if deleted:
+        background_tasks.add_task(_purge_chat_vectors, user_id, deleted, collection_names)
+    return deleted
+
 @router.post("/create", response_model=ChatResponse, summary="Kreiranje novog četa", description="Inicijalizuje novu sesiju razgovora za ulogovanog korisnika.")
-def create_chat(
-    db: Session = Depends(get_db),
+async def create_chat(
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    now = datetime.now()
-    new_chat = Chat(
-        user_id=current_user.id,
-        title="New chat",
-        created_at=now,
-        updated_at=now
+    now = datetime.now(timezone.utc)
+    user_id = current_user.id
+
+    async def insert(session):
+        new_chat = Chat(
+            user_id=user_id,
+            title="New chat",
+            created_at=now,
+            updated_at=now,
+            messages=[]
+        )
+        session.add(new_chat)
+        await session.flush()
+        await stats_rollup.apply_rollups(session, stats_rollup.chats_added([new_chat.id]))
+        return new_chat
+
+    return await run_write(db, insert)
+
+def _summary_query(user_id: int):
+    """Četovi korisnika sa brojem poruka i početkom poslednje poruke, bez učitavanja istorije.
+    Jedan upit: broj poruka i poslednja poruka su korelisani podupiti nad indeksom (chat_id, id)."""
+    message_count = (
+        select(func.count(Message.id)).where(Message.chat_id == Chat.id).correlate(Chat).scalar_subquery()
+    )
+    last_message = (
+        select(func.substr(Message.content, 1, PREVIEW_LENGTH + 1))
+        .where(Message.chat_id == Chat.id)
+        .order_by(Message.id.desc())
+        .limit(1)
+        .correlate(Chat)
+        .scalar_subquery()
+    )
+    return (
+        select(Chat.id, Chat.user_id, Chat.title, Chat.created_at, Chat.updated_at,
+               message_count.label("message_count"), last_message.label("last_message"))
+        .where(Chat.user_id == user_id)
     )
 
-    db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
 
-    return new_chat
+def _summary_row(row) -> dict:
+    chat = dict(row)
+    if chat["last_message"] and len(chat["last_message"]) > PREVIEW_LENGTH:
+        chat["last_message"] = chat["last_message"][:PREVIEW_LENGTH] + "…"
+    return chat
 
-@router.get("/get-all", response_model=List[ChatResponse], summary="Istorija svih četova", description="Vraća listu svih sesija razgovora trenutnog korisnika, poređanih od najnovijih.")
-def get_all_user_chats(
-    db: Session = Depends(get_db),
+@router.get("/get-all", response_model=List[ChatSummaryResponse], summary="Istorija svih četova", description="Vraća listu sesija razgovora trenutnog korisnika, poređanih od najnovijih, sa brojem poruka i početkom poslednje poruke. Podržava stranice (limit/offset) i updated_after za dopunu samo promenjenih četova.")
+async def get_all_user_chats(
+    limit: int = Query(100, ge=1, le=500, description="Broj četova po stranici"),
+    offset: int = Query(0, ge=0),
+    updated_after: Optional[datetime] = Query(None, description="Vrati samo četove menjane posle ovog trenutka"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    chats = (
-        db.query(Chat)
-        .filter(Chat.user_id == current_user.id)
-        .order_by(Chat.updated_at.desc())
-        .all()
+    query = (
+        _summary_query(current_user.id)
+        .order_by(Chat.updated_at.desc(), Chat.id.desc())
+        .limit(limit)
+        .offset(offset)
     )
+    if updated_after is not None:
+        query = query.where(Chat.updated_at > updated_after)
+
+    return [_summary_row(row) for row in (await db.execute(query)).mappings()]
+
+async def _has_messages(db, chat_id, condition):
+    return (await db.execute(
+        select(Message.id).where(Message.chat_id == chat_id, condition).limit(1)
+    )).first() is not None
 
-    return chats
 
-@router.get("/{chat_id}", response_model=ChatResponse, summary="Detalji jednog četa", description="Vraća punu istoriju poruka za određeni čet, uključujući i metapodatke o fajlovima.")
-def get_chat_by_id(
+@router.get("/{chat_id}", response_model=ChatHistoryResponse, summary="Detalji jednog četa", description="Vraća jednu stranicu istorije poruka (podrazumevano najnovije), uključujući i metapodatke o fajlovima. Starije poruke se traže sa before_id, novije sa after_id (id prve/poslednje poruke sa prethodne stranice).")
+async def get_chat_by_id(
     chat_id: int, 
-    db: Session = Depends(get_db),
+    before_id: Optional[int] = Query(None, description="Vrati poruke starije od ove"),
+    after_id: Optional[int] = Query(None, description="Vrati poruke novije od ove"),
+    limit: int = Query(50, ge=1, le=200, description="Broj poruka po stranici"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    chat = (
-        db.query(Chat)
-        .options(
-            joinedload(Chat.messages).joinedload(Message.documents)
-        ) 
-        .filter(Chat.id == chat_id, Chat.user_id == current_user.id)
-        .first()
-    )
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+
+    chat = (await db.execute(
+        select(Chat).where(Chat.id == chat_id, Chat.user_id == current_user.id)
+    )).scalars().first()
     
     if not chat:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found or you don't have access"
         )
-        
-    return chat
 
-@router.patch("/{chat_id}", response_model=ChatResponse, summary="Promena naslova četa", description="Ažurira naziv sesije razgovora (npr. preimenovanje 'New chat' u smisleniji naslov).")
-def update_chat_title(
+    # Keyset po id poruke (indeks chat_id, id); dokumenti stižu jednim IN upitom za celu stranicu
+    query = select(Message).options(selectinload(Message.documents)).where(Message.chat_id == chat_id)
+    if after_id is not None:
+        query = query.where(Message.id > after_id).order_by(Message.id.asc())
+    else:
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        query = query.order_by(Message.id.desc())
+
+    # Jedan red viška govori da li postoji još poruka u tom smeru
+    page = list((await db.execute(query.limit(limit + 1))).scalars())
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    if after_id is not None:
+        has_older = await _has_messages(db, chat_id, Message.id <= after_id)
+        has_newer = has_more
+    else:
+        page.reverse()
+        has_older = has_more
+        has_newer = before_id is not None and await _has_messages(db, chat_id, Message.id >= before_id)
+
+    return ChatHistoryResponse.model_validate({
+        "id": chat.id,
+        "user_id": chat.user_id,
+        "title": chat.title,
+        "created_at": chat.created_at,
+        "updated_at": chat.updated_at,
+        "messages": page,
+        "has_older": has_older,
+        "has_newer": has_newer
+    }, from_attributes=True)
+
+@router.patch("/{chat_id}", response_model=ChatSummaryResponse, summary="Promena naslova četa", description="Ažurira naziv sesije razgovora (npr. preimenovanje 'New chat' u smisleniji naslov). Vraća stavku liste četova, bez poruka.")
+async def update_chat_title(
     chat_id: int,
     update_data: ChatUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == current_user.id).first()
-    
-    if not chat:
+    now = datetime.now(timezone.utc)
+    user_id = current_user.id
+
+    async def rename(session):
+        result = await session.execute(
+            update(Chat).where(Chat.id == chat_id, Chat.user_id == user_id).values(title=update_data.title, updated_at=now)
+        )
+        return result.rowcount
+
+    # Jedan UPDATE (vlasništvo je u WHERE uslovu); istorija poruka se ne učitava
+    if not await run_write(db, rename):
         raise HTTPException(status_code=404, detail="Chat not found")
-        
-    chat.title = update_data.title
-    chat.updated_at = datetime.now()
-    db.commit()
-    db.refresh(chat)
-    return chat
+
+    row = (await db.execute(_summary_query(user_id).where(Chat.id == chat_id))).mappings().first()
+    return _summary_row(row)
+
+@router.post("/delete-bulk", summary="Brisanje više četova", description="Trajno briše više četova odjednom, sa porukama i dokumentima. Četovi koji ne postoje ili pripadaju drugom korisniku se vraćaju u not_found.")
+async def delete_chats_bulk(
+    request: ChatBulkDelete,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    requested = list(dict.fromkeys(request.chat_ids))
+    deleted = await _delete_chats(db, background_tasks, current_user.id, requested)
+    deleted_ids = set(deleted)
+
+    return {
+        "status": "success",
+        "deleted": deleted,
+        "not_found": [chat_id for chat_id in requested if chat_id not in deleted_ids]
+    }
 
 @router.delete("/{chat_id}", summary="Brisanje četa", description="Trajno briše čet, sve njegove poruke i reference na dokumente iz baze podataka.")
-def delete_chat(
+async def delete_chat(
     chat_id: int,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    chat = db.query(Chat).filter(Chat.id == chat_id, Chat.user_id == current_user.id).first()
+    deleted = await _delete_chats(db, background_tasks, current_user.id, [chat_id])
     
-    if not chat:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Chat ne postoji")
-
-    messages = db.query(Message).filter(Message.chat_id == chat_id).all()
-    
-    document_ids = []
-    for msg in messages:
-        for doc in msg.documents:
-            document_ids.append(doc.id)
-
-    db.delete(chat)
-
-    if document_ids:
-        db.query(Document).filter(Document.id.in_(document_ids)).delete(synchronize_session=False)
-        
-    db.commit()
     
-    return {"status": "success", "message": "Chat, poruke i svi pripadajući fajlovi su obrisani iz baze."}
\ No newline at end of file
+    return {"status": "success", "message": "Chat, poruke i svi pripadajući fajlovi su obrisani iz baze."}
@@ -1,119 +1,357 @@
 import os
+import json
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Body, File, UploadFile, Form
-from sqlalchemy.orm import Session
-from datetime import datetime
-from app.database import get_db
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from app.database import get_async_db, AsyncSessionLocal
 from app.models.message import Message
+from app.models.chat import Chat
 from app.models.mode import Mode
 from app.models.user import User
 from app.schemas.message import MessageResponse
 from typing import Optional
-import io
-import PyPDF2 # type: ignore
-import ollama
-from app.models.document import Document
+from app.models.document import Document, message_documents
+from app.utils.document_index import document_index
+from app.utils.pdf_extract import extract_pdf_text
+from app.utils import llm
 from app.utils.deps import get_current_user
-from app.utils.memory import memory_manager, classify_memory_scope
+from app.utils.memory import memory_manager
+from app.utils.memory_queue import memory_queue
+from app.utils.metrics import stage, measure
+from app.utils.prompt_budget import PromptSection, get_prompt_budget
+from app.utils.summary import schedule_summary_update
+from app.utils.chat_cache import ChatState, get_chat_cache
+from app.utils.write_queue import run_write
+from app.utils import stats_rollup
 from config import get_config;
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 
-@router.post("/send", response_model=MessageResponse)
-async def send_message(
-    chat_id: int = Form(...),
-    content: str = Form(...),
-    mode_id: int = Form(...),
-    file: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+async def _load_chat_from_db(db, chat_id):
+    """Čita vlasnika, sažetak, nesažete poruke i indeksirane dokumente četa iz baze."""
     config = get_config()
-    model_name = config['MODEL_NAME']
-    ollama_url = config['OLLAMA_URL']
-    print(f"Config: model={model_name}, url={ollama_url}")
-    file_context = ""
-    new_doc = None
-
-    scope = await classify_memory_scope(content)
-    past_memories = memory_manager.recall_memory(current_user.id, chat_id, content)
-    
-    recent_db_messages = db.query(Message).filter(Message.chat_id == chat_id).order_by(Message.id.desc()).limit(5).all()
-    short_term_history = []
-    for m in reversed(recent_db_messages):
-        short_term_history.append({"role": m.role, "content": m.content})
+    chat = (await db.execute(
+        select(Chat.user_id, Chat.summary, Chat.summary_message_id).where(Chat.id == chat_id)
+    )).first()
+    if chat is None:
+        return None
+
+    # Nesažetih poruka ima najviše prozor + SUMMARY_EVERY (dok pozadinsko sažimanje ne sustigne)
+    window = config['SUMMARY_RECENT_WINDOW'] + config['SUMMARY_EVERY']
+    recent_db_messages = (await db.execute(
+        select(Message.id, Message.role, Message.content)
+        .where(Message.chat_id == chat_id, Message.id > (chat.summary_message_id or 0))
+        .order_by(Message.id.desc())
+        .limit(window)
+    )).all()
+
+    doc_collections = list((await db.execute(
+        select(Document.collection_name)
+        .join(message_documents, message_documents.c.document_id == Document.id)
+        .join(Message, Message.id == message_documents.c.message_id)
+        .where(Message.chat_id == chat_id, Document.collection_name.isnot(None))
+        .distinct()
+    )).scalars())
+    return ChatState(
+        user_id=chat.user_id,
+        summary=chat.summary,
+        summary_message_id=chat.summary_message_id,
+        history=[{"id": m.id, "role": m.role, "content": m.content} for m in reversed(recent_db_messages)],
+        doc_collections=doc_collections
+    )
 
-    if file and file.content_type == "application/pdf":
-        try:
-            pdf_content = await file.read()
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text: file_context += text
-            
-            new_doc = Document(
-                title=file.filename,
-                path=f"uploads/{file.filename}",
-                file_type=file.content_type,
-                file_size=len(pdf_content)
-            )
-        except Exception as e:
-            print(f"PDF Error: {e}")
 
-    db_mode = db.query(Mode).filter(Mode.id == mode_id).first()
+async def _load_chat_state(db, chat_id, mode_id, user_id):
+    """Sažetak četa sa porukama koje on još ne pokriva, instrukcije izabranog moda i indeksirani
+    dokumenti četa. Stanje četa i vlasništvo dolaze iz keša kad je moguće."""
+    cache = get_chat_cache()
+    state = cache.get(chat_id)
+    if state is None:
+        state = await _load_chat_from_db(db, chat_id)
+        if state is not None:
+            cache.put(chat_id, state)
+
+    if state is None or state.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Chat not found or you don't have access")
+
+    db_mode = await db.get(Mode, mode_id)
     mode_instructions = db_mode.description if db_mode else "You are a helpful AI assistant."
+
+    short_term_history = [{"role": m["role"], "content": m["content"]} for m in state.history]
+    return state.summary, short_term_history, mode_instructions, list(state.doc_collections)
+
+
+async def _store_document(db, file, pdf_content, text):
+    """Čuva red u documents i indeksira delove teksta u Chromu (u thread pool-u). Vraća (id dokumenta, rezervni kontekst)."""
+    new_doc = Document(
+        title=file.filename,
+        path=f"uploads/{file.filename}",
+        file_type=file.content_type,
+        file_size=len(pdf_content)
+    )
+    db.add(new_doc)
+    await db.commit()
+    document_id = new_doc.id
+
+    fallback = None
+    try:
+        new_doc.collection_name, new_doc.chunk_count = await run_in_threadpool(document_index.index_document, document_id, text)
+        await db.commit()
+    except Exception as e:
+        # Bez indeksa se koristi samo početak dokumenta, da prompt ostane ograničen
+        print(f"Document index error: {e}")
+        await db.rollback()
+        config = get_config()
+        fallback = text[:config['DOC_CHUNK_SIZE'] * config['DOC_TOP_K']]
+    return document_id, fallback
+
+
+async def _discard_document(document_id):
+    """Briše dokument poruke koja nije sačuvana (red u documents i njegovu Chroma kolekciju), da ne ostane bez poruke."""
+    try:
+        await run_in_threadpool(document_index.delete, [document_index.collection_name(document_id)])
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(Document).where(Document.id == document_id))
+            await session.commit()
+    except Exception as e:
+        print(f"Document cleanup error: {e}")
+
+
+SYSTEM_TEMPLATE = """{mode_instructions}
     
-    memory_string = "\n".join(past_memories) if past_memories else "None"
-    system_content = f"""{mode_instructions}
-    
+    Summary of the earlier conversation:
+    {summary}
+
     Use the following long-term memory only if relevant to the user's current question:
-    {memory_string}
+    {memory}
 
     Context from uploaded document:
-    {file_context if file_context else "No document uploaded."}
+    {document}
     """
 
+
+async def _prepare_conversation(chat_id, content, mode_id, file, db, current_user, model_name):
+    """Priprema system prompt, kratkoročnu istoriju i relevantne delove dokumenata za slanje modelu."""
+    document_id = None
+    pdf_content = None
+    if file and file.content_type == "application/pdf":
+        pdf_content = await file.read()
+
+    # Faze su međusobno nezavisne: Chroma ide u thread pool, SQL preko async sesije,
+    # a PyPDF2 u pool procesa, tako da ukupno traje koliko najsporija faza
+    past_memories, (chat_summary, short_term_history, mode_instructions, doc_collections), pdf_text = await asyncio.gather(
+        measure("recall", run_in_threadpool(memory_manager.recall_memory, current_user.id, chat_id, content)),
+        measure("history", _load_chat_state(db, chat_id, mode_id, current_user.id)),
+        measure("pdf", extract_pdf_text(pdf_content))
+    )
+
+    # Novi dokument se indeksira jednom; kasnije poruke u četu koriste isti indeks
+    document_chunks = []
+    if pdf_text is not None:
+        document_id, fallback = await measure("index", _store_document(db, file, pdf_content, pdf_text))
+        if fallback:
+            document_chunks.append(fallback)
+        else:
+            doc_collections.append(document_index.collection_name(document_id))
+
+    if doc_collections:
+        try:
+            document_chunks += await measure("retrieve", run_in_threadpool(document_index.query, doc_collections, content, get_config()['DOC_TOP_K']))
+        except Exception as e:
+            print(f"Document retrieval error: {e}")
+
+    # Sekcije prompta se skraćuju po prioritetu (prvo memorija, pa najstarija istorija, pa dokument, pa sažetak)
+    sections = [
+        PromptSection("instructions", [mode_instructions, SYSTEM_TEMPLATE], required=True),
+        PromptSection("memory", list(past_memories or []), priority=1),
+        PromptSection("history", [m["content"] for m in short_term_history], priority=2, drop_from="start"),
+        PromptSection("document", document_chunks, priority=3),
+        PromptSection("summary", [chat_summary] if chat_summary else [], priority=4),
+        PromptSection("message", [content], required=True)
+    ]
+    prompt_tokens = await measure("prompt", run_in_threadpool(get_prompt_budget(model_name).fit, sections))
+
+    _, memory_section, history_section, document_section, summary_section, _ = sections
+    memory_string = "\n".join(memory_section.items) if memory_section.items else "None"
+    file_context = "\n---\n".join(document_section.items)
+    system_content = SYSTEM_TEMPLATE.format(
+        mode_instructions=mode_instructions,
+        summary=summary_section.items[0] if summary_section.items else "None",
+        memory=memory_string,
+        document=file_context if file_context else "No document uploaded."
+    )
+
+    kept_history = short_term_history[len(short_term_history) - len(history_section.items):]
     messages = [{"role": "system", "content": system_content}]
-    messages.extend(short_term_history)
+    messages.extend({"role": m["role"], "content": text} for m, text in zip(kept_history, history_section.items))
     messages.append({"role": "user", "content": content})
 
+    return messages, document_id, prompt_tokens
+
+
+def _generation_stats(model_name, response, prompt_tokens) -> dict:
+    """Brojači tokena i trajanja (ns -> ms) iz Ollama odgovora, za red poruke asistenta.
+    Kod strima ih sadrži samo poslednji deo (done=True)."""
+    response = response or {}
+
+    def ms(field):
+        value = response.get(field)
+        return round(value / 1e6) if value else None
+
+    return {
+        "model_name": model_name,
+        "prompt_tokens": response.get("prompt_eval_count"),
+        "completion_tokens": response.get("eval_count"),
+        "total_duration_ms": ms("total_duration"),
+        "load_duration_ms": ms("load_duration"),
+        "prompt_eval_ms": ms("prompt_eval_duration"),
+        "eval_ms": ms("eval_duration"),
+        "prompt_breakdown": json.dumps(prompt_tokens) if prompt_tokens else None
+    }
+
+
+async def _save_exchange(db, chat_id, content, ai_content, mode_id, document_id, stats=None):
+    """Upisuje korisničku poruku i odgovor asistenta (direktno ili kroz red grupisanih upisa).
+    Vraća poruku asistenta (sa učitanim poljima za odgovor) tek kad je upis potvrđen."""
+    async def insert(session):
+        user_msg = Message(chat_id=chat_id, content=content, role="user", mode_id=mode_id, documents=[])
+        if document_id: user_msg.documents.append(await session.get(Document, document_id))
+        session.add(user_msg)
+
+        ai_msg = Message(chat_id=chat_id, content=ai_content, role="assistant", mode_id=mode_id, documents=[], **(stats or {}))
+        session.add(ai_msg)
+        # Nova poruka pomera čet na vrh liste (i u updated_after dopunu)
+        await session.execute(update(Chat).where(Chat.id == chat_id).values(updated_at=datetime.now(timezone.utc)))
+        await session.flush()
+        await stats_rollup.apply_rollups(session, stats_rollup.messages_added([user_msg.id, ai_msg.id]))
+        # timestamp postavlja baza
+        await session.refresh(ai_msg, ["timestamp"])
+        saved = [
+            {"id": user_msg.id, "role": "user", "content": content},
+            {"id": ai_msg.id, "role": "assistant", "content": ai_content}
+        ]
+        return ai_msg, saved
+
+    ai_msg, saved = await run_write(db, insert)
+
+    # Write-through u keš četa; novi dokument menja listu kolekcija, pa se stanje čita ponovo
+    if document_id:
+        get_chat_cache().invalidate(chat_id)
+    else:
+        get_chat_cache().append(chat_id, saved)
+    return ai_msg
+
+
+@router.post("/send", response_model=MessageResponse)
+async def send_message(
+    chat_id: int = Form(...),
+    content: str = Form(...),
+    mode_id: int = Form(...),
+    file: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    model_name = get_config()['MODEL_NAME']
+
+    messages, document_id, prompt_tokens = await _prepare_conversation(chat_id, content, mode_id, file, db, current_user, model_name)
+
     try:
-        response = ollama.chat(model=model_name, messages=messages)
+        with stage("llm"):
+            response = await llm.chat(model_name, messages)
         ai_content = response['message']['content']
 
-        user_msg = Message(chat_id=chat_id, content=content, role="user", mode_id=mode_id)
-        if new_doc: user_msg.documents.append(new_doc)
-        db.add(user_msg)
-        
-        ai_msg = Message(chat_id=chat_id, content=ai_content, role="assistant", mode_id=mode_id)
-        db.add(ai_msg)
-        
-        memory_manager.add_memory(current_user.id, chat_id, content, ai_content, scope)
-        
-        db.commit()
-        db.refresh(ai_msg)
-        return ai_msg
+        with stage("save"):
+            ai_msg = await _save_exchange(db, chat_id, content, ai_content, mode_id, document_id,
+                                          _generation_stats(model_name, response, prompt_tokens))
 
     except Exception as e:
-        db.rollback()
+        if document_id:
+            await _discard_document(document_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+    # Klasifikacija i upis memorije, kao i sažimanje razgovora, rade se u pozadini, van puta odgovora
+    try:
+        await run_in_threadpool(memory_queue.enqueue, current_user.id, chat_id, content, ai_content)
+    except Exception as e:
+        print(f"Memory Error: {e}")
+    schedule_summary_update(chat_id)
+    return ai_msg
+
+
+@router.post("/send-stream", summary="Slanje poruke uz strimovanje odgovora", description="Isto kao /send, ali vraća odgovor token po token kao NDJSON (jedan JSON objekat po liniji). Poslednja linija sadrži sačuvanu poruku asistenta.")
+async def send_message_stream(
+    chat_id: int = Form(...),
+    content: str = Form(...),
+    mode_id: int = Form(...),
+    file: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    model_name = get_config()['MODEL_NAME']
+    user_id = current_user.id
+
+    messages, document_id, prompt_tokens = await _prepare_conversation(chat_id, content, mode_id, file, db, current_user, model_name)
+
+    async def event_stream():
+        # Sesija iz zavisnosti se zatvara nezavisno od toka odgovora, zato upis ide kroz sopstvenu sesiju
+        ai_content = ""
+        final_chunk = None
+        saved = None
+        try:
+            with stage("llm"):
+                async for chunk in await llm.chat(model_name, messages, stream=True):
+                    if chunk.get('done'):
+                        final_chunk = chunk
+                    token = chunk['message']['content']
+                    if token:
+                        ai_content += token
+                        yield json.dumps({"type": "token", "content": token}) + "\n"
+
+            async with AsyncSessionLocal() as stream_db:
+                with stage("save"):
+                    ai_msg = await _save_exchange(stream_db, chat_id, content, ai_content, mode_id, document_id,
+                                                  _generation_stats(model_name, final_chunk, prompt_tokens))
+                saved = MessageResponse.model_validate(ai_msg).model_dump(mode="json")
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        finally:
+            # Greška ili prekinut strim: dokument bez sačuvane poruke se briše
+            if saved is None and document_id:
+                await _discard_document(document_id)
+
+        try:
+            await run_in_threadpool(memory_queue.enqueue, user_id, chat_id, content, ai_content)
+        except Exception as e:
+            print(f"Memory Error: {e}")
+
+        schedule_summary_update(chat_id)
+
+        yield json.dumps({"type": "done", "message": saved}) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 
 @router.get("/modes", summary="Dostupni AI režimi", description="Vraća listu svih modova rada")
-def fetch_modes(db: Session = Depends(get_db)):
-    return db.query(Mode).all()
+async def fetch_modes(db: AsyncSession = Depends(get_async_db)):
+    return (await db.execute(select(Mode))).scalars().all()
 
 @router.post("/send-anonymous", summary="Anonimni čet (Guest)", description="Ograničena ruta za posetioce bez naloga. Ne podržava memoriju niti slanje fajlova.")
 async def send_message_anonymous(
     content: str = Body(...),
     mode_id: int = Body(default=4),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_mode = db.query(Mode).filter(Mode.id == 4).first()
+    db_mode = await db.get(Mode, 4)
     system_instructions = db_mode.description if db_mode and db_mode.description else "You are a helpful AI assistant."
     
     try:
-        response = ollama.chat(model='llama3.2:1b', messages=[
+        response = await llm.chat(get_config()['MODEL_NAME'], [
             {'role': 'system', 'content': system_instructions},
             {'role': 'user', 'content': content},
         ])
@@ -12,4 +12,24 @@ class ChatResponse(BaseModel):
     messages: List[MessageResponse] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class ChatSummaryResponse(BaseModel):
+    # Stavka liste četova (sidebar) - bez poruka, samo broj i skraćena poslednja poruka
+    id: int
+    user_id: int
+    title: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ChatHistoryResponse(ChatResponse):
+    # Jedna stranica poruka (rastuće po id); id prve i poslednje poruke su kursori za sledeći zahtev
+    has_older: bool = False
+    has_newer: bool = False
\ No newline at end of file
@@ -7,6 +7,7 @@ class DocumentResponse(BaseModel):
     title: str
     file_type: Optional[str] = None
     uploaded_at: datetime
+    chunk_count: Optional[int] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ChatState:
+    """Keširano stanje četa: vlasnik, sažetak i nesažete poruke (najstarija prva)."""
+    user_id: int
+    summary: str = None
+    summary_message_id: int = None
+    history: list = field(default_factory=list)
+    doc_collections: list = field(default_factory=list)
+    last_access: float = 0.0
+
+
+class ChatStateCache:
+    """Ograničen LRU keš stanja četova sa write-through dopunom posle svakog commit-a.
+
+    Izbacivanje je po broju četova i po vremenu neaktivnosti. Keš je lokalan za proces:
+    sa više uvicorn worker-a bez sticky rutiranja treba ga isključiti (max_chats=0).
+    """
+
+    def __init__(self, max_chats: int, idle_ttl: float, history_limit: int):
+        self.max_chats = max_chats
+        self.idle_ttl = idle_ttl
+        self.history_limit = history_limit
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evicted_size": 0, "evicted_idle": 0, "invalidations": 0}
+
+    def get(self, chat_id: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is not None and now - entry.last_access > self.idle_ttl:
+                del self._entries[chat_id]
+                self.stats["evicted_idle"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            entry.last_access = now
+            self._entries.move_to_end(chat_id)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, chat_id: int, state: ChatState):
+        if self.max_chats <= 0:
+            return
+        state.history = state.history[-self.history_limit:]
+        state.last_access = time.monotonic()
+        with self._lock:
+            self._entries[chat_id] = state
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_chats:
+                self._entries.popitem(last=False)
+                self.stats["evicted_size"] += 1
+
+    def append(self, chat_id: int, messages: list):
+        """Write-through: dodaje upravo sačuvane poruke ({id, role, content}) u keširanu istoriju."""
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is not None:
+                entry.history = (entry.history + messages)[-self.history_limit:]
+
+    def apply_summary(self, chat_id: int, summary: str, summary_message_id: int):
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is not None:
+                entry.summary = summary
+                entry.summary_message_id = summary_message_id
+                entry.history = [m for m in entry.history if m["id"] > summary_message_id]
+
+    def invalidate(self, chat_id: int):
+        with self._lock:
+            if self._entries.pop(chat_id, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for chat_id in [cid for cid, e in self._entries.items() if e.user_id == user_id]:
+                del self._entries[chat_id]
+                self.stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats | {
+            "size": len(self._entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+
+_cache = None
+
+
+def get_chat_cache() -> ChatStateCache:
+    global _cache
+    if _cache is None:
+        from config import get_config
+        config = get_config()
+        _cache = ChatStateCache(
+            config['CHAT_CACHE_SIZE'],
+            config['CHAT_CACHE_IDLE_TTL'],
+            config['SUMMARY_RECENT_WINDOW'] + config['SUMMARY_EVERY']
+        )
+    return _cache
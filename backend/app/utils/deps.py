@@ -1,12 +1,13 @@
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-from app.database import get_db
+from app.database import get_async_db
 from app.models.user import User
 from app.utils.security import decode_access_token
+from app.utils.metrics import stage
 
 
 security = HTTPBearer()
@@ -14,37 +15,39 @@ security = HTTPBearer()
 
 
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     
     
     token = credentials.credentials
     
     
-    payload = decode_access_token(token)
-    
-    
-    if payload is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-   
-    user_id: Optional[int] = payload.get("user_id")
-    
-    if user_id is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token payload",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-   
-    user = db.query(User).filter(User.id == user_id).first()
+    # Dekodiranje JWT-a i čitanje korisnika se mere kao faza "auth"
+    with stage("auth"):
+        payload = decode_access_token(token)
+        
+        
+        if payload is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        
+       
+        user_id: Optional[int] = payload.get("user_id")
+        
+        if user_id is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token payload",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        
+       
+        user = await db.get(User, user_id)
     
     if user is None:
         raise HTTPException(
@@ -79,9 +82,9 @@ def get_current_admin_user(
     return current_user
 
 
-def get_optional_current_user(
+async def get_optional_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[User]:
     
     if credentials is None:
@@ -98,6 +101,6 @@ def get_optional_current_user(
     if user_id is None:
         return None
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     
     return user
@@ -0,0 +1,83 @@
+from app.utils.memory import memory_manager, embed
+from config import get_config
+
+# Chroma ograničava broj zapisa po jednom add pozivu
+_ADD_BATCH = 256
+
+
+def chunk_text(text: str, size: int, overlap: int) -> list:
+    """Deli tekst na delove od najviše `size` karaktera sa preklapanjem, sečeno na razmaku kad je moguće."""
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            space = text.rfind(" ", start + size // 2, end)
+            if space != -1:
+                end = space
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class DocumentIndex:
+    """Indeks delova (chunk-ova) otpremljenih dokumenata: jedna Chroma kolekcija po dokumentu."""
+
+    def __init__(self, get_client, embed_fn):
+        self.get_client = get_client
+        self.embed_fn = embed_fn
+
+    @staticmethod
+    def collection_name(document_id: int) -> str:
+        return f"doc_{document_id}"
+
+    def index_document(self, document_id: int, text: str) -> tuple:
+        """Deli tekst, računa embedding-e jednom i upisuje ih. Vraća (ime kolekcije, broj delova)."""
+        config = get_config()
+        chunks = chunk_text(text, config['DOC_CHUNK_SIZE'], config['DOC_CHUNK_OVERLAP'])
+        name = self.collection_name(document_id)
+        collection = self.get_client().get_or_create_collection(name=name, embedding_function=None, metadata={"hnsw:space": "cosine"})
+
+        for i in range(0, len(chunks), _ADD_BATCH):
+            batch = chunks[i:i + _ADD_BATCH]
+            collection.add(
+                ids=[f"{name}_{i + j}" for j in range(len(batch))],
+                documents=batch,
+                embeddings=self.embed_fn(batch),
+                metadatas=[{"document_id": document_id, "chunk": i + j} for j in range(len(batch))]
+            )
+        return name, len(chunks)
+
+    def query(self, collection_names: list, query: str, k: int) -> list:
+        """Vraća k najrelevantnijih delova iz svih zadatih dokumenata (po kosinusnoj udaljenosti)."""
+        if not collection_names:
+            return []
+        query_embedding = self.embed_fn([query])[0]
+        client = self.get_client()
+        scored = []
+        for name in collection_names:
+            try:
+                collection = client.get_collection(name=name, embedding_function=None)
+            except Exception:
+                continue
+            results = collection.query(query_embeddings=[query_embedding], n_results=k)
+            if results['documents']:
+                scored.extend(zip(results['distances'][0], results['documents'][0]))
+        scored.sort(key=lambda pair: pair[0])
+        return [doc for _, doc in scored[:k]]
+
+    def delete(self, collection_names: list):
+        client = self.get_client()
+        for name in collection_names:
+            try:
+                client.delete_collection(name=name)
+            except Exception:
+                pass
+
+
+document_index = DocumentIndex(lambda: memory_manager.client, embed)
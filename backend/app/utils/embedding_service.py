@@ -0,0 +1,152 @@
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from config import get_config
+
+
+def build_onnx_function(intra_op_threads: int = 0):
+    """ONNX MiniLM (isti model kao Chromin DefaultEmbeddingFunction) sa ograničenim brojem
+    intra-op niti. chromadb se uvozi tek ovde, pri prvom embedding-u."""
+    from functools import cached_property
+    from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2 # type: ignore
+
+    class BoundedMiniLM(ONNXMiniLM_L6_V2):
+        @cached_property
+        def model(self):
+            so = self.ort.SessionOptions()
+            so.log_severity_level = 3
+            so.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if intra_op_threads > 0:
+                so.intra_op_num_threads = intra_op_threads
+                so.inter_op_num_threads = 1
+            providers = [p for p in self.ort.get_available_providers() if p != "CoreMLExecutionProvider"]
+            return self.ort.InferenceSession(
+                os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
+                providers=providers,
+                sess_options=so
+            )
+
+    return BoundedMiniLM()
+
+
+class EmbeddingService:
+    """Jedna nit koja računa sve embedding-e u procesu (recall, upis memorije, dokumenti, klasifikator).
+
+    Zahtevi koji stignu u roku od max_wait_ms se spajaju u jedan prolaz kroz model (do max_batch
+    tekstova), pa istovremeni korisnici dele forward pass umesto da se otimaju o iste CPU jezgre.
+    Pozivaoci (niti iz thread pool-a) čekaju samo na svoje vektore.
+    """
+
+    def __init__(self, factory, max_batch: int = 32, max_wait_ms: float = 5):
+        self._factory = factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._function = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "busy_seconds": 0.0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+                    self._thread.start()
+
+    def embed(self, texts: list) -> list:
+        if not texts:
+            return []
+        self._ensure_started()
+        future = concurrent.futures.Future()
+        self._queue.put((list(texts), future))
+        return future.result()
+
+    def __call__(self, texts: list) -> list:
+        return self.embed(texts)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            count = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while count < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                count += len(item[0])
+            self._process(batch)
+            if stopping:
+                return
+
+    def _process(self, batch):
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        start = time.perf_counter()
+        try:
+            if self._function is None:
+                self._function = self._factory()
+            vectors = self._function(texts)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.stats["requests"] += len(batch)
+        self.stats["texts"] += len(texts)
+        self.stats["batches"] += 1
+        self.stats["busy_seconds"] += time.perf_counter() - start
+
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def shutdown(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        batches = stats["batches"]
+        stats["avg_batch_size"] = round(stats["texts"] / batches, 2) if batches else 0.0
+        stats["texts_per_second"] = round(stats["texts"] / stats["busy_seconds"], 1) if stats["busy_seconds"] else 0.0
+        stats["pending"] = self._queue.qsize()
+        return stats
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                config = get_config()
+                _service = EmbeddingService(
+                    lambda: build_onnx_function(config['EMBED_THREADS']),
+                    max_batch=config['EMBED_MAX_BATCH'],
+                    max_wait_ms=config['EMBED_MAX_WAIT_MS']
+                )
+    return _service
+
+
+def shutdown_embedding_service():
+    if _service is not None:
+        _service.shutdown()
@@ -0,0 +1,214 @@
+import asyncio
+import time
+import httpx
+import ollama
+from app.utils.metrics import record_ollama
+from config import get_config
+
+
+class OllamaBackend:
+    """Jedan Ollama server iz pool-a: sopstveni keep-alive klijent, brojač aktivnih zahteva i zdravlje."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.in_flight = 0
+        self.healthy = True
+        self.failures = 0
+        self.last_error = None
+        self.last_checked = None
+        # httpx konekcije su vezane za event loop, pa se klijent pravi po loop-u. Pool konekcija
+        # (transport) je naš, pa se zatvara preko javnog httpx API-ja, a ne kroz unutrašnjost ollama klijenta
+        self._client = None
+        self._transport = None
+        self._client_loop = None
+
+    def get_client(self) -> ollama.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._discard_transport()
+            self._transport = _build_transport()
+            self._client = _build_client(self.url, self._transport)
+            self._client_loop = loop
+        return self._client
+
+    def _discard_transport(self):
+        """Zatvara transport prethodnog event loop-a. Njegove konekcije mogu da se zatvore samo u tom
+        loop-u: ako još radi, aclose se zakazuje u njemu; ako je zatvoren, soketi se oslobađaju sa objektom."""
+        transport, loop = self._transport, self._client_loop
+        self._client = None
+        self._transport = None
+        self._client_loop = None
+        if transport is None or loop is None or loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(transport.aclose(), loop)
+        except RuntimeError:
+            pass
+
+    async def close(self):
+        if self._transport is not None:
+            await self._transport.aclose()
+        self._client = None
+        self._transport = None
+        self._client_loop = None
+
+    def mark_failure(self, error: Exception, max_failures: int):
+        self.failures += 1
+        self.last_error = str(error)
+        if self.failures >= max_failures:
+            self.healthy = False
+
+    def mark_success(self):
+        self.failures = 0
+        self.last_error = None
+        self.healthy = True
+
+    def status(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked
+        }
+
+
+def _build_transport() -> httpx.AsyncHTTPTransport:
+    config = get_config()
+    limits = httpx.Limits(
+        max_connections=config['OLLAMA_MAX_CONNECTIONS'],
+        max_keepalive_connections=config['OLLAMA_MAX_KEEPALIVE'],
+        keepalive_expiry=config['OLLAMA_KEEPALIVE_EXPIRY']
+    )
+    return httpx.AsyncHTTPTransport(limits=limits)
+
+
+def _build_client(url: str, transport: httpx.AsyncHTTPTransport) -> ollama.AsyncClient:
+    config = get_config()
+    timeout = httpx.Timeout(config['OLLAMA_TIMEOUT'], connect=config['OLLAMA_CONNECT_TIMEOUT'])
+    return ollama.AsyncClient(host=url, timeout=timeout, transport=transport)
+
+
+# Greške koje znače da server nije dostupan (a ne da je model vratio grešku)
+_CONNECTION_ERRORS = (ConnectionError, httpx.TransportError)
+
+
+class BackendPool:
+    """Registar Ollama servera: rutiranje po najmanjem broju aktivnih zahteva, health probe i izbacivanje/vraćanje čvorova."""
+
+    def __init__(self, urls: list, max_failures: int = 1):
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.max_failures = max_failures
+        self._next = 0
+        self._health_task = None
+
+    def acquire(self) -> OllamaBackend:
+        candidates = [b for b in self.backends if b.healthy] or self.backends
+        # Rotacija početne pozicije da se izjednačeni čvorovi smenjuju
+        start = self._next % len(candidates)
+        self._next += 1
+        ordered = candidates[start:] + candidates[:start]
+        return min(ordered, key=lambda b: b.in_flight)
+
+    async def chat(self, model: str, messages: list, stream: bool = False):
+        if not self.backends:
+            raise RuntimeError("No Ollama backend configured (OLLAMA_URLS / OLLAMA_URL)")
+        if stream:
+            return self._stream(model, messages)
+
+        last_error = None
+        for _ in range(len(self.backends)):
+            backend = self.acquire()
+            backend.in_flight += 1
+            try:
+                response = await backend.get_client().chat(model=model, messages=messages)
+                backend.mark_success()
+                record_ollama(model, response)
+                return response
+            except _CONNECTION_ERRORS as e:
+                # Čvor ne odgovara - izbaci ga i probaj sledeći
+                backend.mark_failure(e, self.max_failures)
+                last_error = e
+            finally:
+                backend.in_flight -= 1
+        raise last_error
+
+    async def _stream(self, model: str, messages: list):
+        backend = self.acquire()
+        backend.in_flight += 1
+        try:
+            async for chunk in await backend.get_client().chat(model=model, messages=messages, stream=True):
+                if chunk.get('done'):
+                    record_ollama(model, chunk)
+                yield chunk
+            backend.mark_success()
+        except _CONNECTION_ERRORS as e:
+            backend.mark_failure(e, self.max_failures)
+            raise
+        finally:
+            backend.in_flight -= 1
+
+    async def probe(self, backend: OllamaBackend) -> bool:
+        backend.last_checked = time.time()
+        try:
+            await backend.get_client().list()
+            backend.mark_success()
+        except Exception as e:
+            backend.mark_failure(e, self.max_failures)
+        return backend.healthy
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(b) for b in self.backends))
+
+    async def _health_loop(self, interval: float):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(interval)
+
+    def start_health_checks(self, interval: float):
+        if self._health_task is None and interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop(interval))
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for backend in self.backends:
+            await backend.close()
+
+    def status(self) -> list:
+        return [b.status() for b in self.backends]
+
+
+_pool = None
+
+
+def get_backend_pool() -> BackendPool:
+    """Vraća deljeni pool Ollama servera napravljen iz OLLAMA_URLS (ili OLLAMA_URL)."""
+    global _pool
+    if _pool is None:
+        config = get_config()
+        _pool = BackendPool(config['OLLAMA_URLS'], max_failures=config['OLLAMA_MAX_FAILURES'])
+    return _pool
+
+
+async def start_llm_pool():
+    get_backend_pool().start_health_checks(get_config()['OLLAMA_HEALTH_INTERVAL'])
+
+
+async def close_llm_client():
+    """Zaustavlja health probe i zatvara konekcije ka svim serverima (poziva se pri gašenju aplikacije)."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+    _pool = None
+
+
+async def chat(model: str, messages: list, stream: bool = False):
+    """Neblokirajući poziv ka Ollama /api/chat. Sa stream=True vraća async iterator delova odgovora."""
+    return await get_backend_pool().chat(model, messages, stream=stream)
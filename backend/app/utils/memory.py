@@ -1,57 +1,308 @@
 
-import chromadb # type: ignore
-from chromadb.utils import embedding_functions # type: ignore
+import os
+import re
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-import ollama
+from app.utils import llm
+from app.utils.scope_classifier import ScopeClassifier
+from app.utils.recall_cache import RecallCache
+from app.utils.metrics import stage
+from app.utils.embedding_service import get_embedding_service
 from config import get_config;
 
-ef = embedding_functions.DefaultEmbeddingFunction()
+# chromadb i ONNX model se učitavaju tek pri prvoj upotrebi (ili u warmup-u), ne pri importu
+_ef = None
+_ef_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """Podrazumevana funkcija zapisana u konfiguraciji kolekcija; vektore aplikacija računa sama (embed)."""
+    global _ef
+    if _ef is None:
+        with _ef_lock:
+            if _ef is None:
+                from chromadb.utils import embedding_functions # type: ignore
+                _ef = embedding_functions.DefaultEmbeddingFunction()
+    return _ef
+
+
+def embed(texts: list) -> list:
+    """Embedding-i kroz zajednički servis (grupisanje istovremenih zahteva u jedan prolaz modela)."""
+    return get_embedding_service().embed(texts)
+
+
+LEGACY_COLLECTION = "user_memory"
+# Fajl u Chroma direktorijumu sa prefiksom aktivne generacije kolekcija (menja ga reindex)
+GENERATION_FILE = "memory_generation"
+
 
 class MemoryManager:
-    def __init__(self):
-        self.client = chromadb.PersistentClient(path="./chroma_data")
-        self.collection = self.client.get_or_create_collection(
-            name="user_memory",
-            embedding_function=ef
-        )
+    """Dugoročna memorija u Chromi, podeljena po korisnicima: svaki korisnik (ili grupa korisnika,
+    ako je zadat MEMORY_PARTITION_BUCKETS) ima svoju kolekciju, pa pretraga ne prolazi kroz tuđe memorije."""
+
+    def __init__(self, path: str = "./chroma_data", buckets: int = None, embedding_function=None, recall_cache: RecallCache = None, prefix: str = None):
+        self.path = path
+        self.buckets = buckets
+        self._prefix = prefix
+        self._embedding_function = embedding_function
+        if recall_cache is None:
+            config = get_config()
+            recall_cache = RecallCache(config['RECALL_CACHE_TTL'], config['RECALL_CACHE_SIZE'])
+        self.recall_cache = recall_cache
+        self._client = None
+        self._collections = {}
+        # id memorije -> poslednji recall (time.time()), za izbacivanje neaktivnih memorija.
+        # LRU ograničen na MEMORY_LAST_ACCESS_SIZE: bez pokretanja sažimanja bi rastao neograničeno
+        self.last_access = OrderedDict()
+        self.last_access_size = get_config()['MEMORY_LAST_ACCESS_SIZE']
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb # type: ignore
+                    self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+
+    @property
+    def prefix(self) -> str:
+        """Prefiks imena kolekcija aktivne generacije (posle reindeksa to nije više user_memory)."""
+        if self._prefix is None:
+            try:
+                with open(os.path.join(self.path, GENERATION_FILE), encoding="utf-8") as f:
+                    self._prefix = f.read().strip() or LEGACY_COLLECTION
+            except FileNotFoundError:
+                self._prefix = LEGACY_COLLECTION
+        return self._prefix
+
+    def set_prefix(self, prefix: str):
+        """Prebacuje na drugu generaciju kolekcija; upis pokazivača je atomičan (os.replace)."""
+        os.makedirs(self.path, exist_ok=True)
+        target = os.path.join(self.path, GENERATION_FILE)
+        with open(target + ".tmp", "w", encoding="utf-8") as f:
+            f.write(prefix)
+        os.replace(target + ".tmp", target)
+        with self._lock:
+            self._prefix = prefix
+            self._collections = {}
+        self.recall_cache.clear()
+
+    def partition_names(self, prefix: str) -> list:
+        """Imena postojećih kolekcija memorije jedne generacije."""
+        pattern = re.compile(rf"^{re.escape(prefix)}_[ub]\d+$")
+        return [c.name for c in self.client.list_collections() if pattern.match(c.name)]
+
+    def _buckets(self) -> int:
+        return self.buckets if self.buckets is not None else get_config()['MEMORY_PARTITION_BUCKETS']
+
+    def collection_name(self, user_id: int) -> str:
+        if self._buckets() > 0:
+            return f"{self.prefix}_b{user_id % self._buckets()}"
+        return f"{self.prefix}_u{user_id}"
+
+    def collection_for(self, user_id: int):
+        name = self.collection_name(user_id)
+        collection = self._collections.get(name)
+        if collection is None:
+            client = self.client
+            with self._lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = client.get_or_create_collection(
+                        name=name,
+                        embedding_function=self._embedding_function or get_embedding_function()
+                    )
+                    self._collections[name] = collection
+        return collection
+
+    def existing_collection_for(self, user_id: int):
+        """Kolekcija korisnika ako već postoji, inače None (za brisanje, bez pravljenja prazne kolekcije)."""
+        name = self.collection_name(user_id)
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        try:
+            collection = self.client.get_collection(
+                name=name,
+                embedding_function=self._embedding_function or get_embedding_function()
+            )
+        except Exception:
+            return None
+        with self._lock:
+            return self._collections.setdefault(name, collection)
+
+    def _embed(self, texts: list) -> list:
+        if self._embedding_function is not None:
+            return self._embedding_function(texts)
+        return embed(texts)
+
+    def warmup(self):
+        """Otvara Chroma klijent i učitava ONNX model jednim probnim embedding-om."""
+        self.client
+        embed(["warmup"])
 
     def add_memory(self, user_id: int, chat_id: int, text: str, answer: str, scope: str):
-        if scope == "ignore":
-            return
-        
-        combined_text = f"User asked: {text}\nAssistant answered: {answer}"
-        
-        self.collection.add(
-            ids=[str(uuid.uuid4())],
-            documents=[combined_text],
-            metadatas=[{
-                "user_id": user_id,
-                "chat_id": chat_id,
-                "memory_scope": scope,
-                "timestamp": datetime.now().isoformat()
-            }]
-        )
+        self.add_memories([{"user_id": user_id, "chat_id": chat_id, "text": text, "answer": answer, "scope": scope}])
+
+    def add_memories(self, items: list):
+        """Upisuje više memorija odjednom (jedan collection.add po korisniku); items su dict-ovi sa
+        user_id, chat_id, text, answer i scope."""
+        by_user = {}
+        for item in items:
+            if item["scope"] != "ignore":
+                by_user.setdefault(item["user_id"], []).append(item)
+
+        # Jedan poziv servisu za sve memorije grupe, Chroma dobija gotove vektore
+        documents = [
+            f"User asked: {item['text']}\nAssistant answered: {item['answer']}"
+            for user_items in by_user.values() for item in user_items
+        ]
+        vectors = self._embed(documents)
+
+        offset = 0
+        for user_id, user_items in by_user.items():
+            end = offset + len(user_items)
+            self.collection_for(user_id).add(
+                ids=[str(uuid.uuid4()) for _ in user_items],
+                documents=documents[offset:end],
+                embeddings=vectors[offset:end],
+                metadatas=[{
+                    "user_id": item["user_id"],
+                    "chat_id": item["chat_id"],
+                    "memory_scope": item["scope"],
+                    "timestamp": datetime.now().isoformat()
+                } for item in user_items]
+            )
+            offset = end
+            # Globalna memorija menja recall u svim četovima korisnika, memorija razgovora samo u svom
+            if any(item["scope"] == "global" for item in user_items):
+                self.recall_cache.invalidate(user_id)
+            else:
+                for chat_id in {item["chat_id"] for item in user_items}:
+                    self.recall_cache.invalidate(user_id, chat_id)
+
+    def _embed_query(self, query: str):
+        return self._embed([query])[0]
 
     def recall_memory(self, user_id: int, chat_id: int, query: str, limit: int = 2):
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=limit,
-            where={
+        query_key = self.recall_cache.query_key(query)
+        cached = self.recall_cache.get_results(user_id, chat_id, query_key, limit)
+        if cached is not None:
+            return cached
+        version = self.recall_cache.version(user_id)
+
+        collection = self.collection_for(user_id)
+        memories = []
+        if collection.count() > 0:
+            # Isti (normalizovan) upit se ne embeduje ponovo, ni za drugog korisnika ni za drugi čet
+            embedding = self.recall_cache.get_embedding(query_key)
+            if embedding is None:
+                embedding = self._embed_query(query)
+                self.recall_cache.put_embedding(query_key, embedding)
+            # user_id filter ostaje zbog kolekcija koje dele korisnici iz iste grupe
+            results = collection.query(
+                query_embeddings=[embedding],
+                n_results=limit,
+                where={
+                    "$and": [
+                        {"user_id": user_id},
+                        {"$or": [
+                            {"memory_scope": "global"},
+                            {"chat_id": chat_id}
+                        ]}
+                    ]
+                }
+            )
+            memories = results['documents'][0] if results['documents'] else []
+            if results['ids'] and results['ids'][0]:
+                now = time.time()
+                with self._lock:
+                    for memory_id in results['ids'][0]:
+                        self.last_access[memory_id] = now
+                        self.last_access.move_to_end(memory_id)
+                    while len(self.last_access) > self.last_access_size:
+                        self.last_access.popitem(last=False)
+
+        self.recall_cache.put_results(user_id, chat_id, query_key, limit, memories, version)
+        return memories
+
+    def delete_chat_memories(self, user_id: int, chat_ids: list, batch_size: int = 100):
+        """Briše memorije obrisanih četova, u grupama po batch_size četova. Globalne memorije
+        korisnika (činjenice o njemu) nisu vezane za jedan čet i ostaju."""
+        collection = self.existing_collection_for(user_id)
+        if collection is None:
+            return
+        for i in range(0, len(chat_ids), batch_size):
+            collection.delete(where={
                 "$and": [
                     {"user_id": user_id},
-                    {"$or": [
-                        {"memory_scope": "global"},
-                        {"chat_id": chat_id}
-                    ]}
+                    {"chat_id": {"$in": chat_ids[i:i + batch_size]}},
+                    {"memory_scope": "conversation"}
                 ]
-            }
-        )
-        return results['documents'][0] if results['documents'] else []
+            })
+        for chat_id in chat_ids:
+            self.recall_cache.invalidate(user_id, chat_id)
+
+    def delete_user_memories(self, user_id: int):
+        """Briše sve memorije korisnika (pri brisanju naloga)."""
+        self.recall_cache.invalidate(user_id)
+        name = self.collection_name(user_id)
+        if self._buckets() == 0:
+            with self._lock:
+                self._collections.pop(name, None)
+            try:
+                self.client.delete_collection(name=name)
+            except Exception:
+                pass
+        else:
+            collection = self.existing_collection_for(user_id)
+            if collection is not None:
+                collection.delete(where={"user_id": user_id})
+
+    def migrate_legacy(self, batch_size: int = 500, drop: bool = False) -> dict:
+        """Prebacuje memorije iz stare zajedničke kolekcije user_memory u kolekcije po korisniku.
+        Postojeći embedding-i se prenose (bez ponovnog računanja), a upsert po istom id-ju
+        omogućava da se prekinuta migracija bezbedno pokrene ponovo."""
+        try:
+            legacy = self.client.get_collection(name=LEGACY_COLLECTION, embedding_function=None)
+        except Exception:
+            return {"migrated": 0, "users": 0, "dropped": False}
+
+        migrated = 0
+        users = set()
+        offset = 0
+        while True:
+            page = legacy.get(limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+            if not page["ids"]:
+                break
+            by_user = {}
+            for i, metadata in enumerate(page["metadatas"]):
+                by_user.setdefault(metadata["user_id"], []).append(i)
+            for user_id, rows in by_user.items():
+                self.collection_for(user_id).upsert(
+                    ids=[page["ids"][i] for i in rows],
+                    documents=[page["documents"][i] for i in rows],
+                    metadatas=[page["metadatas"][i] for i in rows],
+                    embeddings=[page["embeddings"][i] for i in rows]
+                )
+                users.add(user_id)
+                self.recall_cache.invalidate(user_id)
+            migrated += len(page["ids"])
+            offset += len(page["ids"])
+            print(f"Migrated {migrated} memories ({len(users)} users)")
+
+        if drop:
+            self.client.delete_collection(name=LEGACY_COLLECTION)
+        return {"migrated": migrated, "users": len(users), "dropped": drop}
 
 memory_manager = MemoryManager()
 
-async def classify_memory_scope(content: str) -> str:
+async def classify_memory_scope_llm(content: str) -> str:
     prompt = f"""
     Analyze the following user message and classify it into one of three categories:
     1. 'global' - Personal info, preferences, or name.
@@ -62,10 +313,17 @@ async def classify_memory_scope(content: str) -> str:
     Respond with only one word: global, conversation, or ignore.
     """
     try:
-        response = ollama.chat(model='llama3.2:1b', messages=[{'role': 'user', 'content': prompt}])
+        response = await llm.chat(get_config()['MODEL_NAME'], [{'role': 'user', 'content': prompt}])
         result = response['message']['content'].strip().lower()
         for word in ['global', 'conversation', 'ignore']:
             if word in result: return word
         return 'conversation'
     except:
-        return 'conversation'
\ No newline at end of file
+        return 'conversation'
+
+
+scope_classifier = ScopeClassifier(embed, classify_memory_scope_llm)
+
+async def classify_memory_scope(content: str) -> str:
+    with stage("classify"):
+        return await scope_classifier.classify(content)
@@ -0,0 +1,225 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from app.utils.memory import memory_manager
+from config import get_config
+
+
+def _parse_time(value) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class _VectorGroup:
+    """Normalizovani vektori zadržanih memorija jedne grupe u unapred alociranoj matrici
+    (kapacitet se duplira), da poređenje ne kopira sve vektore za svaku novu memoriju."""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.owners = []
+
+    def most_similar(self, vector) -> tuple:
+        """(memorija, sličnost) najsličnije zadržane memorije, ili (None, -1) za praznu grupu."""
+        if not self.owners:
+            return None, -1.0
+        similarities = self.matrix[:len(self.owners)] @ vector
+        best = int(np.argmax(similarities))
+        return self.owners[best], float(similarities[best])
+
+    def append(self, vector, owner):
+        if len(self.owners) == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+        self.matrix[len(self.owners)] = vector
+        self.owners.append(owner)
+
+
+class MemoryCompactor:
+    """Sažimanje memorije po korisniku: spajanje skoro istih memorija, izbacivanje starih
+    memorija razgovora i ograničenje broja memorija po korisniku.
+
+    - Duplikati: memorije sa kosinusnom sličnošću >= similarity se spajaju u najnoviju
+      (merged_count u metapodacima broji spojene). Memorija razgovora koja ponavlja globalnu
+      memoriju se briše; globalne se porede sa svim globalnim memorijama korisnika.
+    - TTL: memorija razgovora se briše ako ni upis ni poslednji recall nisu mlađi od ttl_days.
+    - Limit: preko max_per_user se prvo brišu memorije razgovora kojima se najduže nije pristupalo.
+    """
+
+    def __init__(self, manager, similarity: float = 0.95, ttl_days: float = 30, max_per_user: int = 2000):
+        self.manager = manager
+        self.similarity = similarity
+        self.ttl_days = ttl_days
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self.last_report = None
+        self.totals = {"runs": 0, "merged": 0, "expired": 0, "evicted": 0}
+
+    def _compact_user(self, memories: list, now: float, last_access: dict) -> tuple:
+        """Vraća (id-jevi za brisanje, {id: novi metapodaci}, broj po razlogu) za memorije jednog korisnika.
+        last_access je kopija manager.last_access (recall-ovi zabeleženi u procesu)."""
+        for m in memories:
+            created = _parse_time(m["metadata"].get("timestamp"))
+            accessed = max(m["metadata"].get("last_accessed", 0), last_access.get(m["id"], 0))
+            m["created"] = created if created is not None else now
+            m["accessed"] = max(m["created"], accessed)
+
+        # Najnovije prve: od grupe duplikata ostaje najnovija verzija
+        memories.sort(key=lambda m: m["created"], reverse=True)
+        deleted, updates = set(), {}
+        counts = {"merged": 0, "expired": 0, "evicted": 0}
+
+        ttl = self.ttl_days * 86400
+        for m in memories:
+            if m["metadata"].get("memory_scope") == "conversation" and now - m["accessed"] > ttl:
+                deleted.add(m["id"])
+                counts["expired"] += 1
+
+        kept = {}  # ključ grupe -> _VectorGroup
+        for m in memories:
+            if m["id"] in deleted:
+                continue
+            vector = np.asarray(m["embedding"], dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            scope = m["metadata"].get("memory_scope")
+            groups = [("global",)] if scope == "global" else [("global",), ("conversation", m["metadata"].get("chat_id"))]
+            duplicate_of = None
+            for key in groups:
+                if key in kept:
+                    owner, similarity = kept[key].most_similar(vector)
+                    if similarity >= self.similarity:
+                        duplicate_of = owner
+                        break
+            if duplicate_of is not None:
+                deleted.add(m["id"])
+                counts["merged"] += 1
+                target = updates.setdefault(duplicate_of["id"], dict(duplicate_of["metadata"]))
+                target["merged_count"] = target.get("merged_count", 1) + m["metadata"].get("merged_count", 1)
+                target["last_accessed"] = max(target.get("last_accessed", 0), m["accessed"], duplicate_of["accessed"])
+                continue
+            key = groups[0] if scope == "global" else groups[1]
+            if key not in kept:
+                kept[key] = _VectorGroup(len(vector))
+            kept[key].append(vector, m)
+
+        remaining = [m for m in memories if m["id"] not in deleted]
+        overflow = len(remaining) - self.max_per_user
+        if overflow > 0:
+            candidates = sorted(
+                (m for m in remaining if m["metadata"].get("memory_scope") == "conversation"),
+                key=lambda m: m["accessed"]
+            )
+            for m in candidates[:overflow]:
+                deleted.add(m["id"])
+                updates.pop(m["id"], None)
+                counts["evicted"] += 1
+
+        # Recall-ovi se pamte samo u memoriji procesa; upisuju se u metapodatke da prežive restart
+        for m in memories:
+            if m["id"] not in deleted and m["accessed"] > m["metadata"].get("last_accessed", 0) and m["id"] in last_access:
+                target = updates.setdefault(m["id"], dict(m["metadata"]))
+                target["last_accessed"] = max(target.get("last_accessed", 0), m["accessed"])
+
+        return deleted, updates, counts
+
+    def compact(self) -> dict:
+        """Prolazi kroz sve kolekcije memorije aktivne generacije. Vraća izveštaj o uštedi."""
+        with self._lock:
+            start = time.perf_counter()
+            now = time.time()
+            report = {"collections": 0, "users": 0, "scanned": 0, "merged": 0, "expired": 0, "evicted": 0, "remaining": 0}
+            # Recall menja LRU pod manager._lock, pa se čita kopija i briše pod istim lock-om
+            with self.manager._lock:
+                last_access = dict(self.manager.last_access)
+
+            for name in self.manager.partition_names(self.manager.prefix):
+                collection = self.manager.client.get_collection(name=name, embedding_function=None)
+                data = collection.get(include=["metadatas", "embeddings"])
+                by_user = {}
+                for memory_id, metadata, embedding in zip(data["ids"], data["metadatas"], data["embeddings"]):
+                    by_user.setdefault(metadata.get("user_id"), []).append({"id": memory_id, "metadata": metadata, "embedding": embedding})
+
+                for user_id, memories in by_user.items():
+                    deleted, updates, counts = self._compact_user(memories, now, last_access)
+                    if deleted:
+                        collection.delete(ids=list(deleted))
+                    if updates:
+                        collection.update(ids=list(updates), metadatas=list(updates.values()))
+                    if deleted:
+                        self.manager.recall_cache.invalidate(user_id)
+                    with self.manager._lock:
+                        for memory_id in deleted:
+                            self.manager.last_access.pop(memory_id, None)
+                        # Recall posle kopije nije upisan u metapodatke, pa ostaje u LRU-u
+                        for memory_id in updates:
+                            if self.manager.last_access.get(memory_id) == last_access.get(memory_id):
+                                self.manager.last_access.pop(memory_id, None)
+                    for reason, count in counts.items():
+                        report[reason] += count
+                    report["scanned"] += len(memories)
+                    report["remaining"] += len(memories) - len(deleted)
+                    report["users"] += 1
+                report["collections"] += 1
+
+            report["reclaimed"] = report["merged"] + report["expired"] + report["evicted"]
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            report["finished_at"] = datetime.now().isoformat()
+
+            self.last_report = report
+            self.totals["runs"] += 1
+            for reason in ("merged", "expired", "evicted"):
+                self.totals[reason] += report[reason]
+            return report
+
+    def get_stats(self) -> dict:
+        return {"last_run": self.last_report, "totals": dict(self.totals)}
+
+
+_compactor = None
+_compaction_task = None
+
+
+def get_memory_compactor() -> MemoryCompactor:
+    global _compactor
+    if _compactor is None:
+        config = get_config()
+        _compactor = MemoryCompactor(
+            memory_manager,
+            similarity=config['MEMORY_DEDUP_SIMILARITY'],
+            ttl_days=config['MEMORY_CONVERSATION_TTL_DAYS'],
+            max_per_user=config['MEMORY_MAX_PER_USER']
+        )
+    return _compactor
+
+
+async def _compaction_loop(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await run_in_threadpool(get_memory_compactor().compact)
+            print(f"Memory compaction: {report}")
+        except Exception as e:
+            print(f"Memory compaction error: {e}")
+
+
+def start_memory_compaction():
+    """Pokreće periodično sažimanje ako je MEMORY_COMPACTION_INTERVAL (sati) veći od nule."""
+    global _compaction_task
+    interval = get_config()['MEMORY_COMPACTION_INTERVAL'] * 3600
+    if interval > 0 and _compaction_task is None:
+        _compaction_task = asyncio.create_task(_compaction_loop(interval))
+
+
+async def stop_memory_compaction():
+    global _compaction_task
+    if _compaction_task is not None:
+        _compaction_task.cancel()
+        try:
+            await _compaction_task
+        except asyncio.CancelledError:
+            pass
+    _compaction_task = None
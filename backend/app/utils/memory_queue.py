@@ -0,0 +1,244 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from starlette.concurrency import run_in_threadpool
+from app.utils.memory import memory_manager, classify_memory_scope
+from app.utils.metrics import stage
+from config import get_config
+
+
+class MemoryQueue:
+    """Trajni (SQLite) red memorija koje čekaju klasifikaciju i upis u Chromu.
+
+    Zapis se briše tek kada je uspešno upisan, pa red preživljava restart.
+    Više procesa može da deli isti fajl: svaki worker prvo "preuzme" svoje zapise.
+    Neuspešan zapis se ponovo pokušava posle retry_backoff * 2^(pokušaj - 1) sekundi, a posle
+    max_attempts pokušaja se parkira (ostaje u fajlu, ali se više ne preuzima) da ne blokira red.
+    Fajl se pravi pri prvoj upotrebi, ne pri uvozu modula.
+    """
+
+    def __init__(self, path: str, claim_timeout: float = 300, max_attempts: int = 8, retry_backoff: float = 5):
+        self.path = path
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.worker_id = f"{os.getpid()}-{id(self)}"
+        self.processed = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self.last_lag = 0.0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _create_schema(self, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_memories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                claimed_by TEXT,
+                claimed_at REAL
+            )
+        """)
+        # Kolone za ponovne pokušaje (dodaju se i u fajlove napravljene pre njih)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(pending_memories)")}
+        for name, definition in (("attempts", "INTEGER NOT NULL DEFAULT 0"), ("available_at", "REAL"),
+                                 ("parked_at", "REAL"), ("last_error", "TEXT")):
+            if name not in columns:
+                conn.execute(f"ALTER TABLE pending_memories ADD COLUMN {name} {definition}")
+
+    def _connect(self):
+        """Jedna konekcija po redu (svaki pristup je pod self._lock); otvara se pri prvoj upotrebi.
+        `with self._connect() as conn` je transakcija, konekcija ostaje otvorena."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                self._create_schema(conn)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def enqueue(self, user_id: int, chat_id: int, text: str, answer: str):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO pending_memories (user_id, chat_id, text, answer, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, chat_id, text, answer, time.time())
+            )
+
+    def claim(self, limit: int) -> list:
+        """Preuzima do `limit` najstarijih slobodnih zapisa (ili onih čiji je claim istekao)."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                UPDATE pending_memories SET claimed_by = ?, claimed_at = ?
+                WHERE id IN (
+                    SELECT id FROM pending_memories
+                    WHERE (claimed_at IS NULL OR claimed_at < ?)
+                      AND parked_at IS NULL
+                      AND (available_at IS NULL OR available_at <= ?)
+                    ORDER BY id LIMIT ?
+                )
+            """, (self.worker_id, now, now - self.claim_timeout, now, limit))
+            rows = conn.execute(
+                "SELECT id, user_id, chat_id, text, answer, enqueued_at FROM pending_memories WHERE claimed_by = ? AND claimed_at = ? ORDER BY id",
+                (self.worker_id, now)
+            ).fetchall()
+        return [
+            {"id": r[0], "user_id": r[1], "chat_id": r[2], "text": r[3], "answer": r[4], "enqueued_at": r[5]}
+            for r in rows
+        ]
+
+    def release(self, ids: list):
+        with self._lock, self._connect() as conn:
+            conn.executemany("UPDATE pending_memories SET claimed_by = NULL, claimed_at = NULL WHERE id = ?", [(i,) for i in ids])
+
+    def fail(self, ids: list, error: str):
+        """Beleži neuspeh: zapis se vraća u red sa odlaganjem ili se parkira posle max_attempts pokušaja."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany("""
+                UPDATE pending_memories SET
+                    attempts = attempts + 1,
+                    last_error = ?,
+                    claimed_by = NULL,
+                    claimed_at = NULL,
+                    available_at = ? + ? * (1 << MIN(attempts, 16)),
+                    parked_at = CASE WHEN attempts + 1 >= ? THEN ? END
+                WHERE id = ?
+            """, [(error[:500], now, self.retry_backoff, self.max_attempts, now, i) for i in ids])
+        self.failed += len(ids)
+
+    def requeue_parked(self) -> int:
+        """Vraća parkirane zapise u red (npr. posle ispravke uzroka greške). Vraća njihov broj."""
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute("""
+                UPDATE pending_memories SET attempts = 0, parked_at = NULL, available_at = NULL, last_error = NULL
+                WHERE parked_at IS NOT NULL
+            """)
+            return cursor.rowcount
+
+    def ack(self, ids: list):
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM pending_memories WHERE id = ?", [(i,) for i in ids])
+
+    def discard_chats(self, chat_ids: list):
+        """Izbacuje memorije obrisanih četova koje još čekaju upis."""
+        if not chat_ids:
+            return
+        placeholders = ",".join("?" for _ in chat_ids)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"DELETE FROM pending_memories WHERE chat_id IN ({placeholders})", list(chat_ids))
+
+    def stats(self) -> dict:
+        with self._lock, self._connect() as conn:
+            depth, oldest, retrying = conn.execute(
+                "SELECT COUNT(*), MIN(enqueued_at), SUM(attempts > 0) FROM pending_memories WHERE parked_at IS NULL"
+            ).fetchone()
+            parked, last_error = conn.execute(
+                "SELECT COUNT(*), (SELECT last_error FROM pending_memories WHERE parked_at IS NOT NULL ORDER BY parked_at DESC LIMIT 1) "
+                "FROM pending_memories WHERE parked_at IS NOT NULL"
+            ).fetchone()
+        return {
+            "depth": depth,
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "retrying": retrying or 0,
+            "parked": parked,
+            "last_parked_error": last_error,
+            "processed": self.processed,
+            "failed": self.failed,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_lag_seconds": round(self.last_lag, 3)
+        }
+
+    async def process_batch(self, limit: int, classify=None, manager=None) -> int:
+        """Klasifikuje i upisuje jednu grupu zapisa jednim collection.add pozivom. Vraća broj obrađenih."""
+        classify = classify or classify_memory_scope
+        manager = manager or memory_manager
+
+        items = await run_in_threadpool(self.claim, limit)
+        if not items:
+            return 0
+
+        # Greške se vezuju za pojedinačne zapise, da jedan neispravan ne vraća celu grupu u red
+        failed = {}
+        scopes = await asyncio.gather(*(classify(item["text"]) for item in items), return_exceptions=True)
+        for item, scope in zip(items, scopes):
+            if isinstance(scope, Exception):
+                failed[item["id"]] = f"classify: {scope}"
+            else:
+                item["scope"] = scope
+        classified = [item for item in items if item["id"] not in failed]
+
+        if classified:
+            try:
+                with stage("add_memory"):
+                    await run_in_threadpool(manager.add_memories, classified)
+            except Exception:
+                # Grupa nije upisana: upis po zapis izdvaja one koji zaista ne prolaze
+                for item in classified:
+                    try:
+                        await run_in_threadpool(manager.add_memories, [item])
+                    except Exception as e:
+                        failed[item["id"]] = f"add_memory: {e}"
+
+        if failed:
+            for error in set(failed.values()):
+                await run_in_threadpool(self.fail, [i for i, e in failed.items() if e == error], error)
+            print(f"Memory worker: {len(failed)} of {len(items)} items failed, e.g. {next(iter(failed.values()))}")
+        done = [item for item in items if item["id"] not in failed]
+        if done:
+            await run_in_threadpool(self.ack, [item["id"] for item in done])
+            self.processed += len(done)
+            self.last_batch_size = len(done)
+            self.last_lag = time.time() - min(item["enqueued_at"] for item in done)
+        return len(items)
+
+
+memory_queue = MemoryQueue(
+    get_config()['MEMORY_QUEUE_PATH'],
+    max_attempts=get_config()['MEMORY_MAX_ATTEMPTS'],
+    retry_backoff=get_config()['MEMORY_RETRY_BACKOFF']
+)
+
+_worker_task = None
+
+
+async def _worker_loop():
+    config = get_config()
+    while True:
+        try:
+            processed = await memory_queue.process_batch(config['MEMORY_BATCH_SIZE'])
+        except Exception as e:
+            print(f"Memory worker error: {e}")
+            processed = 0
+        if processed == 0:
+            await asyncio.sleep(config['MEMORY_POLL_INTERVAL'])
+
+
+def start_memory_worker():
+    global _worker_task
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(_worker_loop())
+
+
+async def stop_memory_worker():
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+    _worker_task = None
+    await run_in_threadpool(memory_queue.close)
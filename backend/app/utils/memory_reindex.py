@@ -0,0 +1,180 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import text
+from app.utils.memory import MemoryManager, LEGACY_COLLECTION
+from app.utils.scope_classifier import ScopeClassifier, normalize
+
+# Parovi (korisnikova poruka, prvi sledeći odgovor asistenta u istom četu), keyset po id-ju poruke
+PAIRS_QUERY = text("""
+    SELECT m.id, c.user_id, m.chat_id, m.content, a.content, m.timestamp
+    FROM messages m
+    JOIN chats c ON c.id = m.chat_id
+    JOIN messages a ON a.id = (
+        SELECT MIN(n.id) FROM messages n WHERE n.chat_id = m.chat_id AND n.id > m.id
+    )
+    WHERE m.role = 'user' AND a.role = 'assistant' AND m.id > :after_id
+    ORDER BY m.id
+    LIMIT :limit
+""")
+
+CHECKPOINT_FILE = "reindex_checkpoint.json"
+
+
+def embed_pairs(pairs: list, embed_fn, classifier: ScopeClassifier) -> list:
+    """Opseg i embedding za grupu parova, jednim prolazom kroz model. Opseg se određuje kao u
+    živom pipeline-u (pravila, pa centroidi); bez LLM-a, nesigurni parovi ostaju vezani za svoj čet."""
+    documents = [f"User asked: {p[3]}\nAssistant answered: {p[4]}" for p in pairs]
+    scopes = [classifier.classify_rules(normalize(p[3])) for p in pairs]
+    unsure = [i for i, scope in enumerate(scopes) if scope is None]
+
+    vectors = embed_fn(documents + [pairs[i][3] for i in unsure])
+    for i, vector in zip(unsure, vectors[len(documents):]):
+        scopes[i] = classifier.classify_vector(vector) or "conversation"
+
+    records = []
+    for pair, document, vector, scope in zip(pairs, documents, vectors, scopes):
+        if scope == "ignore":
+            continue
+        message_id, user_id, chat_id, _, _, timestamp = pair
+        records.append({
+            "id": f"m{message_id}",
+            "user_id": user_id,
+            "document": document,
+            "embedding": [float(x) for x in vector],
+            "metadata": {
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "memory_scope": scope,
+                "timestamp": str(timestamp) if timestamp else ""
+            }
+        })
+    return records
+
+
+# Stanje procesa iz pool-a: svaki proces učitava svoj model jednom
+_worker_embed = None
+_worker_classifier = None
+
+
+def _init_worker(threads: int):
+    global _worker_embed, _worker_classifier
+    from app.utils.embedding_service import build_onnx_function
+    _worker_embed = build_onnx_function(threads)
+    _worker_classifier = ScopeClassifier(_worker_embed, llm_fallback=None)
+
+
+def _embed_in_worker(pairs: list) -> list:
+    return embed_pairs(pairs, _worker_embed, _worker_classifier)
+
+
+class MemoryReindexer:
+    """Ponovo gradi memoriju u Chromi iz istorije poruka u SQL bazi.
+
+    Parovi se čitaju u delovima (chunk_size), embeduju u velikim grupama (batch_size) u pool-u
+    procesa i upisuju u novu generaciju kolekcija. Posle svakog dela se čuva checkpoint, pa se
+    prekinut reindex nastavlja od poslednje upisane poruke. Na kraju se aktivna generacija menja
+    atomično (pokazivač u Chroma direktorijumu), a stare kolekcije brišu.
+    Aplikacija treba da bude zaustavljena tokom zamene.
+    """
+
+    def __init__(self, manager: MemoryManager, engine, workers: int = 0, batch_size: int = 256, chunk_size: int = 4096, embed_fn=None):
+        self.manager = manager
+        self.engine = engine
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        # Bez pool-a (workers=0) embedding se računa u ovom procesu, datom funkcijom
+        self.embed_fn = embed_fn
+        self.checkpoint_path = os.path.join(manager.path, CHECKPOINT_FILE)
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_checkpoint(self, checkpoint: dict):
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def _fetch(self, after_id: int) -> list:
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(PAIRS_QUERY, {"after_id": after_id, "limit": self.chunk_size})]
+
+    def _write(self, staging: MemoryManager, records: list):
+        by_user = {}
+        for record in records:
+            by_user.setdefault(record["user_id"], []).append(record)
+        for user_id, user_records in by_user.items():
+            # Upsert po id-ju poruke: ponovljen deo posle prekida ne pravi duplikate
+            staging.collection_for(user_id).upsert(
+                ids=[r["id"] for r in user_records],
+                documents=[r["document"] for r in user_records],
+                embeddings=[r["embedding"] for r in user_records],
+                metadatas=[r["metadata"] for r in user_records]
+            )
+
+    def run(self, resume: bool = True) -> dict:
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint is None:
+            checkpoint = {"prefix": f"{LEGACY_COLLECTION}_r{int(time.time())}", "last_message_id": 0, "pairs": 0, "stored": 0}
+            os.makedirs(self.manager.path, exist_ok=True)
+            self._save_checkpoint(checkpoint)
+        else:
+            print(f"Resuming {checkpoint['prefix']} after message {checkpoint['last_message_id']}")
+
+        staging = MemoryManager(self.manager.path, buckets=self.manager.buckets, embedding_function=self.embed_fn, prefix=checkpoint["prefix"])
+        classifier = None if self.workers else ScopeClassifier(self.embed_fn, llm_fallback=None)
+        executor = None
+        if self.workers:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_init_worker, initargs=(threads,))
+
+        start = time.perf_counter()
+        pairs_this_run = 0
+        try:
+            while True:
+                pairs = self._fetch(checkpoint["last_message_id"])
+                if not pairs:
+                    break
+                batches = [pairs[i:i + self.batch_size] for i in range(0, len(pairs), self.batch_size)]
+                if executor:
+                    results = executor.map(_embed_in_worker, batches)
+                else:
+                    results = (embed_pairs(batch, self.embed_fn, classifier) for batch in batches)
+                for records in results:
+                    self._write(staging, records)
+                    checkpoint["stored"] += len(records)
+
+                pairs_this_run += len(pairs)
+                checkpoint["pairs"] += len(pairs)
+                checkpoint["last_message_id"] = pairs[-1][0]
+                self._save_checkpoint(checkpoint)
+                elapsed = time.perf_counter() - start
+                print(f"{checkpoint['pairs']} pairs ({checkpoint['stored']} stored), {pairs_this_run / elapsed:.1f} pairs/s")
+        finally:
+            if executor:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - start
+        old_prefix = self.manager.prefix
+        self.manager.set_prefix(checkpoint["prefix"])
+        if old_prefix != checkpoint["prefix"]:
+            for name in self.manager.partition_names(old_prefix):
+                self.manager.client.delete_collection(name=name)
+        os.remove(self.checkpoint_path)
+
+        return {
+            "prefix": checkpoint["prefix"],
+            "pairs": checkpoint["pairs"],
+            "stored": checkpoint["stored"],
+            "seconds": round(elapsed, 2),
+            "pairs_per_second": round(pairs_this_run / elapsed, 1) if elapsed else 0.0
+        }
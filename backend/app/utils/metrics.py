@@ -0,0 +1,268 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Granice za trajanje u sekundama: od brzih SQL upita do generisanja na CPU-u
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Faze tekućeg zahteva (ime, ms) za Server-Timing zaglavlje; postavlja ih MetricsMiddleware
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(f"{self.name}_total", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    """Gauge koji se postavlja ručno (inc/dec) ili čita pri svakom scrape-u iz callback-a
+    koji vraća {vrednosti labela: vrednost}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.callback is not None:
+            items = list(self.callback().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, observations, total = self._values.get(key, ([0] * len(self.buckets), 0, 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, observations + 1, total + value)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+        return entry[1] if entry else 0
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(counts), observations, total) for key, (counts, observations, total) in self._values.items()]
+        samples = []
+        for key, counts, observations, total in items:
+            samples.extend(
+                (f"{self.name}_bucket", _format_labels(self.labelnames, key, f'le="{bound}"'), count)
+                for bound, count in zip(self.buckets, counts)
+            )
+            samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, 'le="+Inf"'), observations))
+            samples.append((f"{self.name}_sum", _format_labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.labelnames, key), observations))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Sve metrike u Prometheus text formatu (verzija 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Neispravan callback ne sme da obori ceo scrape
+                print(f"Metrics error ({metric.name}): {e}")
+        return "\n".join(lines) + "\n"
+
+
+def _llm_in_flight() -> dict:
+    from app.utils import llm
+    if llm._pool is None:
+        return {}
+    return {(backend.url,): backend.in_flight for backend in llm._pool.backends}
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "assistant_stage_duration_seconds",
+    "Trajanje faza obrade poruke (auth, recall, history, pdf, prompt, llm, save, classify, add_memory).",
+    ["stage"]
+))
+OLLAMA_SECONDS = registry.register(Histogram(
+    "assistant_ollama_duration_seconds",
+    "Trajanja koja prijavljuje Ollama (load, prompt_eval, eval, total) po modelu.",
+    ["model", "phase"]
+))
+REQUESTS = registry.register(Counter(
+    "assistant_http_requests",
+    "Broj HTTP zahteva po ruti, metodi i statusu.",
+    ["method", "route", "status"]
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    "assistant_http_request_duration_seconds",
+    "Trajanje HTTP zahteva do slanja zaglavlja odgovora.",
+    ["method", "route"]
+))
+REQUESTS_IN_PROGRESS = registry.register(Gauge(
+    "assistant_http_requests_in_progress",
+    "Broj HTTP zahteva koji se trenutno obrađuju."
+))
+LLM_IN_FLIGHT = registry.register(Gauge(
+    "assistant_llm_in_flight",
+    "Broj poziva koji su trenutno u toku po Ollama serveru.",
+    ["backend"],
+    callback=_llm_in_flight
+))
+
+# Polja Ollama odgovora (u nanosekundama) -> faza
+OLLAMA_PHASES = {
+    "load_duration": "load",
+    "prompt_eval_duration": "prompt_eval",
+    "eval_duration": "eval",
+    "total_duration": "total"
+}
+
+
+def record_stage(name: str, seconds: float):
+    """Upisuje trajanje faze u histogram i u Server-Timing tekućeg zahteva."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds * 1000))
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+async def measure(name: str, awaitable):
+    """Kao stage(), ali za awaitable, pa može da se prosledi u asyncio.gather."""
+    with stage(name):
+        return await awaitable
+
+
+def record_ollama(model: str, response):
+    """Trajanja iz (poslednjeg dela) Ollama odgovora; delovi strima bez njih se preskaču."""
+    for field, phase in OLLAMA_PHASES.items():
+        value = response.get(field) if hasattr(response, "get") else None
+        if value:
+            OLLAMA_SECONDS.observe(value / 1e9, model=model, phase=phase)
+
+
+def server_timing(stages: list) -> str:
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in stages)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: broji zahteve po šablonu rute (/chats/{chat_id}, ne /chats/5), meri trajanje
+    i dodaje Server-Timing zaglavlje sa fazama izmerenim do slanja zaglavlja (kod strima to su
+    faze pripreme, pre generisanja)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages = []
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                total = time.perf_counter() - start
+                headers = list(message.get("headers", []))
+                timing = server_timing(stages + [("total", total * 1000)])
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(total, method=scope["method"], route=route.path if route else "unmatched")
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            _request_stages.reset(token)
+            route = scope.get("route")
+            REQUESTS.inc(method=scope["method"], route=route.path if route else "unmatched", status=status_code)
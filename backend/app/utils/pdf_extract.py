@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+import PyPDF2 # type: ignore
+
+
+def _extract_pages(pdf_content: bytes, max_pages: int) -> tuple:
+    """Izvršava se u zasebnom procesu: čita stranu po stranu do `max_pages`. Vraća (tekst, broj strana)."""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
+    parts = []
+    pages = 0
+    for page in pdf_reader.pages:
+        if pages >= max_pages:
+            break
+        text = page.extract_text()
+        if text: parts.append(text)
+        pages += 1
+    return "".join(parts), pages
+
+
+class PdfExtractor:
+    """Ekstrakcija teksta iz PDF-a u ograničenom pool-u procesa, sa timeout-om, limitom strana
+    i keširanjem rezultata na disku po SHA-256 sadržaja fajla."""
+
+    def __init__(self, cache_dir: str, workers: int, timeout: float, max_pages: int):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self._executor = None
+        # Povećava se pri svakom gašenju pool-a, da zadaci prekinuti tuđim timeout-om znaju da treba da se ponove
+        self._generation = 0
+        self.stats = {
+            "documents": 0, "pages": 0, "bytes": 0, "seconds": 0.0,
+            "cache_hits": 0, "timeouts": 0, "errors": 0, "resubmitted": 0
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: bez fork-a procesa koji već ima niti (uvicorn, ONNX)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _kill_executor(self):
+        """ProcessPoolExecutor ne može da prekine jedan zadatak, pa se ceo pool gasi i pravi ponovo.
+        Ostali zadaci iz starog pool-a dobijaju BrokenProcessPool i extract ih šalje novom pool-u."""
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        self._generation += 1
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.txt")
+
+    def _read_cache(self, digest: str) -> Optional[str]:
+        try:
+            with open(self._cache_path(digest), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_cache(self, digest: str, text: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._cache_path(digest) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self._cache_path(digest))
+
+    async def extract(self, pdf_content: Optional[bytes]) -> Optional[str]:
+        """Vraća tekst PDF-a, ili None ako fajl nije poslat, ne može da se pročita ili je istekao timeout."""
+        if pdf_content is None:
+            return None
+
+        digest = hashlib.sha256(pdf_content).hexdigest()
+        cached = await asyncio.to_thread(self._read_cache, digest)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        while True:
+            generation = self._generation
+            try:
+                future = loop.run_in_executor(self._get_executor(), _extract_pages, pdf_content, self.max_pages)
+                text, pages = await asyncio.wait_for(future, self.timeout)
+                break
+            except asyncio.TimeoutError:
+                print(f"PDF Error: extraction exceeded {self.timeout}s")
+                self.stats["timeouts"] += 1
+                self._kill_executor()
+                return None
+            except BrokenProcessPool as e:
+                # Pool je ugašen zbog timeout-a drugog dokumenta: ovaj zadatak nije kriv, šalje se ponovo
+                if self._generation != generation:
+                    self.stats["resubmitted"] += 1
+                    continue
+                print(f"PDF Error: {e}")
+                self.stats["errors"] += 1
+                return None
+            except Exception as e:
+                print(f"PDF Error: {e}")
+                self.stats["errors"] += 1
+                return None
+
+        self.stats["documents"] += 1
+        self.stats["pages"] += pages
+        self.stats["bytes"] += len(pdf_content)
+        self.stats["seconds"] += time.perf_counter() - start
+        await asyncio.to_thread(self._write_cache, digest, text)
+        return text
+
+    def get_stats(self) -> dict:
+        seconds = self.stats["seconds"]
+        return self.stats | {
+            "pages_per_second": round(self.stats["pages"] / seconds, 2) if seconds else 0.0,
+            "bytes_per_second": round(self.stats["bytes"] / seconds, 2) if seconds else 0.0
+        }
+
+
+_extractor = None
+
+
+def get_pdf_extractor() -> PdfExtractor:
+    global _extractor
+    if _extractor is None:
+        from config import get_config
+        config = get_config()
+        _extractor = PdfExtractor(
+            config['PDF_CACHE_DIR'], config['PDF_WORKERS'], config['PDF_TIMEOUT'], config['PDF_MAX_PAGES']
+        )
+    return _extractor
+
+
+async def extract_pdf_text(pdf_content: Optional[bytes]) -> Optional[str]:
+    return await get_pdf_extractor().extract(pdf_content)
+
+
+def shutdown_pdf_extractor():
+    if _extractor is not None:
+        _extractor.shutdown()
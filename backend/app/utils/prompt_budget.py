@@ -0,0 +1,138 @@
+import os
+import threading
+from dataclasses import dataclass, field
+from config import get_config
+
+# Dodatni tokeni koje chat šablon modela troši po poruci (uloga, separatori)
+MESSAGE_OVERHEAD = 4
+# Deo koji je kraći od ovoga se izbacuje umesto da se skraćuje
+MIN_TRUNCATED_TOKENS = 32
+
+
+class TokenCounter:
+    """Broji tokene pravim tokenizer-om (`tokenizers`); ako ne može da se učita, koristi procenu ~4 karaktera po tokenu."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._tokenizer = self._load()
+                    self._loaded = True
+        return self._tokenizer
+
+    def _load(self):
+        if not self.name:
+            return None
+        try:
+            from tokenizers import Tokenizer # type: ignore
+            if os.path.isfile(self.name):
+                return Tokenizer.from_file(self.name)
+            return Tokenizer.from_pretrained(self.name)
+        except Exception as e:
+            print(f"Tokenizer '{self.name}' nije dostupan, koristi se procena: {e}")
+            return None
+
+    @property
+    def is_exact(self) -> bool:
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return (len(text) + 3) // 4
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is None:
+            return text[:max_tokens * 4]
+        offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+        if len(offsets) <= max_tokens:
+            return text
+        return text[:offsets[max_tokens - 1][1]]
+
+
+@dataclass
+class PromptSection:
+    """Deo prompta. Sekcije sa manjim prioritetom se skraćuju prve; `drop_from` određuje
+    koji se elementi prvi izbacuju ("start" - najstariji, "end" - najmanje relevantni)."""
+    name: str
+    items: list
+    priority: int = 0
+    required: bool = False
+    drop_from: str = "end"
+    tokens: list = field(default_factory=list)
+
+
+class PromptBudget:
+    def __init__(self, counter: TokenCounter, budget: int):
+        self.counter = counter
+        self.budget = budget
+
+    def fit(self, sections: list) -> dict:
+        """Skraćuje sekcije po prioritetu dok ukupan broj tokena ne stane u budžet.
+        Menja `items` sekcija u mestu i vraća raspodelu tokena po sekciji."""
+        for section in sections:
+            section.tokens = [self.counter.count(item) + MESSAGE_OVERHEAD for item in section.items]
+        total = sum(sum(s.tokens) for s in sections)
+        dropped = 0
+
+        for section in sorted((s for s in sections if not s.required), key=lambda s: s.priority):
+            while total > self.budget and section.items:
+                index = 0 if section.drop_from == "start" else len(section.items) - 1
+                item_tokens = section.tokens[index]
+                keep = item_tokens - (total - self.budget) - MESSAGE_OVERHEAD
+                if keep >= MIN_TRUNCATED_TOKENS:
+                    # Dovoljno je skratiti ovaj element
+                    section.items[index] = self.counter.truncate(section.items[index], keep)
+                    section.tokens[index] = self.counter.count(section.items[index]) + MESSAGE_OVERHEAD
+                    total += section.tokens[index] - item_tokens
+                    break
+                section.items.pop(index)
+                section.tokens.pop(index)
+                total -= item_tokens
+                dropped += 1
+            if total <= self.budget:
+                break
+
+        breakdown = {s.name: sum(s.tokens) for s in sections}
+        breakdown["total"] = total
+        breakdown["budget"] = self.budget
+        breakdown["dropped_items"] = dropped
+        return breakdown
+
+
+# Jedan brojač po tokenizer-u (modeli sa istim tokenizer-om ga dele)
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model_name: str = None) -> TokenCounter:
+    config = get_config()
+    name = config['TOKENIZERS'].get(model_name, config['TOKENIZER'])
+    with _counters_lock:
+        if name not in _counters:
+            _counters[name] = TokenCounter(name)
+        return _counters[name]
+
+
+def warmup_token_counters():
+    """Učitava tokenizer-e podešenih modela pri pokretanju, da prvi zahtev ne čeka na učitavanje."""
+    config = get_config()
+    for model_name in {config['MODEL_NAME'], *config['TOKENIZERS']}:
+        get_token_counter(model_name).tokenizer
+
+
+def get_prompt_budget(model_name: str) -> PromptBudget:
+    config = get_config()
+    budget = config['PROMPT_TOKEN_BUDGETS'].get(model_name, config['PROMPT_TOKEN_BUDGET'])
+    return PromptBudget(get_token_counter(model_name), budget)
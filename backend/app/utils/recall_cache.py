@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from app.utils.scope_classifier import normalize
+
+
+class RecallCache:
+    """TTL keš za recall memorije: embedding-i upita po normalizovanom tekstu i rezultati
+    pretrage po (korisnik, čet, hash upita).
+
+    Upis memorije briše samo rezultate koje može da promeni: globalna memorija sve rezultate
+    korisnika, memorija razgovora samo rezultate tog četa. Keš je lokalan za proces; upisi iz
+    drugih worker-a se vide najkasnije posle TTL-a.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._embeddings = OrderedDict()
+        self._results = OrderedDict()
+        # user_id -> ključevi rezultata, i brojač verzije za upise tokom pretrage
+        self._user_keys = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.stats = {"embedding_hits": 0, "embedding_misses": 0, "result_hits": 0, "result_misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def query_key(query: str) -> str:
+        return hashlib.sha1(normalize(query).encode("utf-8")).hexdigest()
+
+    def _get(self, entries, key, hit, miss):
+        now = time.monotonic()
+        entry = entries.get(key)
+        if entry is not None and entry[1] < now:
+            del entries[key]
+            entry = None
+        if entry is None:
+            self.stats[miss] += 1
+            return None
+        entries.move_to_end(key)
+        self.stats[hit] += 1
+        return entry[0]
+
+    def _put(self, entries, key, value):
+        entries[key] = (value, time.monotonic() + self.ttl)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            evicted, _ = entries.popitem(last=False)
+            if entries is self._results:
+                self._user_keys.get(evicted[0], set()).discard(evicted)
+
+    def get_embedding(self, query_key: str):
+        with self._lock:
+            return self._get(self._embeddings, query_key, "embedding_hits", "embedding_misses")
+
+    def put_embedding(self, query_key: str, embedding):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._put(self._embeddings, query_key, embedding)
+
+    def version(self, user_id: int) -> int:
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def get_results(self, user_id: int, chat_id: int, query_key: str, limit: int):
+        with self._lock:
+            return self._get(self._results, (user_id, chat_id, query_key, limit), "result_hits", "result_misses")
+
+    def put_results(self, user_id: int, chat_id: int, query_key: str, limit: int, results: list, version: int):
+        """Čuva rezultat samo ako se memorija korisnika nije menjala od početka pretrage."""
+        if self.max_entries <= 0:
+            return
+        key = (user_id, chat_id, query_key, limit)
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            self._put(self._results, key, list(results))
+            self._user_keys.setdefault(user_id, set()).add(key)
+
+    def invalidate(self, user_id: int, chat_id: int = None):
+        """Briše rezultate korisnika (chat_id=None) ili samo jednog njegovog četa."""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            keys = self._user_keys.get(user_id, set())
+            stale = {key for key in keys if chat_id is None or key[1] == chat_id}
+            for key in stale:
+                self._results.pop(key, None)
+            keys -= stale
+            self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._embeddings.clear()
+            self._results.clear()
+            self._user_keys.clear()
+            self._versions = {user_id: version + 1 for user_id, version in self._versions.items()}
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["embeddings"] = len(self._embeddings)
+            stats["results"] = len(self._results)
+        for kind in ("embedding", "result"):
+            total = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+            stats[f"{kind}_hit_rate"] = round(stats[f"{kind}_hits"] / total, 3) if total else 0.0
+        return stats
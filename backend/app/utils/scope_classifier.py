@@ -0,0 +1,139 @@
+import re
+import time
+from collections import OrderedDict
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+SCOPES = ["global", "conversation", "ignore"]
+
+# Nivo 1: kratke poruke koje su sigurno small talk, i obrasci ličnih podataka
+_SMALL_TALK = {
+    "hi", "hello", "hey", "yo", "hiya", "ok", "okay", "k", "thanks", "thank you", "thx", "ty",
+    "bye", "goodbye", "good morning", "good night", "cool", "nice", "great", "yes", "no", "sure",
+    "zdravo", "cao", "ćao", "hej", "hvala", "fala", "hvala ti", "pozdrav", "dobro jutro", "laku noc",
+    "laku noć", "vazi", "važi", "super", "da", "ne", "moze", "može"
+}
+_PERSONAL_PATTERNS = re.compile(
+    r"\b(my name is|call me|i am called|i prefer|i like|i love|i hate|i work as|i live in|remember that i|"
+    r"zovem se|moje ime je|volim|ne volim|radim kao|živim u|zivim u|zapamti da)\b"
+)
+
+# Nivo 2: primeri po kategoriji od kojih se računaju centroidi
+_SEED_EXAMPLES = {
+    "global": [
+        "My name is Marko",
+        "I prefer answers in Serbian",
+        "I am a backend developer and I mostly use Python",
+        "Please always show code examples with type hints",
+        "I live in Belgrade and work remotely",
+        "Remember that I use Windows and VS Code",
+    ],
+    "conversation": [
+        "How do I reverse a list in Python?",
+        "Why does this function raise a KeyError?",
+        "Explain the difference between a process and a thread",
+        "Can you review this SQL query for performance issues?",
+        "What is a decorator and how do I write one?",
+        "Fix the bug in this loop that never terminates",
+    ],
+    "ignore": [
+        "hi there",
+        "thanks a lot",
+        "ok got it",
+        "hello how are you",
+        "bye see you later",
+        "great, thank you",
+    ],
+}
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class ScopeClassifier:
+    """Višenivojski klasifikator opsega memorije: pravila -> najbliži centroid embedding-a -> LLM.
+
+    LLM se poziva samo kada prva dva nivoa nisu dovoljno sigurna; rezultati se keširaju (LRU).
+    """
+
+    def __init__(self, embed_fn, llm_fallback, margin: float = 0.05, cache_size: int = 2048):
+        self.embed_fn = embed_fn
+        self.llm_fallback = llm_fallback
+        self.margin = margin
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._centroids = None
+        self.stats = {tier: {"hits": 0, "total_ms": 0.0} for tier in ["cache", "rules", "embedding", "llm"]}
+
+    def _record(self, tier: str, start: float):
+        self.stats[tier]["hits"] += 1
+        self.stats[tier]["total_ms"] += (time.perf_counter() - start) * 1000
+
+    def classify_rules(self, normalized: str):
+        if not normalized or normalized in _SMALL_TALK:
+            return "ignore"
+        if _PERSONAL_PATTERNS.search(normalized):
+            return "global"
+        return None
+
+    def _get_centroids(self):
+        if self._centroids is None:
+            centroids = []
+            for scope in SCOPES:
+                vectors = np.array(self.embed_fn(_SEED_EXAMPLES[scope]), dtype=np.float32)
+                centroid = vectors.mean(axis=0)
+                centroids.append(centroid / np.linalg.norm(centroid))
+            self._centroids = np.stack(centroids)
+        return self._centroids
+
+    def classify_embedding(self, text: str):
+        """Vraća kategoriju najbližeg centroida, ili None ako razlika do drugog nije dovoljna."""
+        return self.classify_vector(self.embed_fn([text])[0])
+
+    def classify_vector(self, vector):
+        """Isto kao classify_embedding, za već izračunat embedding teksta."""
+        centroids = self._get_centroids()
+        vector = np.array(vector, dtype=np.float32)
+        similarities = centroids @ (vector / np.linalg.norm(vector))
+        best, second = np.argsort(similarities)[::-1][:2]
+        if similarities[best] - similarities[second] < self.margin:
+            return None
+        return SCOPES[best]
+
+    async def classify(self, content: str) -> str:
+        start = time.perf_counter()
+        key = normalize(content)
+
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self._record("cache", start)
+            return self._cache[key]
+
+        scope = self.classify_rules(key)
+        tier = "rules"
+        if scope is None:
+            try:
+                scope = await run_in_threadpool(self.classify_embedding, content)
+                tier = "embedding"
+            except Exception as e:
+                print(f"Embedding classifier error: {e}")
+        if scope is None:
+            scope = await self.llm_fallback(content)
+            tier = "llm"
+
+        self._record(tier, start)
+        self._cache[key] = scope
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return scope
+
+    def get_stats(self) -> dict:
+        return {
+            tier: {
+                "hits": s["hits"],
+                "avg_ms": round(s["total_ms"] / s["hits"], 3) if s["hits"] else 0.0
+            }
+            for tier, s in self.stats.items()
+        } | {"cache_size": len(self._cache)}
@@ -0,0 +1,187 @@
+import threading
+import time
+from sqlalchemy import text, bindparam
+from config import get_config
+
+# Gornje granice (ms) histograma trajanja generisanja; poslednja hvata sve duže
+GENERATION_BUCKETS_MS = (500, 1000, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 45000, 60000, 90000, 120000, 180000, 300000, 3600000)
+
+_BUCKET_EXPR = "CASE " + " ".join(
+    f"WHEN m.total_duration_ms <= {bound} THEN {bound}" for bound in GENERATION_BUCKETS_MS[:-1]
+) + f" ELSE {GENERATION_BUCKETS_MS[-1]} END"
+
+# Zbirovi po porukama; {where} bira poruke, :sign je 1 za upis i -1 za brisanje
+_MESSAGE_ROLLUPS = [
+    """
+    INSERT INTO user_stats (user_id, chat_count, message_count)
+    SELECT c.user_id, 0, :sign * COUNT(*)
+    FROM messages m JOIN chats c ON c.id = m.chat_id
+    WHERE {where}
+    GROUP BY c.user_id
+    ON CONFLICT(user_id) DO UPDATE SET message_count = message_count + excluded.message_count
+    """,
+    """
+    INSERT INTO mode_stats (mode_id, message_count)
+    SELECT COALESCE(m.mode_id, 0), :sign * COUNT(*)
+    FROM messages m JOIN chats c ON c.id = m.chat_id
+    WHERE {where}
+    GROUP BY COALESCE(m.mode_id, 0)
+    ON CONFLICT(mode_id) DO UPDATE SET message_count = message_count + excluded.message_count
+    """,
+    """
+    INSERT INTO daily_stats (day, chat_count, message_count)
+    SELECT date(m.timestamp), 0, :sign * COUNT(*)
+    FROM messages m JOIN chats c ON c.id = m.chat_id
+    WHERE {where}
+    GROUP BY date(m.timestamp)
+    ON CONFLICT(day) DO UPDATE SET message_count = message_count + excluded.message_count
+    """,
+    """
+    INSERT INTO model_stats (model_name, responses, prompt_tokens, prompt_responses, completion_tokens,
+                             completion_responses, timed_completion_tokens, timed_eval_ms, cold_starts)
+    SELECT m.model_name,
+           :sign * COUNT(*),
+           :sign * COALESCE(SUM(m.prompt_tokens), 0),
+           :sign * COUNT(m.prompt_tokens),
+           :sign * COALESCE(SUM(m.completion_tokens), 0),
+           :sign * COUNT(m.completion_tokens),
+           :sign * COALESCE(SUM(CASE WHEN m.eval_ms > 0 THEN m.completion_tokens END), 0),
+           :sign * COALESCE(SUM(CASE WHEN m.completion_tokens IS NOT NULL THEN m.eval_ms END), 0),
+           :sign * COALESCE(SUM(CASE WHEN m.load_duration_ms > :cold_ms THEN 1 ELSE 0 END), 0)
+    FROM messages m JOIN chats c ON c.id = m.chat_id
+    WHERE ({where}) AND m.model_name IS NOT NULL
+    GROUP BY m.model_name
+    ON CONFLICT(model_name) DO UPDATE SET
+        responses = responses + excluded.responses,
+        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+        prompt_responses = prompt_responses + excluded.prompt_responses,
+        completion_tokens = completion_tokens + excluded.completion_tokens,
+        completion_responses = completion_responses + excluded.completion_responses,
+        timed_completion_tokens = timed_completion_tokens + excluded.timed_completion_tokens,
+        timed_eval_ms = timed_eval_ms + excluded.timed_eval_ms,
+        cold_starts = cold_starts + excluded.cold_starts
+    """,
+    """
+    INSERT INTO generation_time_stats (mode_id, bucket_ms, count)
+    SELECT COALESCE(m.mode_id, 0), """ + _BUCKET_EXPR + """, :sign * COUNT(*)
+    FROM messages m JOIN chats c ON c.id = m.chat_id
+    WHERE ({where}) AND m.total_duration_ms IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT(mode_id, bucket_ms) DO UPDATE SET count = count + excluded.count
+    """
+]
+
+# Zbirovi po četovima; {where} bira četove
+_CHAT_ROLLUPS = [
+    """
+    INSERT INTO user_stats (user_id, chat_count, message_count)
+    SELECT c.user_id, :sign * COUNT(*), 0
+    FROM chats c
+    WHERE {where}
+    GROUP BY c.user_id
+    ON CONFLICT(user_id) DO UPDATE SET chat_count = chat_count + excluded.chat_count
+    """,
+    """
+    INSERT INTO daily_stats (day, chat_count, message_count)
+    SELECT date(c.created_at), :sign * COUNT(*), 0
+    FROM chats c
+    WHERE {where}
+    GROUP BY date(c.created_at)
+    ON CONFLICT(day) DO UPDATE SET chat_count = chat_count + excluded.chat_count
+    """
+]
+
+ROLLUP_TABLES = ("user_stats", "mode_stats", "daily_stats", "model_stats", "generation_time_stats")
+
+
+def _statements(templates: list, where: str, sign: int, params: dict, expanding: tuple = ()) -> list:
+    statements = []
+    for template in templates:
+        statement = text(template.format(where=where))
+        if expanding:
+            statement = statement.bindparams(*(bindparam(name, expanding=True) for name in expanding))
+        values = {"sign": sign, **params}
+        if ":cold_ms" in template:
+            values["cold_ms"] = get_config()['OLLAMA_COLD_LOAD_MS']
+        statements.append((statement, values))
+    return statements
+
+
+def messages_added(message_ids: list) -> list:
+    """Naredbe koje dodaju upravo upisane poruke u zbirne tabele (pokreću se posle flush-a)."""
+    return _statements(_MESSAGE_ROLLUPS, "m.id IN :message_ids", 1, {"message_ids": list(message_ids)}, ("message_ids",))
+
+
+def chats_added(chat_ids: list) -> list:
+    return _statements(_CHAT_ROLLUPS, "c.id IN :chat_ids", 1, {"chat_ids": list(chat_ids)}, ("chat_ids",))
+
+
+def chats_removed(chat_ids: list) -> list:
+    """Naredbe koje oduzimaju četove i njihove poruke; pokreću se pre DELETE upita, u istoj transakciji."""
+    params = {"chat_ids": list(chat_ids)}
+    return (_statements(_MESSAGE_ROLLUPS, "m.chat_id IN :chat_ids", -1, params, ("chat_ids",))
+            + _statements(_CHAT_ROLLUPS, "c.id IN :chat_ids", -1, params, ("chat_ids",)))
+
+
+def user_removed(user_id: int) -> list:
+    params = {"user_id": user_id}
+    return (_statements(_MESSAGE_ROLLUPS, "c.user_id = :user_id", -1, params)
+            + _statements(_CHAT_ROLLUPS, "c.user_id = :user_id", -1, params)
+            + [(text("DELETE FROM user_stats WHERE user_id = :user_id"), params)])
+
+
+async def apply_rollups(session, statements: list):
+    """Izvršava naredbe zbirnih tabela u async sesiji posla (ista transakcija kao i upis)."""
+    for statement, params in statements:
+        await session.execute(statement, params)
+
+
+def rebuild_statements() -> list:
+    """Naredbe koje prazne zbirne tabele i ponovo ih računaju iz svih poruka i četova."""
+    return ([(text(f"DELETE FROM {table}"), {}) for table in ROLLUP_TABLES]
+            + _statements(_MESSAGE_ROLLUPS, "1 = 1", 1, {})
+            + _statements(_CHAT_ROLLUPS, "1 = 1", 1, {}))
+
+
+def rebuild(db) -> dict:
+    """Briše i ponovo računa sve zbirne tabele iz messages/chats (sync sesija, jedna transakcija)."""
+    for statement, params in rebuild_statements():
+        db.execute(statement, params)
+    db.commit()
+    return {table: db.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() for table in ROLLUP_TABLES}
+
+
+def percentile_from_buckets(buckets: list, fraction: float) -> float:
+    """Gornja granica (s) bucket-a u kome je tražena pozicija (najbliži rang); buckets su (bucket_ms, broj) rastuće."""
+    total = sum(count for _, count in buckets)
+    if total <= 0:
+        return 0
+    rank = int(fraction * (total - 1)) + 1
+    seen = 0
+    for bound, count in buckets:
+        seen += count
+        if seen >= rank:
+            return round(bound / 1000, 2)
+    return round(buckets[-1][0] / 1000, 2)
+
+
+class TTLValue:
+    """Jedna keširana vrednost sa rokom trajanja (dashboard se osvežava periodično)."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._value = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, compute):
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires:
+                return self._value
+            self._value = compute()
+            self._expires = time.monotonic() + self.ttl
+            return self._value
+
+    def clear(self):
+        with self._lock:
+            self._value = None
@@ -0,0 +1,103 @@
+import asyncio
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.models.chat import Chat
+from app.models.message import Message
+from app.utils import llm
+from app.utils.chat_cache import get_chat_cache
+from config import get_config
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the existing summary with the new messages. Keep facts, decisions, code details and open questions;
+drop greetings and repetition. Reply with the updated summary only, at most 200 words.
+
+Existing summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+# Četovi za koje sažimanje već traje, i reference na taskove da ih GC ne pokupi
+_in_progress = set()
+_tasks = set()
+
+
+def _load_unsummarized(chat_id: int):
+    """Vraća (postojeći sažetak, poruke za sažimanje) ili None ako još nema dovoljno novih poruka.
+    Poslednjih SUMMARY_RECENT_WINDOW poruka ostaje van sažetka jer idu u prompt doslovno, a jedan
+    prolaz uzima najviše SUMMARY_MAX_MESSAGES najstarijih poruka (dug čet se sažima u delovima)."""
+    config = get_config()
+    db = SessionLocal()
+    try:
+        chat = db.query(Chat).filter(Chat.id == chat_id).first()
+        if chat is None:
+            return None
+        unsummarized = db.query(Message.id).filter(Message.chat_id == chat_id, Message.id > (chat.summary_message_id or 0))
+        count = min(unsummarized.count() - config['SUMMARY_RECENT_WINDOW'], config['SUMMARY_MAX_MESSAGES'])
+        if count < config['SUMMARY_EVERY']:
+            return None
+        to_summarize = (
+            db.query(Message.id, Message.role, Message.content)
+            .filter(Message.chat_id == chat_id, Message.id > (chat.summary_message_id or 0))
+            .order_by(Message.id)
+            .limit(count)
+            .all()
+        )
+        return chat.summary, chat.summary_message_id, to_summarize
+    finally:
+        db.close()
+
+
+def _store_summary(chat_id: int, previous_message_id, summary: str, last_message_id: int):
+    db = SessionLocal()
+    try:
+        # Upis samo ako u međuvremenu niko drugi nije pomerio sažetak
+        updated = db.query(Chat).filter(
+            Chat.id == chat_id,
+            Chat.summary_message_id.is_(None) if previous_message_id is None else Chat.summary_message_id == previous_message_id
+        ).update({"summary": summary, "summary_message_id": last_message_id}, synchronize_session=False)
+        db.commit()
+        if updated:
+            get_chat_cache().apply_summary(chat_id, summary, last_message_id)
+    finally:
+        db.close()
+
+
+async def update_chat_summary(chat_id: int) -> bool:
+    """Dopunjuje sažetak četa samo novim porukama. Vraća True ako je sažetak ažuriran."""
+    loaded = await run_in_threadpool(_load_unsummarized, chat_id)
+    if loaded is None:
+        return False
+    summary, previous_message_id, to_summarize = loaded
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=summary or "(empty)",
+        messages="\n".join(f"{m.role}: {m.content}" for m in to_summarize)
+    )
+    response = await llm.chat(get_config()['MODEL_NAME'], [{"role": "user", "content": prompt}])
+    new_summary = response['message']['content'].strip()
+
+    await run_in_threadpool(_store_summary, chat_id, previous_message_id, new_summary, to_summarize[-1].id)
+    return True
+
+
+async def _run_summary(chat_id: int):
+    try:
+        # Čet sa dugom nesažetom istorijom se sustiže deo po deo
+        while await update_chat_summary(chat_id):
+            pass
+    except Exception as e:
+        print(f"Summary error (chat {chat_id}): {e}")
+    finally:
+        _in_progress.discard(chat_id)
+
+
+def schedule_summary_update(chat_id: int):
+    """Pokreće ažuriranje sažetka u pozadini (najviše jedno istovremeno po četu)."""
+    if chat_id in _in_progress:
+        return
+    _in_progress.add(chat_id)
+    task = asyncio.create_task(_run_summary(chat_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from app.database import AsyncSessionLocal
+from config import get_config
+
+
+class WriteQueue:
+    """Jedan pisac po procesu: upisi iz više zahteva se skupljaju nekoliko milisekundi i
+    potvrđuju jednim commit-om (jedan fsync i jedno zaključavanje SQLite fajla za celu grupu).
+
+    Posao je async funkcija koja prima sesiju, dodaje/menja redove i vraća rezultat (npr. objekat
+    sa id-jem posle flush-a); commit radi red. Pozivalac dobija rezultat tek kad je grupa upisana."""
+
+    def __init__(self, session_factory, window_ms: float = 5, max_batch: int = 64):
+        self._session_factory = session_factory
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+        self._stats = {"batches": 0, "writes": 0, "replayed_batches": 0, "failed_writes": 0, "commit_seconds": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Upisuje sve što je već u redu i gasi pisca."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, job):
+        """Stavlja posao u red i čeka da njegova grupa bude potvrđena u bazi."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            # Kratak prozor da se skupe upisi iz zahteva koji stižu istovremeno
+            await asyncio.sleep(self.window)
+            batch = [item]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                # Pisac ne sme da stane; pozivaoci grupe dobijaju grešku
+                print(f"Write queue error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _commit_batch(self, batch):
+        start = time.perf_counter()
+        results = None
+        async with self._session_factory() as db:
+            try:
+                results = [await job(db) for job, _ in batch]
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                results = None
+
+        if results is not None:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._record(len(batch), start)
+            return
+
+        # Jedan neispravan upis (npr. duplikat email-a) ne sme da obori ostale iz grupe,
+        # pa se grupa ponavlja posao po posao, svaki u svojoj transakciji
+        self._stats["replayed_batches"] += 1
+        for job, future in batch:
+            async with self._session_factory() as db:
+                try:
+                    result = await job(db)
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    self._stats["failed_writes"] += 1
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+            if not future.done():
+                future.set_result(result)
+        self._record(len(batch), start)
+
+    def _record(self, size, start):
+        self._stats["batches"] += 1
+        self._stats["writes"] += size
+        self._stats["commit_seconds"] += time.perf_counter() - start
+
+    def get_stats(self):
+        batches = self._stats["batches"]
+        return {
+            "enabled": self.running,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "batches": batches,
+            "writes": self._stats["writes"],
+            "avg_batch_size": round(self._stats["writes"] / batches, 2) if batches else 0.0,
+            "avg_commit_ms": round(self._stats["commit_seconds"] / batches * 1000, 2) if batches else 0.0,
+            "replayed_batches": self._stats["replayed_batches"],
+            "failed_writes": self._stats["failed_writes"]
+        }
+
+
+_write_queue = None
+
+
+def get_write_queue() -> WriteQueue:
+    global _write_queue
+    if _write_queue is None:
+        config = get_config()
+        _write_queue = WriteQueue(AsyncSessionLocal, config['DB_WRITE_BATCH_WINDOW_MS'], config['DB_WRITE_BATCH_MAX'])
+    return _write_queue
+
+
+async def run_write(db, job):
+    """Izvršava upis: kroz zajednički red kad je grupisanje uključeno, inače odmah u sesiji zahteva."""
+    queue = get_write_queue()
+    if queue.running:
+        return await queue.submit(job)
+    try:
+        result = await job(db)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return result
+
+
+def start_write_queue():
+    if get_config()['DB_WRITE_BATCHING']:
+        get_write_queue().start()
+
+
+async def stop_write_queue():
+    if _write_queue is not None:
+        await _write_queue.stop()
@@ -0,0 +1,72 @@
+"""Benchmark embedding-a: protok ONNX modela u zavisnosti od veličine grupe i protok
+servisa kada isti broj tekstova stiže od više istovremenih korisnika.
+
+    cd backend
+    python benchmarks/embedding.py [--texts 256] [--threads 4]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.utils.embedding_service import EmbeddingService, build_onnx_function
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def sample_texts(n: int) -> list:
+    return [f"User asked: how do I fix error {i} in my FastAPI route?\nAssistant answered: check the dependency {i % 7}." for i in range(n)]
+
+
+def bench_batch_sizes(model, texts):
+    print(f"{'batch':>6} {'texts/s':>10} {'ms/batch':>10}")
+    for size in BATCH_SIZES:
+        start = time.perf_counter()
+        for i in range(0, len(texts), size):
+            model(texts[i:i + size])
+        elapsed = time.perf_counter() - start
+        batches = (len(texts) + size - 1) // size
+        print(f"{size:>6} {len(texts) / elapsed:>10.1f} {elapsed / batches * 1000:>10.1f}")
+
+
+def bench_service(model, texts, clients: int, max_batch: int):
+    # Svaki "korisnik" šalje po jedan tekst, kao recall na svakoj poruci
+    service = EmbeddingService(lambda: model, max_batch=max_batch, max_wait_ms=5)
+    service.embed(["warmup"])
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(lambda text: service.embed([text]), texts))
+    elapsed = time.perf_counter() - start
+    stats = service.get_stats()
+    service.shutdown()
+    print(f"  max_batch={max_batch:<3} clients={clients:<3} {len(texts) / elapsed:>8.1f} texts/s  (avg batch {stats['avg_batch_size']})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=4, help="ONNX intra-op niti")
+    parser.add_argument("--clients", type=int, default=32, help="istovremeni pozivaoci servisa")
+    args = parser.parse_args()
+
+    model = build_onnx_function(args.threads)
+    texts = sample_texts(args.texts)
+    try:
+        model(["warmup"])
+    except Exception as e:
+        # Npr. ONNX model ne može da se preuzme bez mreže
+        print(f"error: {type(e).__name__}: {e}")
+        return
+
+    print(f"ONNX MiniLM, {args.threads} intra-op threads, {len(texts)} texts")
+    bench_batch_sizes(model, texts)
+    print("EmbeddingService (concurrent single-text requests)")
+    for max_batch in (1, 8, 32):
+        bench_service(model, texts, args.clients, max_batch)
+
+
+if __name__ == "__main__":
+    main()
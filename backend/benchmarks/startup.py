@@ -0,0 +1,86 @@
+"""Benchmark hladnog starta: import aplikacije i prvi zahtevi se mere odvojeno.
+
+Svako merenje se radi u novom procesu da keš modula i učitani modeli ne utiču na rezultat.
+
+    cd backend
+    python benchmarks/startup.py
+"""
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def child(warmup: bool):
+    sys.path.insert(0, str(BACKEND_DIR))
+    result = {}
+
+    start = time.perf_counter()
+    from app.main import app
+    from app.utils.memory import memory_manager
+    result["import_s"] = time.perf_counter() - start
+    result["chromadb_loaded_at_import"] = "chromadb" in sys.modules
+
+    from fastapi.testclient import TestClient
+    from config import get_config
+    get_config()['MEMORY_WARMUP'] = warmup
+    memory_manager.path = tempfile.mkdtemp(prefix="chroma_bench_")
+
+    start = time.perf_counter()
+    try:
+        with TestClient(app) as client:
+            result["lifespan_startup_s"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            client.get("/health")
+            result["first_request_s"] = time.perf_counter() - start
+
+            # Prvi zahtev koji dodiruje memoriju (Chroma + ONNX model ako nisu zagrejani)
+            start = time.perf_counter()
+            memory_manager.recall_memory(0, 0, "benchmark query")
+            result["first_memory_call_s"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            memory_manager.recall_memory(0, 0, "benchmark query")
+            result["warm_memory_call_s"] = time.perf_counter() - start
+    except Exception as e:
+        # Npr. ONNX model ne može da se preuzme - ostala merenja i dalje važe
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    print(json.dumps(result))
+
+
+def fmt(seconds) -> str:
+    return f"{seconds * 1000:9.1f} ms" if seconds is not None else "        n/a"
+
+
+def run(warmup: bool) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "1" if warmup else "0"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    for warmup in (False, True):
+        r = run(warmup)
+        print(f"MEMORY_WARMUP={str(warmup).lower()}")
+        print(f"  import app.main        {fmt(r.get('import_s'))}  (chromadb loaded: {r['chromadb_loaded_at_import']})")
+        print(f"  lifespan startup       {fmt(r.get('lifespan_startup_s'))}")
+        print(f"  first request /health  {fmt(r.get('first_request_s'))}")
+        print(f"  first memory call      {fmt(r.get('first_memory_call_s'))}")
+        print(f"  warm memory call       {fmt(r.get('warm_memory_call_s'))}")
+        if "error" in r:
+            print(f"  error: {r['error']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        child(sys.argv[2] == "1")
+    else:
+        main()
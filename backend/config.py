@@ -8,8 +8,91 @@ def get_config():
     global _config_cache
     if not _config_cache:
         load_dotenv()
-        _config_cache['OLLAMA_URL'] = os.getenv("OLLAMA_URL", "http://localhost:11434")
+        # Baza: URL (docker-compose postavlja DATABASE_URL), veličina pool-a i SQLite podešavanja
+        _config_cache['DATABASE_URL'] = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+        _config_cache['DB_POOL_SIZE'] = int(os.getenv("DB_POOL_SIZE", "10"))
+        _config_cache['DB_MAX_OVERFLOW'] = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+        _config_cache['SQLITE_MMAP_SIZE'] = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+        _config_cache['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+        # Grupisanje upisa: jedan pisac po procesu, commit na svakih WINDOW_MS ili MAX upisa
+        _config_cache['DB_WRITE_BATCHING'] = os.getenv("DB_WRITE_BATCHING", "false").lower() in ("1", "true", "yes")
+        _config_cache['DB_WRITE_BATCH_WINDOW_MS'] = float(os.getenv("DB_WRITE_BATCH_WINDOW_MS", "5"))
+        _config_cache['DB_WRITE_BATCH_MAX'] = int(os.getenv("DB_WRITE_BATCH_MAX", "64"))
+        _config_cache['OLLAMA_URL'] = os.getenv("OLLAMA_URL", os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+        # Lista Ollama servera odvojena zarezom; ako nije zadata koristi se samo OLLAMA_URL
+        urls = os.getenv("OLLAMA_URLS", "")
+        _config_cache['OLLAMA_URLS'] = [u.strip() for u in urls.split(",") if u.strip()] or [_config_cache['OLLAMA_URL']]
         _config_cache['MODEL_NAME'] = os.getenv("MODEL_NAME", "llama3.2:1b")  
+        # Podešavanja HTTP klijenta ka Ollama serveru (sekunde / broj konekcija)
+        _config_cache['OLLAMA_TIMEOUT'] = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+        _config_cache['OLLAMA_CONNECT_TIMEOUT'] = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        _config_cache['OLLAMA_MAX_CONNECTIONS'] = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+        _config_cache['OLLAMA_MAX_KEEPALIVE'] = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "10"))
+        _config_cache['OLLAMA_KEEPALIVE_EXPIRY'] = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+        # Health probe: interval u sekundama i broj uzastopnih grešaka pre izbacivanja servera
+        _config_cache['OLLAMA_HEALTH_INTERVAL'] = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+        _config_cache['OLLAMA_MAX_FAILURES'] = int(os.getenv("OLLAMA_MAX_FAILURES", "1"))
+        # Učitavanje modela duže od ovoga (ms) se u statistici broji kao hladan start
+        _config_cache['OLLAMA_COLD_LOAD_MS'] = int(os.getenv("OLLAMA_COLD_LOAD_MS", "1000"))
+        # Koliko dugo (s) se čuva izračunata administratorska statistika
+        _config_cache['ADMIN_STATS_TTL'] = float(os.getenv("ADMIN_STATS_TTL", "10"))
+        # Ako je uključeno, Chroma i ONNX model se učitavaju pri startu umesto pri prvom zahtevu
+        _config_cache['MEMORY_WARMUP'] = os.getenv("MEMORY_WARMUP", "false").lower() in ("1", "true", "yes")
+        # RAG nad dokumentima: veličina dela i preklapanje (karakteri) i broj delova u promptu
+        _config_cache['DOC_CHUNK_SIZE'] = int(os.getenv("DOC_CHUNK_SIZE", "1000"))
+        _config_cache['DOC_CHUNK_OVERLAP'] = int(os.getenv("DOC_CHUNK_OVERLAP", "150"))
+        _config_cache['DOC_TOP_K'] = int(os.getenv("DOC_TOP_K", "4"))
+        # Budžet tokena za prompt: podrazumevani i po modelu ("model=tokeni,model=tokeni"),
+        # i tokenizer za brojanje, podrazumevani i po modelu ("model=putanja"). Vrednost je putanja do
+        # tokenizer.json modela (ili ime sa Hugging Face Hub-a); prazno = procena ~4 karaktera po tokenu
+        _config_cache['PROMPT_TOKEN_BUDGET'] = int(os.getenv("PROMPT_TOKEN_BUDGET", "3072"))
+        budgets = os.getenv("PROMPT_TOKEN_BUDGETS", "llama3.2:1b=3072,mistral=6144,gemma:2b=6144")
+        _config_cache['PROMPT_TOKEN_BUDGETS'] = {
+            k.strip(): int(v) for k, v in (pair.split("=", 1) for pair in budgets.split(",") if "=" in pair)
+        }
+        _config_cache['TOKENIZER'] = os.getenv("TOKENIZER", "")
+        tokenizers = os.getenv("TOKENIZERS", "")
+        _config_cache['TOKENIZERS'] = {
+            k.strip(): v.strip() for k, v in (pair.split("=", 1) for pair in tokenizers.split(",") if "=" in pair)
+        }
+        # Rolling sažetak četa: sažima se na svakih SUMMARY_EVERY novih poruka, a poslednjih
+        # SUMMARY_RECENT_WINDOW poruka ide u prompt doslovno
+        _config_cache['SUMMARY_EVERY'] = int(os.getenv("SUMMARY_EVERY", "6"))
+        _config_cache['SUMMARY_RECENT_WINDOW'] = int(os.getenv("SUMMARY_RECENT_WINDOW", "4"))
+        # Najviše poruka u jednom pozivu sažimanja, da prompt ostane ograničen i za dug nesažet čet
+        _config_cache['SUMMARY_MAX_MESSAGES'] = int(os.getenv("SUMMARY_MAX_MESSAGES", "24"))
+        # Keš stanja četova (vlasnik + nesažeta istorija): broj četova i vreme neaktivnosti (s); 0 isključuje keš
+        _config_cache['CHAT_CACHE_SIZE'] = int(os.getenv("CHAT_CACHE_SIZE", "1024"))
+        _config_cache['CHAT_CACHE_IDLE_TTL'] = float(os.getenv("CHAT_CACHE_IDLE_TTL", "600"))
+        # Ekstrakcija PDF-a: broj procesa, timeout po dokumentu (s), limit strana i keš teksta na disku
+        _config_cache['PDF_WORKERS'] = int(os.getenv("PDF_WORKERS", "2"))
+        _config_cache['PDF_TIMEOUT'] = float(os.getenv("PDF_TIMEOUT", "30"))
+        _config_cache['PDF_MAX_PAGES'] = int(os.getenv("PDF_MAX_PAGES", "500"))
+        _config_cache['PDF_CACHE_DIR'] = os.getenv("PDF_CACHE_DIR", "./uploads/text_cache")
+        # Pozadinski red memorija: fajl reda, veličina grupe za jedan upis i pauza kada je red prazan
+        _config_cache['MEMORY_QUEUE_PATH'] = os.getenv("MEMORY_QUEUE_PATH", "./memory_queue.db")
+        _config_cache['MEMORY_BATCH_SIZE'] = int(os.getenv("MEMORY_BATCH_SIZE", "32"))
+        _config_cache['MEMORY_POLL_INTERVAL'] = float(os.getenv("MEMORY_POLL_INTERVAL", "1"))
+        # Neuspešan zapis iz reda se ponavlja sa eksponencijalnim odlaganjem (s) i parkira posle N pokušaja
+        _config_cache['MEMORY_MAX_ATTEMPTS'] = int(os.getenv("MEMORY_MAX_ATTEMPTS", "8"))
+        _config_cache['MEMORY_RETRY_BACKOFF'] = float(os.getenv("MEMORY_RETRY_BACKOFF", "5"))
+        # Memorija po korisniku (0) ili po grupi korisnika (user_id % N kolekcija)
+        _config_cache['MEMORY_PARTITION_BUCKETS'] = int(os.getenv("MEMORY_PARTITION_BUCKETS", "0"))
+        # Keš recall-a: trajanje (s) i najveći broj embedding-a/rezultata (0 isključuje keš)
+        _config_cache['RECALL_CACHE_TTL'] = float(os.getenv("RECALL_CACHE_TTL", "300"))
+        _config_cache['RECALL_CACHE_SIZE'] = int(os.getenv("RECALL_CACHE_SIZE", "4096"))
+        # Servis za embedding: najveća grupa tekstova, čekanje na grupu (ms) i ONNX intra-op niti (0 = podrazumevano)
+        _config_cache['EMBED_MAX_BATCH'] = int(os.getenv("EMBED_MAX_BATCH", "32"))
+        _config_cache['EMBED_MAX_WAIT_MS'] = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+        _config_cache['EMBED_THREADS'] = int(os.getenv("EMBED_THREADS", str(min(4, os.cpu_count() or 1))))
+        # Sažimanje memorije: interval u satima (0 = samo ručno), prag kosinusne sličnosti za duplikate,
+        # starost posle koje se brišu memorije razgovora i najveći broj memorija po korisniku
+        _config_cache['MEMORY_COMPACTION_INTERVAL'] = float(os.getenv("MEMORY_COMPACTION_INTERVAL", "0"))
+        _config_cache['MEMORY_DEDUP_SIMILARITY'] = float(os.getenv("MEMORY_DEDUP_SIMILARITY", "0.95"))
+        _config_cache['MEMORY_CONVERSATION_TTL_DAYS'] = float(os.getenv("MEMORY_CONVERSATION_TTL_DAYS", "30"))
+        _config_cache['MEMORY_MAX_PER_USER'] = int(os.getenv("MEMORY_MAX_PER_USER", "2000"))
+        # Najveći broj poslednjih recall-ova koji se pamte u procesu (za sažimanje); najstariji se izbacuju
+        _config_cache['MEMORY_LAST_ACCESS_SIZE'] = int(os.getenv("MEMORY_LAST_ACCESS_SIZE", "100000"))
     return _config_cache
 
 def update_config(key, value):
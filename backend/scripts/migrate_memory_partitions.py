@@ -0,0 +1,36 @@
+"""Prebacuje memorije iz zajedničke Chroma kolekcije user_memory u kolekcije po korisniku.
+
+Pokretanje iz backend/ direktorijuma (aplikacija može da radi za to vreme):
+
+    python scripts/migrate_memory_partitions.py [--batch-size 500] [--drop]
+
+Migracija je idempotentna: prekinuta se može pokrenuti ponovo. --drop briše staru
+kolekciju tek kad su sve memorije prebačene.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.utils.memory import memory_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migracija Chroma memorija u kolekcije po korisniku")
+    parser.add_argument("--path", default=memory_manager.path, help="Chroma direktorijum")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--drop", action="store_true", help="Obriši staru kolekciju posle migracije")
+    args = parser.parse_args()
+
+    memory_manager.path = args.path
+    start = time.perf_counter()
+    result = memory_manager.migrate_legacy(batch_size=args.batch_size, drop=args.drop)
+    elapsed = time.perf_counter() - start
+    print(f"Done: {result['migrated']} memories for {result['users']} users in {elapsed:.1f}s"
+          f"{' (legacy collection dropped)' if result['dropped'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
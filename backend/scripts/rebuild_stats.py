@@ -0,0 +1,31 @@
+"""Ponovo računa zbirne tabele administratorske statistike iz messages/chats.
+
+Migracija koja dodaje tabele ih popunjava sama; skripta se koristi posle ručnih izmena u bazi ili uvoza podataka.
+Pokretanje iz backend/ direktorijuma:
+
+    python scripts/rebuild_stats.py
+
+Radi u jednoj transakciji, pa upisi iz aplikacije koja radi čekaju dok se ne završi.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.database import SessionLocal
+from app.utils.stats_rollup import rebuild
+
+
+def main():
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rows = rebuild(db)
+    finally:
+        db.close()
+    print(f"Done in {time.perf_counter() - start:.2f}s: " + ", ".join(f"{table}={count}" for table, count in rows.items()))
+
+
+if __name__ == "__main__":
+    main()
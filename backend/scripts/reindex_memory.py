@@ -0,0 +1,40 @@
+"""Ponovo gradi Chroma memoriju iz parova poruka (korisnik, asistent) u SQL bazi.
+
+Koristi se posle pada, promene embedding modela ili oštećene kolekcije. Aplikacija treba
+da bude zaustavljena. Pokretanje iz backend/ direktorijuma:
+
+    python scripts/reindex_memory.py [--workers 4] [--batch-size 256] [--chunk-size 4096] [--fresh]
+
+Prekinut reindex se nastavlja od checkpoint-a (osim uz --fresh). Nova generacija kolekcija
+postaje aktivna tek kada su svi parovi upisani.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.database import engine
+from app.utils.memory import memory_manager
+from app.utils.memory_reindex import MemoryReindexer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reindex Chroma memorije iz SQL istorije")
+    parser.add_argument("--path", default=memory_manager.path, help="Chroma direktorijum")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="procesi za embedding")
+    parser.add_argument("--batch-size", type=int, default=256, help="parova po prolazu kroz model")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="parova po čitanju iz baze (i po checkpoint-u)")
+    parser.add_argument("--fresh", action="store_true", help="ignoriši checkpoint i kreni od početka")
+    args = parser.parse_args()
+
+    memory_manager.path = args.path
+    reindexer = MemoryReindexer(memory_manager, engine, workers=args.workers, batch_size=args.batch_size, chunk_size=args.chunk_size)
+    result = reindexer.run(resume=not args.fresh)
+    print(f"Done: {result['pairs']} pairs ({result['stored']} stored) in {result['seconds']}s, "
+          f"{result['pairs_per_second']} pairs/s; active generation {result['prefix']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
 import pytest  # type: ignore
 import uuid
+import json
+import asyncio
+import threading
+from types import SimpleNamespace
 from fastapi.testclient import TestClient
 from app.main import app
+from app.routers import message as message_router
+from app.utils import llm
+from app.utils.document_index import DocumentIndex
+from app.utils.summary import update_chat_summary
+from sqlalchemy import text
+from config import get_config
 
 client = TestClient(app)
 
@@ -37,6 +47,34 @@ def login_user(email: str, password: str):
     return json_data["access_token"]
 
 
+def auth_headers():
+    """Registruje i loguje novog korisnika, vraća Authorization header."""
+    user = create_test_user()
+    token = login_user(user["email"], user["password"])
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Zamenjuje Ollama i memoriju lažnim implementacijama (bez modela i Chrome)."""
+    fake = SimpleNamespace(memories=[], prompts=[], reply="conversation")
+
+    async def fake_stream():
+        for t in ["Zdravo", ", ", "svete"]:
+            yield {"message": {"content": t}}
+
+    async def fake_chat(model, messages, stream=False, **kwargs):
+        fake.prompts.append(messages)
+        if stream:
+            return fake_stream()
+        return {"message": {"content": fake.reply}}
+
+    monkeypatch.setattr(llm, "chat", fake_chat)
+    monkeypatch.setattr(message_router.memory_manager, "recall_memory", lambda *a, **k: [])
+    monkeypatch.setattr(message_router.memory_queue, "enqueue", lambda *a, **k: fake.memories.append(a))
+    return fake
+
+
 # AUTH TESTOVI
 
 def test_register_user_success():
@@ -78,6 +116,27 @@ def test_delete_non_existent_chat():
     assert response.status_code == 404
 
 
+def test_bulk_delete_removes_owned_chats_and_schedules_purge(fake_llm, monkeypatch):
+    from app.routers import chat as chat_router
+
+    purged = []
+    monkeypatch.setattr(chat_router, "_purge_chat_vectors", lambda *args: purged.append(args))
+    headers = auth_headers()
+    own_ids = [client.post("/chat/create", headers=headers).json()["id"] for _ in range(2)]
+    foreign_id = client.post("/chat/create", headers=auth_headers()).json()["id"]
+    client.post("/messages/send", data={"chat_id": own_ids[0], "content": "Pozdrav", "mode_id": 4}, headers=headers)
+
+    response = client.post("/chat/delete-bulk", json={"chat_ids": own_ids + [foreign_id]}, headers=headers)
+
+    assert response.status_code == 200
+    assert sorted(response.json()["deleted"]) == sorted(own_ids)
+    assert response.json()["not_found"] == [foreign_id]
+    assert [sorted(p[1]) for p in purged] == [sorted(own_ids)]
+    for chat_id in own_ids:
+        assert client.get(f"/chat/{chat_id}", headers=headers).status_code == 404
+    assert client.delete(f"/chat/{foreign_id}", headers=headers).status_code == 404
+
+
 # MESSAGES TESTOVI
 
 def test_send_anonymous_message():
@@ -93,6 +152,297 @@ def test_send_anonymous_message():
     assert "content" in json_data
 
 
+def test_send_message_stream(fake_llm):
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+
+    response = client.post(
+        "/messages/send-stream",
+        data={"chat_id": chat_id, "content": "Pozdrav", "mode_id": 4},
+        headers=headers
+    )
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    tokens = [e["content"] for e in events if e["type"] == "token"]
+    assert "".join(tokens) == "Zdravo, svete"
+    assert events[-1]["type"] == "done"
+    assert events[-1]["message"]["content"] == "Zdravo, svete"
+    assert len(fake_llm.memories) == 1
+
+
+def test_send_message_reports_stage_timings_and_metrics(fake_llm):
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+
+    response = client.post(
+        "/messages/send",
+        data={"chat_id": chat_id, "content": "Pozdrav", "mode_id": 4},
+        headers=headers
+    )
+
+    assert response.status_code == 200
+    stages = [part.split(";")[0] for part in response.headers["server-timing"].split(", ")]
+    for name in ("auth", "recall", "history", "pdf", "prompt", "llm", "save", "total"):
+        assert name in stages
+
+    metrics = client.get("/metrics")
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'assistant_stage_duration_seconds_count{stage="llm"}' in metrics.text
+    # Rute se broje po šablonu, ne po konkretnoj putanji
+    assert 'assistant_http_requests_total{method="POST",route="/messages/send",status="200"}' in metrics.text
+    assert 'route="/chat/create"' in metrics.text
+
+
+def test_send_message_to_foreign_chat_is_rejected(fake_llm):
+    owner_headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=owner_headers).json()["id"]
+
+    response = client.post(
+        "/messages/send",
+        data={"chat_id": chat_id, "content": "tudji cet", "mode_id": 4},
+        headers=auth_headers()
+    )
+
+    assert response.status_code == 404
+    assert fake_llm.prompts == []
+
+
+def test_send_message_runs_prepare_stages_concurrently(fake_llm, monkeypatch):
+    # Svaka faza čeka da i druga počne: kod sekvencijalnog izvršavanja čekanje ističe
+    history_started, recall_started = threading.Event(), threading.Event()
+    overlapped = {}
+
+    async def slow_history(*args, **kwargs):
+        history_started.set()
+        for _ in range(200):
+            if recall_started.is_set():
+                break
+            await asyncio.sleep(0.01)
+        overlapped["history"] = recall_started.is_set()
+        return None, [], "You are a helpful AI assistant.", []
+
+    def slow_recall(*args, **kwargs):
+        recall_started.set()
+        overlapped["recall"] = history_started.wait(timeout=2)
+        return []
+
+    monkeypatch.setattr(message_router, "_load_chat_state", slow_history)
+    monkeypatch.setattr(message_router.memory_manager, "recall_memory", slow_recall)
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+
+    response = client.post(
+        "/messages/send-stream",
+        data={"chat_id": chat_id, "content": "Pozdrav", "mode_id": 4},
+        headers=headers
+    )
+
+    assert response.status_code == 200
+    assert overlapped == {"history": True, "recall": True}
+
+
+def test_uploaded_pdf_is_chunked_and_reused_in_chat(fake_llm, monkeypatch, tmp_path):
+    import chromadb  # type: ignore
+
+    def fake_embed(texts):
+        return [[1.0 + t.count("python"), 1.0 + t.count("sqlite"), 1.0] for t in texts]
+
+    chroma = chromadb.PersistentClient(path=str(tmp_path))
+    document = " ".join(["python generators yield values lazily."] * 400 + ["sqlite uses a single writer lock."] * 400)
+    monkeypatch.setattr(message_router, "document_index", DocumentIndex(lambda: chroma, fake_embed))
+    async def fake_extract(content):
+        return document if content else None
+
+    monkeypatch.setattr(message_router, "extract_pdf_text", fake_extract)
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+
+    first = client.post(
+        "/messages/send-stream",
+        data={"chat_id": chat_id, "content": "what about python?", "mode_id": 4},
+        files={"file": ("notes.pdf", b"%PDF-fake", "application/pdf")},
+        headers=headers
+    )
+    second = client.post(
+        "/messages/send-stream",
+        data={"chat_id": chat_id, "content": "and sqlite sqlite?", "mode_id": 4},
+        headers=headers
+    )
+
+    assert first.status_code == 200 and second.status_code == 200
+    first_prompt = fake_llm.prompts[0][0]["content"]
+    second_prompt = fake_llm.prompts[1][0]["content"]
+    assert len(first_prompt) < len(document)
+    assert "python generators" in first_prompt
+    assert "single writer lock" in second_prompt
+
+
+def test_failed_generation_discards_uploaded_document(fake_llm, monkeypatch, tmp_path):
+    import chromadb  # type: ignore
+    from app.database import SessionLocal
+
+    chroma = chromadb.PersistentClient(path=str(tmp_path))
+    monkeypatch.setattr(message_router, "document_index", DocumentIndex(lambda: chroma, lambda texts: [[1.0, 1.0] for _ in texts]))
+    async def fake_extract(content):
+        return "python generators yield values lazily." if content else None
+
+    async def failing_chat(model, messages, stream=False, **kwargs):
+        raise RuntimeError("ollama down")
+
+    monkeypatch.setattr(message_router, "extract_pdf_text", fake_extract)
+    monkeypatch.setattr(llm, "chat", failing_chat)
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+
+    def documents():
+        db = SessionLocal()
+        try:
+            return db.execute(text("SELECT COUNT(*) FROM documents WHERE title = 'orphan.pdf'")).scalar()
+        finally:
+            db.close()
+
+    for route in ("/messages/send", "/messages/send-stream"):
+        client.post(
+            route,
+            data={"chat_id": chat_id, "content": "what about python?", "mode_id": 4},
+            files={"file": ("orphan.pdf", b"%PDF-fake", "application/pdf")},
+            headers=headers
+        )
+        assert documents() == 0
+        assert chroma.list_collections() == []
+
+
+def test_rolling_summary_replaces_old_history(fake_llm, monkeypatch):
+    monkeypatch.setitem(get_config(), "SUMMARY_EVERY", 4)
+    monkeypatch.setitem(get_config(), "SUMMARY_RECENT_WINDOW", 2)
+    # Pozadinsko sažimanje bi se utrkivalo sa eksplicitnim pozivom ispod
+    monkeypatch.setattr(message_router, "schedule_summary_update", lambda chat_id: None)
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+
+    def send(text):
+        response = client.post(
+            "/messages/send-stream",
+            data={"chat_id": chat_id, "content": text, "mode_id": 4},
+            headers=headers
+        )
+        assert response.status_code == 200
+
+    for text in ["prva poruka", "druga poruka", "treca poruka"]:
+        send(text)
+
+    fake_llm.reply = "Korisnik je poslao prvu i drugu poruku."
+    assert asyncio.run(update_chat_summary(chat_id)) is True
+    assert asyncio.run(update_chat_summary(chat_id)) is False
+    summary_prompt = fake_llm.prompts[-1][0]["content"]
+    assert "prva poruka" in summary_prompt and "treca poruka" not in summary_prompt
+
+    fake_llm.prompts.clear()
+    send("cetvrta poruka")
+
+    prompt = fake_llm.prompts[0]
+    assert "Korisnik je poslao prvu i drugu poruku." in prompt[0]["content"]
+    history = [m["content"] for m in prompt[1:-1]]
+    assert "prva poruka" not in history
+    assert "treca poruka" in history
+
+
+def test_long_chat_is_summarized_in_bounded_chunks(fake_llm, monkeypatch):
+    from app.database import SessionLocal
+    from app.models.message import Message
+
+    monkeypatch.setitem(get_config(), "SUMMARY_EVERY", 4)
+    monkeypatch.setitem(get_config(), "SUMMARY_RECENT_WINDOW", 2)
+    monkeypatch.setitem(get_config(), "SUMMARY_MAX_MESSAGES", 5)
+    chat_id = client.post("/chat/create", headers=auth_headers()).json()["id"]
+    db = SessionLocal()
+    try:
+        db.add_all([Message(chat_id=chat_id, content=f"poruka {i}", role="user", mode_id=4) for i in range(14)])
+        db.commit()
+    finally:
+        db.close()
+
+    fake_llm.prompts.clear()
+    runs = 0
+    while asyncio.run(update_chat_summary(chat_id)):
+        runs += 1
+
+    # 12 poruka van prozora: delovi od 5, 5, a ostatak od 2 je ispod SUMMARY_EVERY
+    assert runs == 2
+    chunks = [[line for line in p[0]["content"].splitlines() if line.startswith("user: ")] for p in fake_llm.prompts]
+    assert [len(c) for c in chunks] == [5, 5]
+    assert chunks[0][0] == "user: poruka 0" and chunks[1][0] == "user: poruka 5"
+
+
+def test_rename_chat_returns_summary_without_history(fake_llm):
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+    client.post("/messages/send", data={"chat_id": chat_id, "content": "Pozdrav", "mode_id": 4}, headers=headers)
+
+    renamed = client.patch(f"/chat/{chat_id}", json={"title": "Novi naslov"}, headers=headers)
+
+    assert renamed.status_code == 200
+    body = renamed.json()
+    assert body["title"] == "Novi naslov"
+    assert "messages" not in body
+    assert body["message_count"] == 2 and body["last_message"] == "conversation"
+    assert client.get("/chat/get-all", headers=headers).json()[0]["title"] == "Novi naslov"
+    assert client.patch(f"/chat/{chat_id}", json={"title": "tuđi"}, headers=auth_headers()).status_code == 404
+
+
+def test_chat_history_is_paginated_by_message_id():
+    from app.database import SessionLocal
+    from app.models.message import Message
+
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        db.add_all([Message(chat_id=chat_id, content=f"poruka {i}", role="user", mode_id=4) for i in range(7)])
+        db.commit()
+    finally:
+        db.close()
+
+    latest = client.get(f"/chat/{chat_id}", params={"limit": 3}, headers=headers).json()
+    assert [m["content"] for m in latest["messages"]] == ["poruka 4", "poruka 5", "poruka 6"]
+    assert latest["has_older"] is True and latest["has_newer"] is False
+
+    older = client.get(f"/chat/{chat_id}", params={"limit": 3, "before_id": latest["messages"][0]["id"]}, headers=headers).json()
+    oldest = client.get(f"/chat/{chat_id}", params={"limit": 3, "before_id": older["messages"][0]["id"]}, headers=headers).json()
+    assert [m["content"] for m in older["messages"]] == ["poruka 1", "poruka 2", "poruka 3"]
+    assert [m["content"] for m in oldest["messages"]] == ["poruka 0"]
+    assert oldest["has_older"] is False and oldest["has_newer"] is True
+
+    newer = client.get(f"/chat/{chat_id}", params={"limit": 3, "after_id": older["messages"][-1]["id"]}, headers=headers).json()
+    assert newer["messages"] == latest["messages"]
+    assert newer["has_older"] is True and newer["has_newer"] is False
+
+    response = client.get(f"/chat/{chat_id}", params={"before_id": 1, "after_id": 1}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_chat_list_returns_counts_and_last_message_preview(fake_llm):
+    headers = auth_headers()
+    quiet_id = client.post("/chat/create", headers=headers).json()["id"]
+    busy_id = client.post("/chat/create", headers=headers).json()["id"]
+    since = client.get("/chat/get-all", headers=headers).json()[0]["updated_at"]
+
+    fake_llm.reply = "x" * 500
+    client.post("/messages/send", data={"chat_id": busy_id, "content": "Pozdrav", "mode_id": 4}, headers=headers)
+
+    chats = client.get("/chat/get-all", headers=headers).json()
+    assert [c["id"] for c in chats] == [busy_id, quiet_id]
+    assert "messages" not in chats[0]
+    assert chats[0]["message_count"] == 2
+    assert chats[0]["last_message"] == "x" * 120 + "…"
+    assert chats[1]["message_count"] == 0 and chats[1]["last_message"] is None
+
+    assert [c["id"] for c in client.get("/chat/get-all", params={"limit": 1, "offset": 1}, headers=headers).json()] == [quiet_id]
+    changed = client.get("/chat/get-all", params={"updated_after": since}, headers=headers).json()
+    assert [c["id"] for c in changed] == [busy_id]
+
+
 def test_get_modes():
     response = client.get("/messages/modes")
 
@@ -102,6 +452,105 @@ def test_get_modes():
 
 # ADMIN TESTOVI
 
+def test_generation_stats_are_stored_and_aggregated(fake_llm, monkeypatch):
+    from app.database import SessionLocal
+    from app.models.message import Message
+    from app.routers import admin as admin_router
+
+    async def timed_chat(model, messages, stream=False, **kwargs):
+        return {
+            "message": {"content": "odgovor"},
+            "prompt_eval_count": 120, "eval_count": 40,
+            "total_duration": 3_000_000_000, "load_duration": 1_500_000_000,
+            "prompt_eval_duration": 500_000_000, "eval_duration": 2_000_000_000
+        }
+
+    monkeypatch.setattr(llm, "chat", timed_chat)
+    monkeypatch.setitem(get_config(), "MODEL_NAME", "stats-model")
+    headers = auth_headers()
+    chat_id = client.post("/chat/create", headers=headers).json()["id"]
+    message_id = client.post("/messages/send", data={"chat_id": chat_id, "content": "Pozdrav", "mode_id": 4}, headers=headers).json()["id"]
+
+    db = SessionLocal()
+    try:
+        saved = db.get(Message, message_id)
+        assert (saved.model_name, saved.prompt_tokens, saved.completion_tokens) == ("stats-model", 120, 40)
+        assert (saved.total_duration_ms, saved.load_duration_ms, saved.eval_ms) == (3000, 1500, 2000)
+        assert json.loads(saved.prompt_breakdown)["message"] > 0
+    finally:
+        db.close()
+
+    app.dependency_overrides[admin_router.get_admin_user] = lambda: None
+    admin_router._stats_cache.clear()
+    try:
+        stats = client.get("/admin/stats").json()
+    finally:
+        app.dependency_overrides.clear()
+    model_row = next(r for r in stats["models"][1:] if r[0] == "stats-model")
+    assert model_row[2] == 20.0 and model_row[5] >= 1
+    assert stats["generation_times"][0] == ["Mode", "p50 (s)", "p95 (s)"]
+    assert len(stats["generation_times"]) > 1
+
+
+def test_stats_rollups_follow_inserts_and_deletes(fake_llm):
+    from app.database import SessionLocal
+    from app.models.stats import UserStats
+    from app.utils import stats_rollup
+
+    # Drugi testovi upisuju poruke direktno u bazu, pa se polazi od usklađenih tabela
+    db = SessionLocal()
+    try:
+        stats_rollup.rebuild(db)
+    finally:
+        db.close()
+
+    headers = auth_headers()
+    kept_id = client.post("/chat/create", headers=headers).json()["id"]
+    removed_id = client.post("/chat/create", headers=headers).json()["id"]
+    for chat_id in (kept_id, removed_id, removed_id):
+        client.post("/messages/send", data={"chat_id": chat_id, "content": "Pozdrav", "mode_id": 4}, headers=headers)
+    client.delete(f"/chat/{removed_id}", headers=headers)
+
+    db = SessionLocal()
+    try:
+        user_id = db.execute(text("SELECT user_id FROM chats WHERE id = :id"), {"id": kept_id}).scalar()
+        incremental = db.get(UserStats, user_id)
+        assert (incremental.chat_count, incremental.message_count) == (1, 2)
+        totals = db.execute(text("SELECT SUM(chat_count), SUM(message_count) FROM daily_stats")).one()
+        # Ponovo izračunate tabele moraju da se poklope sa inkrementalno održavanim
+        stats_rollup.rebuild(db)
+        db.expire_all()
+        rebuilt = db.get(UserStats, user_id)
+        assert (rebuilt.chat_count, rebuilt.message_count) == (1, 2)
+        assert db.execute(text("SELECT SUM(chat_count), SUM(message_count) FROM daily_stats")).one() == totals
+    finally:
+        db.close()
+
+
+def test_chat_timestamps_use_database_clock(monkeypatch):
+    import time
+    from app.database import SessionLocal
+
+    # Dnevni zbirovi koriste date() nad UTC vremenom baze; lokalna zona servera ne sme da pomeri dan četa
+    monkeypatch.setenv("TZ", "Pacific/Kiritimati")
+    time.tzset()
+    try:
+        chat_id = client.post("/chat/create", headers=auth_headers()).json()["id"]
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    db = SessionLocal()
+    try:
+        drift = db.execute(
+            text("SELECT ABS(julianday(CURRENT_TIMESTAMP) - julianday(created_at)) * 86400 FROM chats WHERE id = :id"),
+            {"id": chat_id}
+        ).scalar()
+    finally:
+        db.close()
+    assert drift < 60
+
+
 def test_admin_stats_forbidden_for_standard_user():
     user = create_test_user()
     token = login_user(user["email"], user["password"])
@@ -0,0 +1,46 @@
+import time
+from app.utils.chat_cache import ChatState, ChatStateCache
+
+
+def message(i):
+    return {"id": i, "role": "user", "content": f"poruka {i}"}
+
+
+def test_chat_cache_write_through_and_summary():
+    cache = ChatStateCache(max_chats=10, idle_ttl=60, history_limit=3)
+    cache.put(1, ChatState(user_id=7, history=[message(1), message(2)]))
+
+    cache.append(1, [message(3), message(4)])
+    cache.apply_summary(1, "sažetak", 3)
+    state = cache.get(1)
+
+    assert state.user_id == 7
+    assert [m["id"] for m in state.history] == [4]
+    assert state.summary == "sažetak"
+    assert cache.get(2) is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_chat_cache_evicts_by_size_and_idle_time():
+    cache = ChatStateCache(max_chats=2, idle_ttl=0.05, history_limit=5)
+    for chat_id in (1, 2, 3):
+        cache.put(chat_id, ChatState(user_id=1))
+
+    assert cache.get(1) is None
+    assert cache.get_stats()["evicted_size"] == 1
+
+    time.sleep(0.1)
+    assert cache.get(2) is None
+    assert cache.get_stats()["evicted_idle"] == 1
+
+
+def test_chat_cache_invalidate_user():
+    cache = ChatStateCache(max_chats=10, idle_ttl=60, history_limit=5)
+    cache.put(1, ChatState(user_id=1))
+    cache.put(2, ChatState(user_id=2))
+
+    cache.invalidate_user(1)
+
+    assert cache.get(1) is None
+    assert cache.get(2) is not None
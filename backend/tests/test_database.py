@@ -0,0 +1,61 @@
+import asyncio
+from sqlalchemy import text
+from app.database import engine, async_engine
+from config import get_config
+
+
+def test_sqlite_pragmas_are_applied_on_connect():
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == get_config()['SQLITE_BUSY_TIMEOUT_MS']
+
+
+def test_async_engine_uses_same_pragmas():
+    async def read_pragmas():
+        async with async_engine.connect() as conn:
+            mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+            timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+        await async_engine.dispose()
+        return mode, timeout
+
+    assert asyncio.run(read_pragmas()) == ("wal", get_config()['SQLITE_BUSY_TIMEOUT_MS'])
+
+
+def test_write_queue_commits_concurrent_writes_in_groups(tmp_path):
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.models.mode import Mode
+    from app.utils.write_queue import WriteQueue
+
+    def insert_mode(name):
+        async def job(session):
+            mode = Mode(name=name)
+            session.add(mode)
+            await session.flush()
+            return mode.id
+        return job
+
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'writes.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Mode.__table__.create)
+        queue = WriteQueue(async_sessionmaker(engine, expire_on_commit=False), window_ms=20)
+        queue.start()
+        ids = await asyncio.gather(*(queue.submit(insert_mode(f"mode-{i}")) for i in range(20)))
+        # Duplikat obara samo svoj upis, ostatak grupe se potvrđuje
+        mixed = await asyncio.gather(queue.submit(insert_mode("mode-0")), queue.submit(insert_mode("new")), return_exceptions=True)
+        stats = queue.get_stats()
+        await queue.stop()
+        async with engine.connect() as conn:
+            count = (await conn.execute(text("SELECT COUNT(*) FROM modes"))).scalar()
+        await engine.dispose()
+        return ids, mixed, stats, count
+
+    ids, mixed, stats, count = asyncio.run(scenario())
+
+    assert len(set(ids)) == 20
+    assert isinstance(mixed[0], IntegrityError) and isinstance(mixed[1], int)
+    assert count == 21
+    assert stats["batches"] == 2
+    assert stats["replayed_batches"] == 1 and stats["failed_writes"] == 1
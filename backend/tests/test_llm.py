@@ -0,0 +1,219 @@
+import asyncio
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest  # type: ignore
+from app.utils import llm
+from config import get_config
+
+
+# Trajanja (ns) koja Ollama šalje u poslednjem delu odgovora
+DURATIONS = {"total_duration": 2_000_000_000, "load_duration": 500_000_000, "prompt_eval_duration": 300_000_000, "eval_duration": 1_000_000_000}
+
+
+class FakeOllama:
+    """Minimalni lažni Ollama HTTP server (/api/tags i /api/chat) za testiranje pool-a."""
+
+    def __init__(self, name):
+        self.name = name
+        self.up = True
+        self.chat_calls = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if not fake.up:
+                    return self._send(503, b'{"error": "down"}')
+                self._send(200, b'{"models": []}')
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.chat_calls += 1
+                if request.get("stream"):
+                    lines = [
+                        {"model": request["model"], "message": {"role": "assistant", "content": t}, "done": False}
+                        for t in [fake.name, "!"]
+                    ]
+                    lines.append({"model": request["model"], "message": {"role": "assistant", "content": ""}, "done": True, **DURATIONS})
+                    body = "".join(json.dumps(l) + "\n" for l in lines).encode()
+                    return self._send(200, body, "application/x-ndjson")
+                body = {"model": request["model"], "message": {"role": "assistant", "content": fake.name}, "done": True, **DURATIONS}
+                self._send(200, json.dumps(body).encode())
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_servers():
+    servers = [FakeOllama("a"), FakeOllama("b")]
+    yield servers
+    for s in servers:
+        s.stop()
+
+
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def run_with_pool(urls, scenario):
+    async def wrapper():
+        pool = llm.BackendPool(urls)
+        try:
+            return await scenario(pool)
+        finally:
+            await pool.close()
+    return asyncio.run(wrapper())
+
+
+def test_backend_client_uses_configured_timeouts():
+    async def scenario(pool):
+        return pool.backends[0].get_client()._client.timeout
+
+    timeout = run_with_pool(["http://127.0.0.1:1"], scenario)
+
+    assert timeout.read == get_config()['OLLAMA_TIMEOUT']
+    assert timeout.connect == get_config()['OLLAMA_CONNECT_TIMEOUT']
+
+
+def test_backend_owns_connection_pool_and_closes_it():
+    async def scenario(pool):
+        backend = pool.backends[0]
+        backend.get_client()
+        transport = backend._transport
+        await backend.close()
+        return transport._pool._max_connections, transport._pool._max_keepalive_connections, backend._client
+
+    max_connections, max_keepalive, client = run_with_pool(["http://127.0.0.1:1"], scenario)
+
+    assert max_connections == get_config()['OLLAMA_MAX_CONNECTIONS']
+    assert max_keepalive == get_config()['OLLAMA_MAX_KEEPALIVE']
+    assert client is None
+
+
+def test_pool_routes_to_least_outstanding(fake_servers):
+    a, b = fake_servers
+
+    async def scenario(pool):
+        pool.backends[0].in_flight = 3
+        response = await pool.chat("model", [{"role": "user", "content": "hi"}])
+        return response["message"]["content"]
+
+    assert run_with_pool([a.url, b.url], scenario) == "b"
+    assert a.chat_calls == 0
+
+
+def test_pool_ejects_dead_backend_and_fails_over(fake_servers):
+    a, _ = fake_servers
+    dead = unused_url()
+
+    async def scenario(pool):
+        answers = [(await pool.chat("model", []))["message"]["content"] for _ in range(3)]
+        return answers, pool.backends[0].healthy
+
+    answers, dead_healthy = run_with_pool([dead, a.url], scenario)
+
+    assert answers == ["a", "a", "a"]
+    assert dead_healthy is False
+
+
+def test_health_probe_readmits_recovered_backend(fake_servers):
+    a, b = fake_servers
+
+    async def scenario(pool):
+        a.up = False
+        await pool.probe_all()
+        ejected = [x.healthy for x in pool.backends]
+        picked_while_down = pool.acquire().url
+        a.up = True
+        await pool.probe_all()
+        return ejected, picked_while_down, [x.healthy for x in pool.backends]
+
+    ejected, picked, readmitted = run_with_pool([a.url, b.url], scenario)
+
+    assert ejected == [False, True]
+    assert picked == b.url
+    assert readmitted == [True, True]
+
+
+def test_pool_streams_tokens(fake_servers):
+    a, _ = fake_servers
+
+    async def scenario(pool):
+        tokens = [chunk["message"]["content"] async for chunk in await pool.chat("model", [], stream=True)]
+        return tokens, pool.backends[0].in_flight
+
+    tokens, in_flight = run_with_pool([a.url], scenario)
+
+    assert "".join(tokens) == "a!"
+    assert in_flight == 0
+
+
+def test_pool_records_ollama_durations(fake_servers):
+    from app.utils.metrics import OLLAMA_SECONDS, registry
+    a, _ = fake_servers
+    before = [OLLAMA_SECONDS.count(model="timed", phase=p) for p in ("eval", "load")]
+
+    async def scenario(pool):
+        await pool.chat("timed", [])
+        return [chunk async for chunk in await pool.chat("timed", [], stream=True)]
+
+    run_with_pool([a.url], scenario)
+
+    assert [OLLAMA_SECONDS.count(model="timed", phase=p) for p in ("eval", "load")] == [before[0] + 2, before[1] + 2]
+    assert 'assistant_ollama_duration_seconds_sum{model="timed",phase="eval"} 2.0' in registry.render()
+
+
+def test_client_for_new_event_loop_closes_previous_transport():
+    backend = llm.OllamaBackend("http://127.0.0.1:1")
+    old_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=old_loop.run_forever, daemon=True)
+    thread.start()
+    closed = threading.Event()
+
+    async def first_client():
+        backend.get_client()
+        old_transport = backend._transport
+        async def recording_aclose():
+            closed.set()
+        old_transport.aclose = recording_aclose
+
+    try:
+        asyncio.run_coroutine_threadsafe(first_client(), old_loop).result(timeout=5)
+
+        async def second_client():
+            backend.get_client()
+            transport = backend._transport
+            await backend.close()
+            return transport
+
+        assert asyncio.run(second_client()) is not None
+        assert closed.wait(timeout=5)
+    finally:
+        old_loop.call_soon_threadsafe(old_loop.stop)
+        thread.join(timeout=5)
+        old_loop.close()
+
+
+def test_pool_without_backends_raises_clear_error():
+    with pytest.raises(RuntimeError, match="No Ollama backend"):
+        asyncio.run(llm.BackendPool([]).chat("model", []))
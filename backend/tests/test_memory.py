@@ -0,0 +1,462 @@
+import asyncio
+import os
+import pytest  # type: ignore
+import subprocess
+import sys
+from pathlib import Path
+from app.utils.memory_queue import MemoryQueue
+from app.utils.scope_classifier import ScopeClassifier
+from app.utils.document_index import chunk_text
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+class RecordingManager:
+    def __init__(self, fail=False, poison=None):
+        self.batches = []
+        self.fail = fail
+        self.poison = poison
+
+    def add_memories(self, items):
+        if self.fail:
+            raise RuntimeError("chroma down")
+        if any(item["text"] == self.poison for item in items):
+            raise ValueError("bad item")
+        self.batches.append(items)
+
+
+async def classify_stub(text):
+    return "ignore" if text == "hvala" else "conversation"
+
+
+def test_memory_queue_batches_pending_items(tmp_path):
+    queue = MemoryQueue(str(tmp_path / "queue.db"))
+    queue.enqueue(1, 10, "sta je python", "jezik")
+    queue.enqueue(1, 10, "hvala", "nema na cemu")
+    manager = RecordingManager()
+
+    processed = asyncio.run(queue.process_batch(10, classify_stub, manager))
+
+    assert processed == 2
+    assert len(manager.batches) == 1
+    assert [item["scope"] for item in manager.batches[0]] == ["conversation", "ignore"]
+    assert queue.stats()["depth"] == 0
+
+
+def test_memory_queue_survives_restart_and_failed_write(tmp_path):
+    path = str(tmp_path / "queue.db")
+    MemoryQueue(path).enqueue(2, 20, "moje ime je Ana", "Zdravo Ana")
+
+    restarted = MemoryQueue(path, retry_backoff=0)
+    asyncio.run(restarted.process_batch(10, classify_stub, RecordingManager(fail=True)))
+
+    stats = restarted.stats()
+    assert stats["depth"] == 1
+    assert stats["retrying"] == 1
+    assert stats["lag_seconds"] >= 0
+
+    manager = RecordingManager()
+    assert asyncio.run(restarted.process_batch(10, classify_stub, manager)) == 1
+    assert manager.batches[0][0]["text"] == "moje ime je Ana"
+    assert restarted.stats()["depth"] == 0
+
+
+def test_memory_queue_isolates_and_parks_failing_item(tmp_path):
+    path = tmp_path / "queue.db"
+    queue = MemoryQueue(str(path), max_attempts=3, retry_backoff=0)
+    assert not path.exists()
+
+    queue.enqueue(3, 30, "dobar", "ok")
+    queue.enqueue(3, 30, "los", "ok")
+    queue.enqueue(3, 30, "takodje dobar", "ok")
+    manager = RecordingManager(poison="los")
+
+    asyncio.run(queue.process_batch(10, classify_stub, manager))
+    assert [item["text"] for batch in manager.batches for item in batch] == ["dobar", "takodje dobar"]
+    assert queue.stats()["depth"] == 1
+
+    for _ in range(2):
+        asyncio.run(queue.process_batch(10, classify_stub, manager))
+    stats = queue.stats()
+    assert stats["depth"] == 0
+    assert stats["parked"] == 1
+    assert "bad item" in stats["last_parked_error"]
+    assert asyncio.run(queue.process_batch(10, classify_stub, manager)) == 0
+
+    assert queue.requeue_parked() == 1
+    assert queue.stats()["depth"] == 1
+
+
+def test_memory_queue_reuses_one_connection(tmp_path):
+    queue = MemoryQueue(str(tmp_path / "queue.db"))
+    queue.enqueue(5, 50, "pitanje", "odgovor")
+    open_files = len(os.listdir("/proc/self/fd"))
+
+    for _ in range(50):
+        queue.stats()
+        queue.release([item["id"] for item in queue.claim(10)])
+    assert len(os.listdir("/proc/self/fd")) == open_files
+
+    queue.close()
+    assert len(os.listdir("/proc/self/fd")) < open_files
+    assert queue.stats()["depth"] == 1
+
+
+def test_memory_queue_backs_off_after_failure(tmp_path):
+    queue = MemoryQueue(str(tmp_path / "queue.db"), retry_backoff=60)
+    queue.enqueue(4, 40, "pitanje", "odgovor")
+    asyncio.run(queue.process_batch(10, classify_stub, RecordingManager(fail=True)))
+
+    manager = RecordingManager()
+    assert asyncio.run(queue.process_batch(10, classify_stub, manager)) == 0
+    assert manager.batches == []
+
+
+def fake_embed(texts):
+    # Osa 0: lični podaci, osa 1: tehnička pitanja, osa 2: small talk
+    vectors = []
+    for t in texts:
+        t = t.lower()
+        vectors.append([
+            1.0 + t.count("i ") + t.count("my "),
+            1.0 + t.count("?") * 3 + t.count("python"),
+            1.0 + t.count("thank") * 3 + t.count("bye") * 3 + t.count("hi") + t.count("hello")
+        ])
+    return vectors
+
+
+def test_scope_classifier_tiers_and_cache():
+    llm_calls = []
+
+    async def llm_stub(text):
+        llm_calls.append(text)
+        return "conversation"
+
+    classifier = ScopeClassifier(fake_embed, llm_stub, margin=0.01)
+
+    async def scenario():
+        return [
+            await classifier.classify("Hvala!"),
+            await classifier.classify("My name is Ana"),
+            await classifier.classify("How do I sort a dict in python?"),
+            await classifier.classify("how do I sort a dict in Python"),
+        ]
+
+    scopes = asyncio.run(scenario())
+    stats = classifier.get_stats()
+
+    assert scopes == ["ignore", "global", "conversation", "conversation"]
+    assert stats["rules"]["hits"] == 2
+    assert stats["embedding"]["hits"] == 1
+    assert stats["cache"]["hits"] == 1
+    assert llm_calls == []
+
+
+def test_scope_classifier_falls_back_to_llm_when_unsure():
+    async def llm_stub(text):
+        return "global"
+
+    classifier = ScopeClassifier(lambda texts: [[1.0, 1.0, 1.0] for _ in texts], llm_stub)
+
+    assert asyncio.run(classifier.classify("something ambiguous")) == "global"
+    assert classifier.get_stats()["llm"]["hits"] == 1
+
+
+def test_app_import_does_not_load_chroma():
+    code = "import sys, app.main; assert 'chromadb' not in sys.modules"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_chunk_text_respects_size_and_overlap():
+    text = " ".join(f"word{i}" for i in range(400))
+
+    chunks = chunk_text(text, 200, 40)
+
+    assert all(len(c) <= 200 for c in chunks)
+    assert chunks[0].split()[0] == "word0"
+    assert chunks[-1].split()[-1] == "word399"
+    assert chunks[1].split()[0] in chunks[0]
+
+
+class _FakeEmbedding:
+    """Deterministički embedding za testove (ONNX model nije dostupan bez mreže)."""
+
+    def __call__(self, input):
+        return [[float(len(text)), 1.0] for text in input]
+
+    def embed_query(self, input):
+        return self(input)
+
+    @staticmethod
+    def name():
+        return "fake"
+
+    def is_legacy(self):
+        return False
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return _FakeEmbedding()
+
+
+def test_memories_are_partitioned_per_user(tmp_path):
+    from app.utils.memory import MemoryManager
+
+    manager = MemoryManager(str(tmp_path), buckets=0, embedding_function=_FakeEmbedding())
+    manager.add_memories([
+        {"user_id": 1, "chat_id": 10, "text": "moje ime je Ana", "answer": "ok", "scope": "global"},
+        {"user_id": 2, "chat_id": 20, "text": "koristim FastAPI", "answer": "ok", "scope": "conversation"},
+        {"user_id": 2, "chat_id": 20, "text": "zdravo", "answer": "ok", "scope": "ignore"}
+    ])
+
+    assert manager.collection_for(1).count() == 1 and manager.collection_for(2).count() == 1
+    assert manager.recall_memory(1, 99, "ime") == ["User asked: moje ime je Ana\nAssistant answered: ok"]
+    assert manager.recall_memory(3, 30, "ime") == []
+    assert MemoryManager(str(tmp_path), buckets=4).collection_name(6) == "user_memory_b2"
+
+
+def test_legacy_collection_migrates_with_existing_embeddings(tmp_path):
+    from app.utils.memory import MemoryManager, LEGACY_COLLECTION
+
+    manager = MemoryManager(str(tmp_path), buckets=0, embedding_function=_FakeEmbedding())
+    legacy = manager.client.create_collection(LEGACY_COLLECTION, embedding_function=None)
+    legacy.add(
+        ids=["a", "b", "c"],
+        documents=["prva", "druga", "treca"],
+        embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+        metadatas=[{"user_id": u, "chat_id": 1, "memory_scope": "global"} for u in (1, 1, 2)]
+    )
+
+    assert manager.migrate_legacy(batch_size=2) == {"migrated": 3, "users": 2, "dropped": False}
+    # Ponovno pokretanje ne pravi duplikate
+    assert manager.migrate_legacy(batch_size=2, drop=True)["migrated"] == 3
+    assert sorted(manager.collection_for(1).get()["ids"]) == ["a", "b"]
+    assert manager.collection_for(2).get(include=["embeddings"])["embeddings"][0].tolist() == [1.0, 1.0]
+    assert LEGACY_COLLECTION not in [c.name for c in manager.client.list_collections()]
+
+
+def test_delete_chat_memories_keeps_global_and_other_chats(tmp_path):
+    from app.utils.memory import MemoryManager
+
+    manager = MemoryManager(str(tmp_path), buckets=1, embedding_function=_FakeEmbedding())
+    rows = [(1, 10, "conversation"), (1, 10, "global"), (1, 11, "conversation"), (2, 10, "conversation")]
+    manager.collection_for(1).add(
+        ids=[str(i) for i in range(len(rows))],
+        embeddings=[[float(i), 1.0] for i in range(len(rows))],
+        metadatas=[{"user_id": u, "chat_id": c, "memory_scope": s} for u, c, s in rows]
+    )
+
+    manager.delete_chat_memories(1, [10], batch_size=1)
+
+    assert sorted(manager.collection_for(1).get()["ids"]) == ["1", "2", "3"]
+    manager.delete_user_memories(1)
+    assert manager.collection_for(1).get()["ids"] == ["3"]
+
+
+def test_deleting_memories_does_not_create_collections(tmp_path):
+    from app.utils.memory import MemoryManager
+
+    for buckets in (0, 4):
+        manager = MemoryManager(str(tmp_path / str(buckets)), buckets=buckets, embedding_function=_FakeEmbedding())
+        manager.delete_chat_memories(7, [70, 71])
+        manager.delete_user_memories(7)
+        assert manager.partition_names(manager.prefix) == []
+
+
+def test_compaction_compares_against_every_kept_memory(tmp_path):
+    import math
+    from datetime import datetime, timedelta
+    from app.utils.memory import MemoryManager
+    from app.utils.memory_compaction import MemoryCompactor
+
+    # Više memorija nego početni kapacitet matrice; najstarija ponavlja najnoviju
+    manager = MemoryManager(str(tmp_path), buckets=0, embedding_function=_FakeEmbedding())
+    now = datetime.now()
+    count = 150
+    angles = [i * math.pi / (2 * count) for i in range(count)] + [0.0]
+    manager.collection_for(1).add(
+        ids=[str(i) for i in range(len(angles))],
+        documents=[str(i) for i in range(len(angles))],
+        embeddings=[[math.cos(a), math.sin(a)] for a in angles],
+        metadatas=[{"user_id": 1, "chat_id": 10, "memory_scope": "global", "timestamp": (now - timedelta(minutes=i)).isoformat()} for i in range(len(angles))]
+    )
+
+    report = MemoryCompactor(manager, similarity=0.99999, ttl_days=30, max_per_user=1000).compact()
+
+    assert report["merged"] == 1
+    assert str(count) not in manager.collection_for(1).get()["ids"]
+
+
+def test_compaction_merges_duplicates_expires_and_bounds_store(tmp_path):
+    import time
+    from datetime import datetime, timedelta
+    from app.utils.memory import MemoryManager
+    from app.utils.memory_compaction import MemoryCompactor
+
+    manager = MemoryManager(str(tmp_path), buckets=0, embedding_function=_FakeEmbedding())
+    now = datetime.now()
+    rows = [
+        ("a", "global", 10, [1.0, 0.0], 1),
+        ("b", "global", 10, [1.0, 0.01], 0),         # novija kopija "a"
+        ("c", "conversation", 10, [0.99, 0.0], 2),   # ponavlja globalnu memoriju
+        ("d", "conversation", 10, [0.0, 1.0], 60),   # istekla
+        ("e", "conversation", 11, [0.0, 1.0], 60),   # stara, ali nedavno vraćena recall-om
+        ("f", "conversation", 11, [1.0, -1.0], 5)    # najduže bez pristupa, preko limita
+    ]
+    manager.collection_for(1).add(
+        ids=[r[0] for r in rows],
+        documents=[r[0] for r in rows],
+        embeddings=[r[3] for r in rows],
+        metadatas=[{"user_id": 1, "chat_id": r[2], "memory_scope": r[1], "timestamp": (now - timedelta(days=r[4])).isoformat()} for r in rows]
+    )
+    manager.last_access["e"] = time.time()
+
+    report = MemoryCompactor(manager, similarity=0.95, ttl_days=30, max_per_user=2).compact()
+
+    assert (report["merged"], report["expired"], report["evicted"], report["remaining"]) == (2, 1, 1, 2)
+    assert report["reclaimed"] == 4
+    data = manager.collection_for(1).get(include=["metadatas"])
+    metadata = dict(zip(data["ids"], data["metadatas"]))
+    assert sorted(metadata) == ["b", "e"]
+    assert metadata["b"]["merged_count"] == 3
+    # Vreme pristupa je upisano u metapodatke i preživljava restart
+    assert metadata["e"]["last_accessed"] > 0 and "e" not in manager.last_access
+
+
+def test_recall_cache_reuses_embeddings_and_invalidates_by_scope(tmp_path):
+    from app.utils.memory import MemoryManager
+    from app.utils.recall_cache import RecallCache
+
+    embedding = _FakeEmbedding()
+    manager = MemoryManager(str(tmp_path), buckets=0, embedding_function=embedding, recall_cache=RecallCache(ttl=60, max_entries=100))
+    embedded = []
+    manager._embed_query = lambda query: embedded.append(query) or embedding([query])[0]
+    manager.add_memory(1, 10, "projekat je u FastAPI", "ok", "conversation")
+
+    first = manager.recall_memory(1, 10, "Koji framework?")
+    assert manager.recall_memory(1, 10, "  koji FRAMEWORK ") == first
+    assert manager.recall_memory(1, 11, "koji framework") == []
+    assert embedded == ["Koji framework?"]
+
+    # Memorija drugog četa ne dira keširan rezultat četa 10, globalna briše sve
+    manager.add_memory(1, 11, "drugi čet", "ok", "conversation")
+    assert manager.recall_cache.get_results(1, 10, manager.recall_cache.query_key("koji framework"), 2) == first
+    assert manager.recall_cache.get_results(1, 11, manager.recall_cache.query_key("koji framework"), 2) is None
+    manager.add_memory(1, 12, "zovem se Ana", "ok", "global")
+    assert len(manager.recall_memory(1, 10, "koji framework")) == 2
+
+    stats = manager.recall_cache.get_stats()
+    assert stats["result_hits"] == 2 and stats["embedding_hits"] == 2 and stats["embedding_misses"] == 1
+    assert 0 < stats["result_hit_rate"] < 1
+
+
+def test_recall_access_times_are_bounded(tmp_path):
+    from app.utils.memory import MemoryManager
+    from app.utils.recall_cache import RecallCache
+
+    manager = MemoryManager(str(tmp_path), buckets=0, embedding_function=_FakeEmbedding(), recall_cache=RecallCache(ttl=60, max_entries=0))
+    manager.last_access_size = 2
+    for chat_id in (10, 11, 12):
+        manager.add_memory(1, chat_id, f"memorija {chat_id}", "ok", "conversation")
+
+    for chat_id in (10, 11, 10, 12):
+        assert len(manager.recall_memory(1, chat_id, "memorija")) == 1
+
+    # Čet 11 je najduže bez recall-a, pa je izbačen prvi
+    assert len(manager.last_access) == 2
+    recalled = manager.client.get_collection(name=manager.partition_names(manager.prefix)[0]).get(ids=list(manager.last_access))
+    assert sorted(m["chat_id"] for m in recalled["metadatas"]) == [10, 12]
+
+
+def test_embedding_service_batches_concurrent_requests():
+    from concurrent.futures import ThreadPoolExecutor
+    from app.utils.embedding_service import EmbeddingService
+
+    calls = []
+
+    def fake_model(texts):
+        calls.append(len(texts))
+        return [[float(len(t))] for t in texts]
+
+    service = EmbeddingService(lambda: fake_model, max_batch=32, max_wait_ms=100)
+    texts = [["a" * i] * (1 + i % 2) for i in range(1, 9)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(service.embed, texts))
+    service.shutdown()
+
+    assert results == [[[float(len(t))] for t in request] for request in texts]
+    assert sum(calls) == 12 and len(calls) < 8
+    assert service.get_stats()["requests"] == 8
+
+
+def test_embedding_service_reports_model_errors_to_callers():
+    from app.utils.embedding_service import EmbeddingService
+
+    def broken_factory():
+        raise RuntimeError("model unavailable")
+
+    service = EmbeddingService(broken_factory, max_wait_ms=1)
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        service.embed(["x"])
+    service.shutdown()
+
+
+def test_reindex_rebuilds_memory_from_sql_and_resumes(tmp_path):
+    from sqlalchemy import create_engine
+    from app.database import Base
+    from app.models import user, userRole, chat, message, mode, document  # noqa: F401
+    from app.models.chat import Chat
+    from app.models.message import Message
+    from app.utils.memory import MemoryManager
+    from app.utils.memory_reindex import MemoryReindexer, CHECKPOINT_FILE
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Chat.__table__.insert(), [{"id": 1, "user_id": 7, "title": "a"}, {"id": 2, "user_id": 8, "title": "b"}])
+        conn.execute(Message.__table__.insert(), [
+            {"id": 1, "chat_id": 1, "role": "user", "content": "koristim FastAPI i SQLite"},
+            {"id": 2, "chat_id": 2, "role": "user", "content": "moje ime je Ana"},
+            {"id": 3, "chat_id": 1, "role": "assistant", "content": "ok"},
+            {"id": 4, "chat_id": 2, "role": "assistant", "content": "zdravo Ana"},
+            {"id": 5, "chat_id": 1, "role": "user", "content": "hvala"},
+            {"id": 6, "chat_id": 1, "role": "assistant", "content": "nema na čemu"},
+            {"id": 7, "chat_id": 1, "role": "user", "content": "bez odgovora"}
+        ])
+
+    path = str(tmp_path / "chroma")
+    manager = MemoryManager(path, buckets=0, embedding_function=_FakeEmbedding())
+    manager.add_memory(7, 1, "stara", "memorija", "conversation")
+    old_collection = manager.collection_name(7)
+
+    reindexer = MemoryReindexer(manager, engine, workers=0, batch_size=1, chunk_size=1, embed_fn=_FakeEmbedding())
+    write = reindexer._write
+    calls = []
+
+    def crash_on_second_chunk(staging, records):
+        calls.append(records)
+        if len(calls) == 2:
+            raise RuntimeError("crash")
+        write(staging, records)
+
+    reindexer._write = crash_on_second_chunk
+    with pytest.raises(RuntimeError):
+        reindexer.run()
+    # Prekinut reindex ne dira aktivnu generaciju
+    assert manager.prefix == "user_memory" and manager.collection_for(7).count() == 1
+
+    reindexer._write = write
+    result = reindexer.run()
+
+    assert result["prefix"].startswith("user_memory_r") and result["pairs"] == 3
+    assert not os.path.exists(os.path.join(path, CHECKPOINT_FILE))
+    assert old_collection not in [c.name for c in manager.client.list_collections()]
+    # "hvala" je small talk i ne upisuje se; "moje ime je" je globalna memorija
+    assert manager.collection_for(7).get()["ids"] == ["m1"]
+    assert manager.collection_for(8).get()["metadatas"][0]["memory_scope"] == "global"
+    assert MemoryManager(path).prefix == result["prefix"]
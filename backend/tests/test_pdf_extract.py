@@ -0,0 +1,86 @@
+import asyncio
+import io
+import os
+import time
+import PyPDF2 # type: ignore
+from app.utils import pdf_extract
+from app.utils.pdf_extract import PdfExtractor
+
+
+def blank_pdf(pages: int) -> bytes:
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_pdf_extraction_is_cached_and_page_limited(tmp_path):
+    extractor = PdfExtractor(str(tmp_path), workers=1, timeout=30, max_pages=2)
+    content = blank_pdf(5)
+
+    async def scenario():
+        first = await extractor.extract(content)
+        second = await extractor.extract(content)
+        return first, second
+
+    try:
+        first, second = asyncio.run(scenario())
+    finally:
+        extractor.shutdown()
+
+    stats = extractor.get_stats()
+    assert first == second == ""
+    assert stats["documents"] == 1
+    assert stats["pages"] == 2
+    assert stats["cache_hits"] == 1
+    assert stats["bytes"] == len(content)
+    assert len(list(tmp_path.glob("*.txt"))) == 1
+
+
+def test_invalid_pdf_returns_none(tmp_path):
+    extractor = PdfExtractor(str(tmp_path), workers=1, timeout=30, max_pages=10)
+
+    try:
+        assert asyncio.run(extractor.extract(b"not a pdf")) is None
+    finally:
+        extractor.shutdown()
+
+    assert extractor.get_stats()["errors"] == 1
+
+
+def _extract_or_hang(pdf_content, max_pages):
+    """Zamena za _extract_pages (izvršava se u procesu pool-a): b"hang" se nikad ne završava, a
+    "healthy:<putanja>" u prvom pokušaju ostavlja fajl i čeka, pa radi tek kad se pošalje ponovo."""
+    if pdf_content.startswith(b"healthy:"):
+        marker = pdf_content.split(b":", 1)[1].decode()
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            time.sleep(60)
+        return "healthy", 1
+    time.sleep(60)
+
+
+def test_timeout_does_not_drop_concurrent_extraction(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_extract, "_extract_pages", _extract_or_hang)
+    extractor = PdfExtractor(str(tmp_path), workers=2, timeout=4, max_pages=10)
+    marker = tmp_path / "healthy.marker"
+
+    async def healthy():
+        # Kreće posle zaglavljenog dokumenta, pa je u toku kada njemu istekne timeout
+        await asyncio.sleep(1.5)
+        return await extractor.extract(b"healthy:" + str(marker).encode())
+
+    async def scenario():
+        return await asyncio.gather(extractor.extract(b"hang"), healthy())
+
+    try:
+        hung, text = asyncio.run(scenario())
+    finally:
+        extractor.shutdown()
+
+    stats = extractor.get_stats()
+    assert marker.exists()
+    assert hung is None and text == "healthy"
+    assert stats["timeouts"] == 1 and stats["resubmitted"] == 1 and stats["errors"] == 0
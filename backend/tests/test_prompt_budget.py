@@ -0,0 +1,82 @@
+from tokenizers import Tokenizer # type: ignore
+from tokenizers.models import WordLevel # type: ignore
+from tokenizers.pre_tokenizers import Whitespace # type: ignore
+from app.utils.prompt_budget import TokenCounter, PromptBudget, PromptSection, MESSAGE_OVERHEAD
+
+
+class WordCounter:
+    """Jedan token po reči - dovoljno za proveru raspodele budžeta."""
+
+    def count(self, text):
+        return len(text.split())
+
+    def truncate(self, text, max_tokens):
+        return " ".join(text.split()[:max_tokens])
+
+
+def words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_budget_drops_lowest_priority_sections_first():
+    sections = [
+        PromptSection("instructions", [words(50)], required=True),
+        PromptSection("memory", [words(100, "m"), words(100, "n")], priority=1),
+        PromptSection("history", [words(100, "old"), words(100, "new")], priority=2, drop_from="start"),
+        PromptSection("document", [words(100, "d")], priority=3),
+        PromptSection("message", [words(20)], required=True)
+    ]
+
+    breakdown = PromptBudget(WordCounter(), 300).fit(sections)
+
+    assert breakdown["total"] <= 300
+    assert sections[1].items == []
+    assert sections[2].items == [words(100, "new")]
+    assert sections[3].items == [words(100, "d")]
+    assert breakdown["instructions"] == 50 + MESSAGE_OVERHEAD
+    assert breakdown["message"] == 20 + MESSAGE_OVERHEAD
+
+
+def test_budget_keeps_everything_when_it_fits():
+    sections = [PromptSection("memory", ["a b c"], priority=1), PromptSection("message", ["d"], required=True)]
+
+    breakdown = PromptBudget(WordCounter(), 100).fit(sections)
+
+    assert sections[0].items == ["a b c"]
+    assert breakdown["dropped_items"] == 0
+
+
+def test_token_counter_uses_tokenizer_file(tmp_path):
+    vocab = {"[UNK]": 0, "hello": 1, "world": 2, "again": 3}
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+
+    counter = TokenCounter(str(path))
+
+    assert counter.is_exact
+    assert counter.count("hello world again") == 3
+    assert counter.truncate("hello world again", 2) == "hello world"
+
+
+def test_token_counter_falls_back_to_estimate():
+    counter = TokenCounter("")
+
+    assert not counter.is_exact
+    assert counter.count("x" * 40) == 10
+
+
+def test_token_counter_is_chosen_per_model(monkeypatch, tmp_path):
+    from config import get_config
+    from app.utils.prompt_budget import get_prompt_budget
+
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+    monkeypatch.setitem(get_config(), "TOKENIZER", "")
+    monkeypatch.setitem(get_config(), "TOKENIZERS", {"exact-model": str(path)})
+
+    assert get_prompt_budget("exact-model").counter.is_exact
+    assert not get_prompt_budget("other-model").counter.is_exact
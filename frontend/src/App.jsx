@@ -7,6 +7,8 @@ import { getSavedUser, logout } from './api/auth';
 import { getChats } from './api/message';
 import AdminPanel from './components/AdminPanel';
 
+const CHAT_PAGE_SIZE = 500;
+
 export default function App() {
     const [selectedItem, setSelectedItem] = useState('');
     const [user, setUser] = useState(null);
@@ -14,10 +16,16 @@ export default function App() {
     const [chats, setChats] = useState([]);
     const [activeView, setActiveView] = useState('chat');
 
+    // Server vraća četove po stranicama; sidebar učitava sve stranice da lista ne bi bila odsečena
     const fetchChats = async () => {
         try {
-            const data = await getChats();
-            setChats(sortChats(data));
+            const byId = new Map();
+            for (let offset = 0; ; offset += CHAT_PAGE_SIZE) {
+                const page = await getChats({ limit: CHAT_PAGE_SIZE, offset });
+                page.forEach(chat => byId.set(chat.id, chat));
+                if (page.length < CHAT_PAGE_SIZE) break;
+            }
+            setChats(sortChats([...byId.values()]));
         } catch (error) { console.error(error); }
     };
 
@@ -54,13 +54,15 @@ export const createChat = async () => {
     return response.data;
 }
 
-export const getChats = async () => {
-    const response = await api.get('/chat/get-all');
+// Lista četova bez poruka; params: { limit, offset, updated_after }
+export const getChats = async (params = {}) => {
+    const response = await api.get('/chat/get-all', { params });
     return response.data;
 }
 
-export const getChat = async (chat_id) => {
-    const response = await api.get(`chat/${chat_id}`);
+// Vraća jednu stranicu istorije; params: { before_id, after_id, limit }
+export const getChat = async (chat_id, params = {}) => {
+    const response = await api.get(`chat/${chat_id}`, { params });
     return response.data;
 }
 
@@ -74,6 +76,11 @@ export const deleteChat = async (chat_id) => {
     return response.data;
 }
 
+export const deleteChats = async (chat_ids) => {
+    const response = await api.post('/chat/delete-bulk', { chat_ids });
+    return response.data;
+}
+
 export const getModes = async () => {
     const response = await api.get('/messages/modes');
     return response.data;
@@ -96,4 +103,50 @@ export const sendMessage = async (chatId, content, modeId, file = null) => {
     return response.data;
 }
 
+/* Strimovanje odgovora: onToken se poziva za svaki token, vraća sačuvanu poruku asistenta */
+export const sendMessageStream = async (chatId, content, modeId, file = null, onToken = () => {}) => {
+    const formData = new FormData();
+    formData.append('chat_id', chatId);
+    formData.append('content', content);
+    formData.append('mode_id', modeId);
+    if (file) {
+        formData.append('file', file);
+    }
+
+    const response = await fetch(`${API_URL}/messages/send-stream`, {
+        method: 'POST',
+        headers: {
+            Authorization: `Bearer ${localStorage.getItem('token')}`,
+        },
+        body: formData,
+    });
+
+    if (!response.ok) {
+        throw new Error('Failed to send message');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let savedMessage = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const event = JSON.parse(line);
+            if (event.type === 'token') onToken(event.content);
+            else if (event.type === 'done') savedMessage = event.message;
+            else if (event.type === 'error') throw new Error(event.detail);
+        }
+    }
+
+    return savedMessage;
+}
+
 export default api;
\ No newline at end of file
@@ -104,6 +104,20 @@ export default function AdminStats() {
         }}
         />
       </div>
+
+      {/* Modeli i vreme generisanja */}
+      {charts.models && charts.models.length > 1 && (
+        <div className="grid md:grid-cols-2 gap-6">
+          <div className="bg-white p-6 bg-zinc-300 rounded-xl shadow-sm">
+            <h3 className="font-bold mb-4">Model throughput</h3>
+            <Chart chartType="Table" data={charts.models} width="100%" />
+          </div>
+          <div className="bg-white p-6 bg-zinc-300 rounded-xl shadow-sm">
+            <h3 className="font-bold mb-4">Generation time per mode</h3>
+            <Chart chartType="Table" data={charts.generation_times} width="100%" />
+          </div>
+        </div>
+      )}
     </div>
   );
 }
\ No newline at end of file
@@ -1,10 +1,11 @@
 import { useState, useEffect, useRef } from "react";
-import { getChat, updateChat, deleteChat, getModes, sendMessage, sendAnonymousMessage } from "../api/message";
+import { getChat, updateChat, deleteChat, getModes, sendMessageStream, sendAnonymousMessage } from "../api/message";
 
 
 export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, chats, onSelect, onChatSelect }) {
     const [chatData, setChatData] = useState(null);
     const [messages, setMessages] = useState([]);
+    const [hasOlder, setHasOlder] = useState(false);
     const [isEditing, setIsEditing] = useState(false);
     const [newTitle, setNewTitle] = useState("");
     const [showDeleteModal, setShowDeleteModal] = useState(false);
@@ -16,6 +17,7 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
 
     const [inputValue, setInputValue] = useState("");
     const [isLoading, setIsLoading] = useState(false);
+    const [isStreaming, setIsStreaming] = useState(false);
     const messagesEndRef = useRef(null);
     const [showMessageLimitModal, setShowMessageLimitModal] = useState(false);
 
@@ -89,9 +91,10 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
     }, [messages, chatId, isGuest]);
 
 
+    // Skrol samo kad se promeni poslednja poruka (ne i kad se dodaju starije na vrh)
     useEffect(() => {
         scrollToBottom();
-    }, [messages]);
+    }, [messages[messages.length - 1]]);
 
     const loadInitialData = async () => {
         try {
@@ -127,6 +130,7 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
                 setChatData(chat);
                 setNewTitle(chat.title);
                 setMessages(chat.messages || []);
+                setHasOlder(chat.has_older || false);
             }
         } catch (error) {
             console.error("Greška pri učitavanju:", error);
@@ -141,6 +145,15 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
         }
     }, [chatId, chats]);
 
+    const loadOlderMessages = async () => {
+        if (messages.length === 0 || !messages[0].id) return;
+        try {
+            const page = await getChat(chatId, { before_id: messages[0].id });
+            setMessages(prev => [...page.messages, ...prev]);
+            setHasOlder(page.has_older);
+        } catch (error) { console.log(error); }
+    };
+
     const handleUpdateTitle = async () => {
         if (isGuest) {
             const updatedChat = { ...chatData, title: newTitle, updated_at: new Date().toISOString() };
@@ -181,29 +194,45 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
         setIsLoading(true);
 
         try {
-            let aiMsg;
-
             if (isGuest) {
                 const response = await sendAnonymousMessage(currentInput, 1);
-                aiMsg = {
+                const aiMsg = {
                     role: "assistant",
                     content: response.content,
                     documents: []
                 };
+                setMessages(prev => [...prev, aiMsg]);
 
                 const newCount = guestMessageCount + 1;
                 setGuestMessageCount(newCount);
                 localStorage.setItem(`guest_message_count_${chatId}`, newCount.toString());
             } else {
-                aiMsg = await sendMessage(
-                    chatId,
-                    currentInput,
-                    selectedMode?.id || 1,
-                    currentFile
-                );
-            }
+                // Odgovor se prikazuje token po token u poslednjoj poruci, pa se zameni sačuvanom porukom
+                const appendToken = (token) => {
+                    setIsStreaming(true);
+                    setMessages(prev => {
+                        const last = prev[prev.length - 1];
+                        if (last?.streaming) {
+                            return [...prev.slice(0, -1), { ...last, content: last.content + token }];
+                        }
+                        return [...prev, { role: "assistant", content: token, documents: [], streaming: true }];
+                    });
+                };
 
-            setMessages(prev => [...prev, aiMsg]);
+                try {
+                    const aiMsg = await sendMessageStream(
+                        chatId,
+                        currentInput,
+                        selectedMode?.id || 1,
+                        currentFile,
+                        appendToken
+                    );
+                    setMessages(prev => [...prev.filter(m => !m.streaming), aiMsg]);
+                } catch (error) {
+                    setMessages(prev => prev.filter(m => !m.streaming));
+                    throw error;
+                }
+            }
 
             const updatedChat = {
                 ...chatData,
@@ -219,6 +248,7 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
             console.error("Slanje poruke neuspešno:", error);
         } finally {
             setIsLoading(false);
+            setIsStreaming(false);
         }
     };
 
@@ -272,6 +302,13 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
                             Start conversation...
                         </div>
                     )}
+                    {hasOlder && !isGuest && (
+                        <div className="flex justify-center">
+                            <button onClick={loadOlderMessages} className="text-xs text-zinc-400 hover:text-white px-3 py-1 rounded-lg border border-zinc-700">
+                                Load older messages
+                            </button>
+                        </div>
+                    )}
                     {messages.map((msg, index) => (
                         <div key={index} className={`flex flex-col ${msg.role === 'user' ? 'items-end' : 'items-start'}`}>
                             {msg.role === 'user' && msg.documents && msg.documents.length > 0 && (
@@ -286,7 +323,7 @@ export default function Chat({ chatId, onChatUpdated, onChatDeleted, isGuest, ch
                             </div>
                         </div>
                     ))}
-                    {isLoading && (
+                    {isLoading && !isStreaming && (
                         <div className="flex justify-start">
                             <div className="bg-zinc-800 border border-zinc-700 p-4 rounded-2xl rounded-tl-none animate-pulse text-zinc-400">
                                 typing...